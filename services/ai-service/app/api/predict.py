@@ -1,15 +1,21 @@
 """Prediction API endpoints"""
 
 import asyncio
+import json
 import time
-from typing import List
+from typing import Dict, List, Optional
 from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from app.schemas.prediction import (
+    DayTypeEnum,
     PredictionRequest,
     PredictionResponse,
+    PredictionBatchRequest,
+    PredictionBatchResponse,
     HealthResponse,
     RagHealthInfo,
+    TimeOfDayEnum,
 )
 from app.schemas.accept_prediction import (
     AcceptPredictionBatchRequest,
@@ -22,7 +28,11 @@ from app.schemas.wait_prediction import (
     WaitTimePredictionResponse,
 )
 from app.schemas.chat import ChatRequest, ChatResponse
-from app.services.prediction_service import prediction_service
+from app.services.prediction_service import prediction_service, predict_batch_in_worker
+from app.services.inference_executor import inference_executor, rag_executor, InferenceOverloadedError
+from app.services.llm_http import llm_http_pool
+from app.services.llm_resilience import llm_hedger
+from app.services.model_artifacts import process_memory
 from app.services.accept_service import accept_service
 from app.services.wait_service import wait_service
 from app.services.rag_service import (
@@ -32,12 +42,26 @@ from app.services.rag_service import (
     GROQ_API_KEY,
     GEMINI_API_KEY,
 )
-from app.services.ml_retrain import run_training_scripts_and_reload_models
+from app.services.ml_retrain import (
+    pin_model_versions,
+    rollback_models,
+    run_training_scripts_and_reload_models,
+)
+from app.services.model_registry import model_registry
 from app.core.config import settings
 
 router = APIRouter(prefix="/api", tags=["predictions"])
 
 
+def _overloaded(exc: InferenceOverloadedError) -> HTTPException:
+    """429 with Retry-After so callers (api-gateway) back off instead of queueing."""
+    return HTTPException(
+        status_code=429,
+        detail=str(exc),
+        headers={"Retry-After": str(settings.AI_INFERENCE_RETRY_AFTER_S)},
+    )
+
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """
@@ -106,27 +130,45 @@ async def predict(request: PredictionRequest):
     """
     try:
         # Make prediction
-        predictions = prediction_service.predict(request)
-        
-        # Build response
-        response = PredictionResponse(
-            eta_minutes=predictions['eta_minutes'],
-            price_multiplier=predictions['price_multiplier'],
-            recommended_driver_radius_km=predictions['recommended_driver_radius_km'],
-            surge_hint=predictions['surge_hint'],
-            confidence_score=predictions['confidence_score'],
-            reason_code=predictions['reason_code'],
-            model_version=predictions['model_version'],
-            feature_version=predictions['feature_version'],
-            inference_ms=predictions['inference_ms'],
-            distance_km=request.distance_km,
-            time_of_day=request.time_of_day.value,
-            day_type=request.day_type.value,
-            insights=predictions['insights'],
+        predictions = await inference_executor.run("predict", prediction_service.predict, request)
+        return _to_prediction_response(request, predictions)
+
+    except InferenceOverloadedError as exc:
+        raise _overloaded(exc)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}"
+        )
+
+
+@router.post("/predict/batch", response_model=PredictionBatchResponse)
+async def predict_batch(request: PredictionBatchRequest):
+    """
+    Predict ETA and price multiplier for several trips in one model call.
+
+    Pricing-service quotes several vehicle types / pickup options per booking
+    screen; rows are scaled and evaluated as one (N, 3) matrix instead of N
+    round trips to POST /api/predict. Results keep the request order.
+    """
+    try:
+        batch = await inference_executor.run(
+            "predict_batch",
+            predict_batch_in_worker,
+            request.requests,
+            rows=len(request.requests),
+        )
+        return PredictionBatchResponse(
+            results=[
+                _to_prediction_response(row, predictions)
+                for row, predictions in zip(request.requests, batch['results'])
+            ],
+            model_version=batch['model_version'],
+            feature_version=batch['feature_version'],
+            inference_ms=batch['inference_ms'],
         )
-        
-        return response
-        
+    except InferenceOverloadedError as exc:
+        raise _overloaded(exc)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -134,6 +176,24 @@ async def predict(request: PredictionRequest):
         )
 
 
+def _to_prediction_response(request: PredictionRequest, predictions: dict) -> PredictionResponse:
+    return PredictionResponse(
+        eta_minutes=predictions['eta_minutes'],
+        price_multiplier=predictions['price_multiplier'],
+        recommended_driver_radius_km=predictions['recommended_driver_radius_km'],
+        surge_hint=predictions['surge_hint'],
+        confidence_score=predictions['confidence_score'],
+        reason_code=predictions['reason_code'],
+        model_version=predictions['model_version'],
+        feature_version=predictions['feature_version'],
+        inference_ms=predictions['inference_ms'],
+        distance_km=request.distance_km,
+        time_of_day=request.time_of_day.value,
+        day_type=request.day_type.value,
+        insights=predictions['insights'],
+    )
+
+
 @router.post("/predict/accept/batch", response_model=AcceptPredictionBatchResponse)
 async def predict_accept_batch(request: AcceptPredictionBatchRequest):
     """
@@ -145,7 +205,9 @@ async def predict_accept_batch(request: AcceptPredictionBatchRequest):
     Falls back to p_accept_clamped=1.0 (neutral) if the model is not loaded.
     """
     try:
-        return accept_service.predict_batch(request)
+        return await inference_executor.run("accept_batch", accept_service.predict_batch, request)
+    except InferenceOverloadedError as exc:
+        raise _overloaded(exc)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Accept prediction error: {exc}")
 
@@ -159,7 +221,9 @@ async def predict_wait_time(request: WaitTimePredictionRequest):
     Falls back to heuristic if model is unavailable.
     """
     try:
-        return wait_service.predict(request)
+        return await inference_executor.run("wait_time", wait_service.predict, request)
+    except InferenceOverloadedError as exc:
+        raise _overloaded(exc)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Wait-time prediction error: {exc}")
 
@@ -177,12 +241,39 @@ async def get_stats():
         "version": settings.APP_VERSION,
         "status": "running",
         "model_loaded": prediction_service.model is not None,
+        "eta_lookup": prediction_service.lookup_report,
         "accept_model_loaded": accept_service.is_ready,
         "wait_model_loaded": wait_service.model is not None,
+        "model_versions": {
+            "eta_price": prediction_service.version,
+            "accept": accept_service.version,
+            "wait": wait_service.version,
+        },
+        "model_registry": model_registry.describe() if settings.MODEL_REGISTRY_ENABLED else None,
+        "model_engines": {
+            "eta_price": prediction_service.engine,
+            "accept": accept_service.engine,
+            "wait": wait_service.engine,
+        },
         "rag_ready": rag_service.is_ready,
         "model_path": settings.MODEL_PATH,
         "accept_model_path": settings.ACCEPT_MODEL_PATH,
         "wait_model_path": settings.WAIT_MODEL_PATH,
+        "inference_executor": inference_executor.snapshot(),
+        "rag_executor": rag_executor.snapshot(),
+        "rag_batchers": rag_service.batcher_snapshot(),
+        "answer_cache": rag_service.answer_cache_snapshot(),
+        "llm_http": llm_http_pool.snapshot(),
+        "llm_hedging": llm_hedger.snapshot(),
+        "memory": {
+            "process": process_memory(),
+            "models": {
+                "eta_price": prediction_service.memory_report(),
+                "accept": accept_service.memory_report(),
+                "wait": wait_service.memory_report(),
+                **rag_service.model_memory(),
+            },
+        },
     }
 
 
@@ -191,6 +282,11 @@ class InternalRefreshBody(BaseModel):
 
     rag: bool = True
     ml: bool = False
+    # Re-activate the previous registry version (all models unless `models` is set)
+    rollback: bool = False
+    models: Optional[List[str]] = None
+    # {"accept": "3f2a9c1b0d4e"} activates + pins; {"accept": null} unpins
+    pin_version: Optional[Dict[str, Optional[str]]] = None
 
 
 def _require_internal_token(authorization: str | None) -> None:
@@ -207,16 +303,22 @@ async def internal_ai_refresh(
     authorization: str | None = Header(None),
 ):
     """
-    Reload RAG index from disk and/or re-run training/*.py then hot-reload joblibs.
+    Reload RAG index from disk and/or re-run training/*.py then hot-swap the
+    newly published registry versions. `rollback` / `pin_version` switch the
+    registry's current version and hot-swap without retraining.
 
     Requires `Authorization: Bearer <AI_INTERNAL_TOKEN>` and non-empty `AI_INTERNAL_TOKEN`.
     """
     _require_internal_token(authorization)
     out: dict = {}
     if body.rag:
-        out["rag"] = rag_service.reload_knowledge_from_disk()
+        out["rag"] = await asyncio.to_thread(rag_service.reload_knowledge_from_disk)
     if body.ml:
         out["ml"] = await asyncio.to_thread(run_training_scripts_and_reload_models)
+    if body.rollback:
+        out["rollback"] = await asyncio.to_thread(rollback_models, body.models)
+    if body.pin_version:
+        out["pin_version"] = await asyncio.to_thread(pin_model_versions, body.pin_version)
     return out
 
 
@@ -239,10 +341,63 @@ async def chat(request: ChatRequest):
             top_k=request.top_k,
         )
         return ChatResponse(**result)
+    except InferenceOverloadedError as exc:
+        raise _overloaded(exc)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Chat error: {exc}")
 
 
+def _sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream", tags=["rag"])
+async def chat_stream(request: ChatRequest):
+    """
+    `/api/chat` as Server-Sent Events, for time-to-first-token in the chat UI.
+
+    - `meta`: sources, retrieval_count, score_max, provisional mode — sent when LLM generation starts
+    - `delta`: `{"text"}` answer tokens as the provider streams them (raw; Markdown not yet stripped)
+    - `reset`: the provider failed mid-answer — discard deltas so far, another provider follows
+    - `done`: the full ChatResponse (polished answer, mode, provider, latency, timings_ms incl. first_token)
+
+    Template, rule-based and small-talk answers arrive as the single `done` event.
+    Overload before the first event is a 429, like `/api/chat`.
+    """
+    events = rag_service.chat_stream(
+        message=request.message,
+        history=[m.model_dump() for m in request.history] if request.history else None,
+        top_k=request.top_k,
+    )
+    try:
+        first = await events.__anext__()
+    except InferenceOverloadedError as exc:
+        raise _overloaded(exc)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Chat error: {exc}")
+
+    async def body():
+        event = first
+        try:
+            while True:
+                if event["event"] == "done":
+                    event = {"event": "done", "data": ChatResponse(**event["data"]).model_dump()}
+                yield _sse(event)
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception as exc:
+            yield _sse({"event": "error", "data": {"detail": f"Chat error: {exc}"}})
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/chat/status", tags=["rag"])
 async def chat_status():
     """Return RAG service status and knowledge base statistics."""
@@ -253,6 +408,7 @@ async def chat_status():
         "embedding_model": rag_service._model.__class__.__name__ if rag_service._model else None,
         "embedding_model_name": snap["embedding_model"],
         "chunks_indexed": snap["chunks"],
+        "embedding_cache": rag_service.embedding_cache_snapshot(),
         "llm_provider": snap["llm_provider_configured"],
         "llm_provider_order": snap["llm_provider_order"],
         "effective_llm_provider": snap["effective_llm_provider"],
@@ -382,51 +538,23 @@ def _make_reason(candidate: DriverCandidate, rank: int, p_accept: float) -> str:
     return " · ".join(reasons) if reasons else "đáp ứng điều kiện tối thiểu"
 
 
-@router.post("/recommend-driver", response_model=RecommendDriverResponse, tags=["ai-decision"])
-async def recommend_driver(request: RecommendDriverRequest):
-    """
-    **Unified AI Decision Endpoint** — Xếp hạng tài xế tối ưu dựa trên toàn bộ pipeline AI.
-
-    Pipeline:
-    1. ETA & Surge prediction (RandomForest)
-    2. Accept probability per driver (GradientBoosting, 15 features)
-    3. Wait-time prediction (GradientBoosting, 12 features)
-    4. Scoring tổng hợp = base_score × p_accept_clamped
-
-    Trả về danh sách tài xế đã xếp hạng cùng lý giải chi tiết từng thành phần AI.
-    """
-    t0 = time.time()
-
-    if not request.candidates:
-        raise HTTPException(status_code=400, detail="candidates list is empty")
-
-    # ── 1. ETA + Surge prediction ─────────────────────────────────────────────
-    from app.schemas.prediction import TimeOfDay, DayType
+def _predict_surge(request: RecommendDriverRequest) -> dict:
     try:
-        tod = TimeOfDay(request.time_of_day)
-        dt = DayType(request.day_type)
-    except Exception:
-        tod = TimeOfDay.OFF_PEAK
-        dt = DayType.WEEKDAY
+        tod = TimeOfDayEnum(request.time_of_day)
+        dt = DayTypeEnum(request.day_type)
+    except ValueError:
+        tod = TimeOfDayEnum.OFF_PEAK
+        dt = DayTypeEnum.WEEKDAY
 
     pred_req = PredictionRequest(
         distance_km=request.distance_km,
         time_of_day=tod,
         day_type=dt,
     )
-    try:
-        surge_pred = prediction_service.predict(pred_req)
-    except Exception:
-        surge_pred = {
-            "surge_hint": request.surge_multiplier,
-            "price_multiplier": request.surge_multiplier,
-            "eta_minutes": int(request.distance_km / 25 * 60),
-            "confidence_score": 0.5,
-            "insights": {"demand_level": request.demand_level, "surge_reason": "fallback"},
-            "reason_code": "AI_FALLBACK",
-        }
+    return prediction_service.predict(pred_req)
 
-    # ── 2. Accept probability batch ───────────────────────────────────────────
+
+def _predict_accept(request: RecommendDriverRequest) -> AcceptPredictionBatchResponse:
     context = AcceptPredictionContext(
         distance_km=request.distance_km,
         fare_estimate=request.fare_estimate,
@@ -445,15 +573,12 @@ async def recommend_driver(request: RecommendDriverRequest):
         )
         for c in request.candidates
     ]
-    accept_req = AcceptPredictionBatchRequest(context=context, drivers=driver_inputs)
-    try:
-        accept_resp = accept_service.predict_batch(accept_req)
-        accept_map = {r.driver_id: r for r in accept_resp.results}
-    except Exception:
-        accept_map = {}
+    return accept_service.predict_batch(
+        AcceptPredictionBatchRequest(context=context, drivers=driver_inputs)
+    )
 
-    # ── 3. Wait-time prediction ───────────────────────────────────────────────
-    demand_ord = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}.get(request.demand_level, 1)
+
+def _predict_wait(request: RecommendDriverRequest) -> WaitTimePredictionResponse:
     wait_req = WaitTimePredictionRequest(
         demand_level=request.demand_level,
         active_booking_count=max(1, request.available_driver_count),
@@ -465,11 +590,90 @@ async def recommend_driver(request: RecommendDriverRequest):
         avg_accept_rate=sum(c.accept_rate for c in request.candidates) / max(1, len(request.candidates)),
         historical_wait_p50=4.0,
     )
+    return wait_service.predict(wait_req)
+
+
+async def _run_stage(name: str, fn, request: RecommendDriverRequest, timeout_ms: int, stages: dict):
+    """
+    Run one model stage on the inference executor. A timeout, overload or model
+    error only degrades this stage (caller applies its AI_FALLBACK section);
+    status and wall time land in `stages[name]` for ai_pipeline_summary.
+    """
+    started = time.perf_counter()
+    status = "AI_OK"
+    result = None
     try:
-        wait_pred = wait_service.predict(wait_req)
-        wait_result = {"wait_time_minutes": wait_pred.wait_time_minutes, "confidence": wait_pred.confidence}
+        result = await asyncio.wait_for(
+            inference_executor.run("recommend_driver", fn, request),
+            timeout=timeout_ms / 1000,
+        )
+    except asyncio.TimeoutError:
+        status = "AI_TIMEOUT"
+    except InferenceOverloadedError:
+        status = "AI_OVERLOADED"
     except Exception:
-        wait_result = {"wait_time_minutes": 4.0, "confidence": 0.4}
+        status = "AI_MODEL_ERROR"
+    stages[name] = {
+        "status": status,
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+        "timeout_ms": timeout_ms,
+    }
+    return result
+
+
+@router.post("/recommend-driver", response_model=RecommendDriverResponse, tags=["ai-decision"])
+async def recommend_driver(request: RecommendDriverRequest):
+    """
+    **Unified AI Decision Endpoint** — Xếp hạng tài xế tối ưu dựa trên toàn bộ pipeline AI.
+
+    Pipeline:
+    1. ETA & Surge prediction (RandomForest)
+    2. Accept probability per driver (GradientBoosting, 15 features)
+    3. Wait-time prediction (GradientBoosting, 12 features)
+    4. Scoring tổng hợp = base_score × p_accept_clamped
+
+    Bước 1–3 chạy song song, mỗi bước có timeout + fallback riêng (AI_FALLBACK);
+    thời gian từng bước nằm trong `ai_pipeline_summary.stages`.
+
+    Trả về danh sách tài xế đã xếp hạng cùng lý giải chi tiết từng thành phần AI.
+    """
+    t0 = time.time()
+
+    if not request.candidates:
+        raise HTTPException(status_code=400, detail="candidates list is empty")
+
+    # Stages 1–3 are independent given the request: run them concurrently on the
+    # inference executor, each with its own timeout and fallback, then join.
+    stages: dict = {}
+    surge_pred, accept_resp, wait_pred = await asyncio.gather(
+        _run_stage("surge", _predict_surge, request, settings.AI_RECOMMEND_SURGE_TIMEOUT_MS, stages),
+        _run_stage("accept", _predict_accept, request, settings.AI_RECOMMEND_ACCEPT_TIMEOUT_MS, stages),
+        _run_stage("wait", _predict_wait, request, settings.AI_RECOMMEND_WAIT_TIMEOUT_MS, stages),
+    )
+
+    # ── 1. ETA + Surge prediction ─────────────────────────────────────────────
+    if surge_pred is None:
+        surge_pred = {
+            "surge_hint": request.surge_multiplier,
+            "price_multiplier": request.surge_multiplier,
+            "eta_minutes": int(request.distance_km / 25 * 60),
+            "confidence_score": 0.5,
+            "insights": {"demand_level": request.demand_level, "surge_reason": "fallback"},
+            "reason_code": "AI_FALLBACK",
+        }
+
+    # ── 2. Accept probability batch ───────────────────────────────────────────
+    accept_map = {r.driver_id: r for r in accept_resp.results} if accept_resp is not None else {}
+
+    # ── 3. Wait-time prediction ───────────────────────────────────────────────
+    if wait_pred is not None:
+        wait_result = {
+            "wait_time_minutes": wait_pred.wait_time_minutes,
+            "confidence": wait_pred.confidence,
+            "reason_code": wait_pred.reason_code,
+        }
+    else:
+        wait_result = {"wait_time_minutes": 4.0, "confidence": 0.4, "reason_code": "AI_FALLBACK"}
 
     # ── 4. Score & rank ───────────────────────────────────────────────────────
     scored = []
@@ -517,7 +721,9 @@ async def recommend_driver(request: RecommendDriverRequest):
             "accept_model_active": accept_service.is_ready,
             "wait_model_active": wait_service.model is not None,
             "surge_model_active": prediction_service.model is not None,
+            "accept_reason_code": accept_resp.reason_code if accept_resp is not None else "AI_FALLBACK",
             "scoring_formula": "score = (0.40×eta + 0.20×rating + 0.15×accept - 0.15×cancel + 0.05×idle + 0.05×priority + aiAdj) × pAccept",
+            "stages": stages,
             "inference_ms": elapsed_ms,
         },
         inference_ms=elapsed_ms,
@@ -24,16 +24,80 @@ class Settings(BaseSettings):
     ACCEPT_MODEL_PATH: str = "app/models/accept_model.joblib"
     WAIT_MODEL_PATH: str = "app/models/wait_model.joblib"
 
+    # Inference engine per model: "compiled" flattens the tree ensemble into
+    # NumPy node arrays at load; "sklearn" serves the estimator as-is.
+    ETA_MODEL_ENGINE: str = "compiled"
+    ACCEPT_MODEL_ENGINE: str = "compiled"
+    WAIT_MODEL_ENGINE: str = "compiled"
+
+    # Versioned model registry: each trained artifact is copied into
+    # <dir>/<model>/versions/<sha256[:12]>/ and activated via current.json.
+    # Bootstrapped from the *_MODEL_PATH files on first start.
+    MODEL_REGISTRY_ENABLED: bool = True
+    MODEL_REGISTRY_DIR: str = "app/models/registry"
+    MODEL_REGISTRY_KEEP: int = 5
+    # How often (seconds) each worker's background follower re-checks current.json,
+    # so rollback / pin / publish done by one worker reach all of them. 0 = never.
+    MODEL_REGISTRY_POLL_S: float = 2.0
+
+    # ETA/surge lookup table precomputed from the forest at model load.
+    # Covers the trained distance range; requests outside it use the forest.
+    ETA_LOOKUP_ENABLED: bool = True
+    ETA_LOOKUP_MIN_KM: float = 2.0
+    ETA_LOOKUP_MAX_KM: float = 50.0
+    ETA_LOOKUP_STEP_KM: float = 0.01
+
     # Bounded suggestion defaults (downstream services still clamp again)
     SUGGESTED_RADIUS_MIN_KM: float = 2.0
     SUGGESTED_RADIUS_MAX_KM: float = 5.0
     SUGGESTED_SURGE_MIN: float = 1.0
     SUGGESTED_SURGE_MAX: float = 2.0
 
+    # Inference executor — CPU-bound model calls run off the event loop.
+    # 0 workers = os.cpu_count(). Calls beyond workers + queue, or beyond an
+    # endpoint's cap (0 = uncapped), are rejected with 429.
+    AI_INFERENCE_WORKERS: int = 0
+    AI_INFERENCE_MAX_QUEUE: int = 64
+    AI_INFERENCE_DEFAULT_LIMIT: int = 0
+    AI_INFERENCE_ENDPOINT_LIMITS: dict[str, int] = {
+        "predict": 32,
+        "predict_batch": 8,
+        "accept_batch": 16,
+        "wait_time": 16,
+        "recommend_driver": 48,  # three model stages per request
+    }
+    # Optional spawn-based process pool for batches of at least N rows (0 = off)
+    AI_INFERENCE_PROCESS_WORKERS: int = 0
+    AI_INFERENCE_PROCESS_MIN_ROWS: int = 64
+    AI_INFERENCE_RETRY_AFTER_S: int = 1
+
+    # RAG executor — /api/chat query embedding, hybrid search and cross-encoder
+    # rerank run on their own small pool so torch compute never takes workers
+    # from /api/predict*. 0 workers = cores // 4 (min 1); torch intra-op threads
+    # per call default to half the cores split across those workers.
+    AI_RAG_WORKERS: int = 0
+    AI_RAG_MAX_QUEUE: int = 16
+    AI_RAG_TORCH_THREADS: int = 0
+    # Concurrent chats' query encodes / rerank pairs arriving within MAX_WAIT_MS
+    # of each other run as one padded transformer batch
+    AI_RAG_BATCH_MAX_SIZE: int = 32
+    AI_RAG_BATCH_MAX_WAIT_MS: float = 4.0
+    AI_RAG_RERANK_MAX_PAIRS: int = 64
+
+    # /api/recommend-driver per-stage budgets. Stages run concurrently, so the
+    # endpoint costs max(stage) — keep below api-gateway MATCHING_AI_TIMEOUT_MS (150).
+    AI_RECOMMEND_SURGE_TIMEOUT_MS: int = 120
+    AI_RECOMMEND_ACCEPT_TIMEOUT_MS: int = 120
+    AI_RECOMMEND_WAIT_TIMEOUT_MS: int = 120
+
     # Background maintenance (0 = disabled)
     AI_AUTO_RELOAD_RAG_SEC: int = 0
     AI_AUTO_RETRAIN_SEC: int = 0
     AI_AUTO_RETRAIN_ENABLED: bool = False
+    # Retrain jobs run concurrently in a process pool: at most CPU_BUDGET workers
+    # (0 = half the cores), BLAS/joblib threads capped to the budget, niced.
+    AI_RETRAIN_CPU_BUDGET: int = 0
+    AI_RETRAIN_NICE: int = 10
     # Bearer token for POST /api/internal/refresh — empty = endpoint returns 404
     AI_INTERNAL_TOKEN: str = ""
 
@@ -12,6 +12,8 @@ from app.services.accept_service import accept_service  # noqa: F401 — eager l
 from app.services.wait_service import wait_service  # noqa: F401 — eager load at startup
 from app.services.rag_service import rag_service
 from app.services.ai_scheduler import start_ai_maintenance_background
+from app.services.inference_executor import inference_executor, rag_executor
+from app.services.llm_http import llm_http_pool
 
 # Configure logging
 logging.basicConfig(
@@ -54,6 +56,7 @@ async def startup_event():
     logger.info(f"Model path: {settings.MODEL_PATH}")
     # Pre-initialize RAG service in background to reduce cold start latency
     asyncio.get_event_loop().run_in_executor(None, rag_service.initialize)
+    await llm_http_pool.start()
     asyncio.create_task(start_ai_maintenance_background())
 
 
@@ -61,6 +64,9 @@ async def startup_event():
 async def shutdown_event():
     """Run on application shutdown"""
     logger.info(f"{settings.APP_NAME} shutting down...")
+    inference_executor.shutdown(wait=False)
+    rag_executor.shutdown(wait=False)
+    await llm_http_pool.aclose()
 
 
 @app.get("/")
@@ -77,8 +77,8 @@ class AcceptPredictionBatchRequest(BaseModel):
     drivers: List[AcceptPredictionDriverInput] = Field(
         ...,
         min_length=1,
-        max_length=20,
-        description="List of driver inputs (max 20 per batch)",
+        max_length=500,
+        description="List of driver inputs (max 500 per batch)",
     )
 
     model_config = {
@@ -1,5 +1,5 @@
 """Schemas for RAG chat endpoint"""
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -28,7 +28,7 @@ class ChatResponse(BaseModel):
     score_max: float = Field(default=0.0, description="Maximum similarity score (0-1)")
     mode: str = Field(
         default="retrieval",
-        description="Answer mode: llm_openai|llm_gemini|rulebase_fallback|retrieval|error",
+        description="Answer mode: llm_openai|llm_gemini|rulebase_fallback|retrieval|cache|error",
     )
     latency_ms: int = Field(default=0, description="Total processing time in milliseconds")
     llm_provider: Optional[str] = Field(default=None, description="Actual provider used for this answer, or template")
@@ -38,3 +38,15 @@ class ChatResponse(BaseModel):
     rewrite_query: Optional[str] = Field(default=None, description="Rewritten retrieval query when used")
     rewrite_provider: Optional[str] = Field(default=None, description="Provider used for query rewrite")
     rewrite_model: Optional[str] = Field(default=None, description="Model used for query rewrite")
+    cache_similarity: Optional[float] = Field(
+        default=None,
+        description="Cosine between this query and the cached one when mode=cache",
+    )
+    llm_hedge: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="LLM provider race: launched providers, winner, hedged flag, wasted calls",
+    )
+    timings_ms: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Per-stage latency: init, rewrite, queue, embed, search, rerank, llm, first_token (stream), total",
+    )
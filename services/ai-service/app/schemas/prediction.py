@@ -1,7 +1,7 @@
 """Prediction request/response schemas"""
 
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -192,6 +192,49 @@ class PredictionResponse(BaseModel):
     }
 
 
+class PredictionBatchRequest(BaseModel):
+    """Batch request for prediction endpoint — one row per quote option"""
+
+    requests: List[PredictionRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=100,
+        description="Trips to predict in one model call (max 100 per batch)"
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "requests": [
+                        {"distance_km": 8.5, "time_of_day": "RUSH_HOUR", "day_type": "WEEKDAY"},
+                        {"distance_km": 9.1, "time_of_day": "RUSH_HOUR", "day_type": "WEEKDAY"},
+                    ]
+                }
+            ]
+        }
+    }
+
+
+class PredictionBatchResponse(BaseModel):
+    """Batch response with one PredictionResponse per request row (same order)"""
+
+    results: List[PredictionResponse]
+    model_version: str = Field(
+        ...,
+        description="Model version used for this batch"
+    )
+    feature_version: str = Field(
+        ...,
+        description="Feature schema version used for this batch"
+    )
+    inference_ms: int = Field(
+        ...,
+        ge=0,
+        description="Model inference latency for the whole batch in milliseconds"
+    )
+
+
 class RagHealthInfo(BaseModel):
     """RAG / LLM configuration snapshot (no secret values)."""
 
@@ -2,10 +2,8 @@
 
 import logging
 import time
-from pathlib import Path
-from typing import List
+from typing import List, Optional, Sequence
 
-import joblib
 import numpy as np
 
 from app.schemas.accept_prediction import (
@@ -16,19 +14,32 @@ from app.schemas.accept_prediction import (
     AcceptPredictionDriverResult,
 )
 from app.core.config import settings
+from app.services.compiled_trees import engine_name
+from app.services.model_artifacts import ModelArtifact, load_model_artifact, model_memory
+from app.services.model_registry import follow_registry, resolve_model_path, service_path
 
 logger = logging.getLogger(__name__)
 
+_DEFAULT_MODEL_VERSION = "accept-gbm-v1"
+
 # Demand level ordinal mapping
 _DEMAND_ORDINAL = {"LOW": 0.0, "MEDIUM": 1.0, "HIGH": 2.0}
 
 
-def _encode_single(
+# Feature order must match training/train_accept_model.py::encode_features
+N_FEATURES = 15
+
+
+def _encode_batch(
     ctx: AcceptPredictionContext,
-    drv: AcceptPredictionDriverInput,
+    drivers: Sequence[AcceptPredictionDriverInput],
 ) -> np.ndarray:
     """
-    Build a 15-feature vector for one (context, driver) pair.
+    Build the (N, 15) feature matrix for one context and N drivers.
+
+    Context-only features are computed once and broadcast down their column;
+    per-driver columns are NumPy vector ops written into a preallocated
+    float32 buffer (the dtype sklearn's tree ensembles evaluate in anyway).
 
     Features:
       0  eta_log              log1p(eta_minutes)
@@ -47,65 +58,69 @@ def _encode_single(
       13 fare_per_eta         log1p(fare_k) / max(1, eta_minutes)
       14 demand_supply_ratio  demand_score / max(1, avail_log)
     """
+    n = len(drivers)
+    features = np.empty((n, N_FEATURES), dtype=np.float32)
+
+    # ── Context columns (computed once) ─────────────────────────────────────
     fare_k = ctx.fare_estimate / 1_000
     h = ctx.hour_of_day
-    hour_sin = np.sin(2 * np.pi * h / 24)
-    hour_cos = np.cos(2 * np.pi * h / 24)
-
     zone = ctx.pickup_zone.upper()
-    zone_A = 1.0 if zone == "A" else 0.0
-    zone_B = 1.0 if zone == "B" else 0.0
-    zone_C = 1.0 if zone == "C" else 0.0
-
     demand_score = _DEMAND_ORDINAL.get(ctx.demand_level.upper(), 1.0)
     avail_log = np.log1p(max(0, ctx.available_driver_count))
 
-    eta_clamped = max(0.0, drv.eta_minutes)
-    fare_per_eta = np.log1p(fare_k) / max(1.0, eta_clamped)
-    demand_supply_ratio = demand_score / max(1.0, avail_log)
-
-    return np.array([
-        np.log1p(eta_clamped),
-        np.log1p(max(0.0, ctx.distance_km)),
-        np.log1p(max(0.0, fare_k)),
-        ctx.surge_multiplier,
-        drv.driver_accept_rate,
-        drv.driver_cancel_rate,
-        hour_sin,
-        hour_cos,
-        zone_A,
-        zone_B,
-        zone_C,
-        demand_score,
-        avail_log,
-        fare_per_eta,
-        demand_supply_ratio,
-    ], dtype=float)
+    features[:, 1] = np.log1p(max(0.0, ctx.distance_km))
+    features[:, 2] = np.log1p(max(0.0, fare_k))
+    features[:, 3] = ctx.surge_multiplier
+    features[:, 6] = np.sin(2 * np.pi * h / 24)
+    features[:, 7] = np.cos(2 * np.pi * h / 24)
+    features[:, 8] = 1.0 if zone == "A" else 0.0
+    features[:, 9] = 1.0 if zone == "B" else 0.0
+    features[:, 10] = 1.0 if zone == "C" else 0.0
+    features[:, 11] = demand_score
+    features[:, 12] = avail_log
+    features[:, 14] = demand_score / max(1.0, avail_log)
+
+    # ── Per-driver columns (vector ops, float64 then cast into the buffer) ──
+    eta_clamped = np.maximum(
+        np.fromiter((d.eta_minutes for d in drivers), dtype=float, count=n), 0.0
+    )
+    features[:, 0] = np.log1p(eta_clamped)
+    features[:, 4] = np.fromiter((d.driver_accept_rate for d in drivers), dtype=float, count=n)
+    features[:, 5] = np.fromiter((d.driver_cancel_rate for d in drivers), dtype=float, count=n)
+    features[:, 13] = np.log1p(fare_k) / np.maximum(1.0, eta_clamped)
+
+    return features
+
+
+def _encode_single(
+    ctx: AcceptPredictionContext,
+    drv: AcceptPredictionDriverInput,
+) -> np.ndarray:
+    """15-feature vector for one (context, driver) pair — see `_encode_batch`."""
+    return _encode_batch(ctx, [drv])[0]
 
 
 class AcceptPredictionService:
     """Service that loads the GBM accept model and serves batch predictions."""
 
     def __init__(self) -> None:
-        self._model = None
-        self._model_version = "accept-gbm-v1"
-        self._p_clamp_min = 0.3
-        self._p_clamp_max = 1.2
+        # Model + payload (version, clamp bounds) swapped as one reference on reload
+        self._artifact: Optional[ModelArtifact] = None
         self._load_model()
+        follow_registry("accept", self)  # rollback / pin / retrain done by another worker
 
-    def _load_model(self) -> None:
-        model_path = Path(settings.ACCEPT_MODEL_PATH)
-        if not model_path.is_absolute():
-            service_root = Path(__file__).resolve().parents[2]
-            model_path = service_root / model_path
-
+    def _load_model(self, version: Optional[str] = None) -> bool:
+        model_path = service_path(settings.ACCEPT_MODEL_PATH)
         try:
-            data = joblib.load(model_path)
-            self._model = data["model"]
-            self._model_version = data.get("model_version", self._model_version)
-            self._p_clamp_min = data.get("p_clamp_min", 0.3)
-            self._p_clamp_max = data.get("p_clamp_max", 1.2)
-            logger.info(f"Accept model loaded: {model_path} ({self._model_version})")
+            model_path, registry_version = resolve_model_path("accept", model_path, version)
+            artifact = load_model_artifact(model_path, settings.ACCEPT_MODEL_ENGINE, "accept_model")
+            artifact.version = registry_version
+            self._artifact = artifact
+            logger.info(
+                f"Accept model loaded: {model_path} "
+                f"({artifact.payload.get('model_version', _DEFAULT_MODEL_VERSION)})"
+            )
+            return True
         except FileNotFoundError:
             logger.warning(
                 f"Accept model not found at {model_path}. "
@@ -113,22 +128,43 @@ class AcceptPredictionService:
             )
         except Exception as exc:
             logger.error(f"Failed to load accept model: {exc}")
+        return False
 
-    def reload_model(self) -> bool:
-        """Reload accept model from disk (after periodic/manual retrain)."""
-        self._load_model()
-        return self._model is not None
+    def reload_model(self, version: Optional[str] = None) -> bool:
+        """Reload accept model (current or given registry version); keeps the old one on failure."""
+        return self._load_model(version)
+
+    @property
+    def model(self):
+        artifact = self._artifact
+        return artifact.model if artifact is not None else None
+
+    @property
+    def version(self) -> Optional[str]:
+        artifact = self._artifact
+        return artifact.version if artifact is not None else None
 
     @property
     def is_ready(self) -> bool:
-        return self._model is not None
+        return self._artifact is not None
+
+    @property
+    def engine(self):
+        return engine_name(self.model)
+
+    def memory_report(self) -> dict:
+        artifact = self._artifact
+        if artifact is None:
+            return model_memory(None)
+        return model_memory(artifact.model, artifact.sidecar)
 
     def predict_batch(
         self, request: AcceptPredictionBatchRequest
     ) -> AcceptPredictionBatchResponse:
         start_ms = time.perf_counter()
+        artifact = self._artifact
 
-        if not self.is_ready:
+        if artifact is None:
             # Return neutral fallback (multiplier=1 → no effect on score)
             fallback = [
                 AcceptPredictionDriverResult(
@@ -141,36 +177,36 @@ class AcceptPredictionService:
             ]
             return AcceptPredictionBatchResponse(
                 results=fallback,
-                model_version=self._model_version,
+                model_version=_DEFAULT_MODEL_VERSION,
                 reason_code="AI_FALLBACK",
                 inference_ms=0,
             )
 
         ctx = request.context
-        results: List[AcceptPredictionDriverResult] = []
 
-        # Build feature matrix (one row per driver) for vectorised predict_proba
-        feature_rows = np.array([
-            _encode_single(ctx, drv) for drv in request.drivers
-        ])
+        # One columnar feature matrix (one row per driver) for vectorised predict_proba
+        feature_rows = _encode_batch(ctx, request.drivers)
 
-        proba_matrix = self._model.predict_proba(feature_rows)  # shape (N, 2)
+        payload = artifact.payload
+        proba_matrix = artifact.model.predict_proba(feature_rows)  # shape (N, 2)
         p_accept_raw: np.ndarray = proba_matrix[:, 1]           # P(class=1)
 
-        for i, drv in enumerate(request.drivers):
-            p = float(p_accept_raw[i])
-            clamped = max(self._p_clamp_min, min(self._p_clamp_max, p))
-            # Confidence = distance from decision boundary (0.5)
-            confidence = float(abs(p - 0.5) * 2)  # [0,1], 1=very confident
-
-            results.append(
-                AcceptPredictionDriverResult(
-                    driver_id=drv.driver_id,
-                    p_accept=round(p, 4),
-                    p_accept_clamped=round(clamped, 4),
-                    confidence=round(confidence, 3),
-                )
+        p_accept = np.round(p_accept_raw, 4)
+        clamped = np.round(np.clip(p_accept_raw, payload.get("p_clamp_min", 0.3), payload.get("p_clamp_max", 1.2)), 4)
+        # Confidence = distance from decision boundary (0.5), [0,1], 1=very confident
+        confidence = np.round(np.abs(p_accept_raw - 0.5) * 2, 3)
+
+        results: List[AcceptPredictionDriverResult] = [
+            AcceptPredictionDriverResult(
+                driver_id=drv.driver_id,
+                p_accept=p,
+                p_accept_clamped=c,
+                confidence=conf,
+            )
+            for drv, p, c, conf in zip(
+                request.drivers, p_accept.tolist(), clamped.tolist(), confidence.tolist()
             )
+        ]
 
         inference_ms = int((time.perf_counter() - start_ms) * 1000)
         logger.debug(
@@ -180,7 +216,7 @@ class AcceptPredictionService:
 
         return AcceptPredictionBatchResponse(
             results=results,
-            model_version=self._model_version,
+            model_version=payload.get("model_version", _DEFAULT_MODEL_VERSION),
             reason_code="AI_OK",
             inference_ms=inference_ms,
         )
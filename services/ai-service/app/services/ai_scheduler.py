@@ -29,7 +29,9 @@ async def _periodic_rag_reload(interval_sec: int) -> None:
         await asyncio.sleep(interval_sec)
         try:
             result = await asyncio.to_thread(rag_service.reload_knowledge_from_disk)
-            if result.get("ok"):
+            if result.get("ok") and result.get("action") == "unchanged":
+                logger.debug("Periodic RAG reload: knowledge unchanged (%sms)", result.get("elapsed_ms"))
+            elif result.get("ok"):
                 logger.info("Periodic RAG reload: %s", result)
             else:
                 logger.warning("Periodic RAG reload: %s", result)
@@ -37,13 +39,27 @@ async def _periodic_rag_reload(interval_sec: int) -> None:
             logger.exception("Periodic RAG reload crashed")
 
 
+def _log_retrain_progress(event: dict) -> None:
+    if event.get("stage") in ("trained", "failed"):
+        logger.info(
+            "Periodic ML retrain job %s %s in %sms (peak RSS %s KB)",
+            event.get("job"),
+            event.get("stage"),
+            event.get("elapsed_ms"),
+            event.get("peak_rss_kb"),
+        )
+
+
 async def _periodic_ml_retrain(interval_sec: int) -> None:
     while True:
         await asyncio.sleep(interval_sec)
         try:
-            result = await asyncio.to_thread(run_training_scripts_and_reload_models)
+            result = await asyncio.to_thread(
+                run_training_scripts_and_reload_models,
+                on_progress=_log_retrain_progress,
+            )
             if result.get("ok"):
-                logger.info("Periodic ML retrain: %s", result.get("detail"))
+                logger.info("Periodic ML retrain: %s (wall %sms)", result.get("detail"), result.get("wall_ms"))
             else:
                 logger.warning("Periodic ML retrain: %s", result)
         except Exception:
@@ -0,0 +1,338 @@
+"""
+FAISS nearest-neighbour indexes over the RAG chunk embeddings.
+
+    flat      IndexFlatIP — exact brute force; the right choice up to ~10k chunks
+    hnsw      IndexHNSWFlat — graph search, no training; efSearch trades recall for latency
+    ivf_flat  IndexIVFFlat — k-means cells, scans `nprobe` of them with the full vectors
+    ivf_pq    IndexIVFPQ — ivf_flat over product-quantised codes
+
+`RAG_FAISS_INDEX=auto` picks by corpus size: flat up to RAG_ANN_FLAT_MAX chunks,
+hnsw up to RAG_ANN_HNSW_MAX, ivf_pq beyond. Every kind uses inner product on
+unit-norm rows (= cosine). `search` takes per-call efSearch / nprobe, so one
+built index can be swept without rebuilding.
+
+`RAG_VECTOR_STORAGE` sets the per-vector codes of the flat / hnsw / ivf_flat
+kinds: float32, float16 (2x smaller) or int8 (4x, trained per-dimension
+ranges). Compressed indexes fetch RAG_ANN_REFINE x k candidates and re-score
+them against float32 vectors — the caller's (usually the memory-mapped index
+cache, see `drop_vectors`), else the decoded codes — so the returned scores
+stay usable for the cosine gates.
+
+    python -m app.services.ann_index --chunks 100000 --dim 384 --storages float32 int8
+
+prints recall@k, per-query latency and bytes per vector of each kind against
+exact float32 flat search.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_KINDS = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+FAISS_INDEX = os.getenv("RAG_FAISS_INDEX", "auto").lower()  # auto | flat | hnsw | ivf_flat | ivf_pq
+ANN_FLAT_MAX = int(os.getenv("RAG_ANN_FLAT_MAX", "10000"))  # auto: exact search up to this many chunks
+ANN_HNSW_MAX = int(os.getenv("RAG_ANN_HNSW_MAX", "200000"))  # auto: hnsw up to here, ivf_pq above
+HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))  # raised to k when k is larger
+IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0 → 4·√n cells
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("RAG_PQ_M", "0"))  # sub-quantisers; 0 → dim / 8 (rounded down to a divisor)
+PQ_NBITS = int(os.getenv("RAG_PQ_NBITS", "8"))
+VECTOR_STORAGE = os.getenv("RAG_VECTOR_STORAGE", "float32").lower()  # float32 | float16 | int8
+ANN_REFINE = int(os.getenv("RAG_ANN_REFINE", "4"))  # compressed codes: candidates per result, re-scored in float32
+
+VECTOR_STORAGES = ("float32", "float16", "int8")
+_SQ_TYPES = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+_CODE_BYTES = {"float32": 4, "float16": 2, "int8": 1}
+
+# k-means wants ~39 points per centroid; below that the cells are noise
+_MIN_POINTS_PER_CENTROID = 39
+_TRAIN_POINTS_PER_CENTROID = 256
+_SQ_TRAIN_POINTS = 65536  # int8 ranges are per-dimension min / max — a sample is plenty
+
+
+def resolve_index_kind(kind: str, n: int, *, flat_max: int = ANN_FLAT_MAX, hnsw_max: int = ANN_HNSW_MAX,
+                       pq_nbits: int = PQ_NBITS) -> str:
+    """Concrete index kind for `n` vectors: resolves auto and degrades kinds the corpus is too small to train."""
+    if kind not in ("auto",) + ANN_INDEX_KINDS:
+        logger.warning(f"Unknown RAG_FAISS_INDEX={kind!r} — using auto")
+        kind = "auto"
+    if kind == "auto":
+        kind = "flat" if n <= flat_max else "hnsw" if n <= hnsw_max else "ivf_pq"
+    if kind == "ivf_pq" and n < _MIN_POINTS_PER_CENTROID * (1 << pq_nbits):
+        kind = "ivf_flat"
+    if kind == "ivf_flat" and n < 2 * _MIN_POINTS_PER_CENTROID:
+        kind = "flat"
+    return kind
+
+
+def _pq_subquantizers(dim: int, requested: int) -> int:
+    m = requested if requested > 0 else max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def _is_mapped(array) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+class AnnIndex:
+    """
+    FAISS index over unit-norm float32 rows; `search` returns float32 inner-product
+    scores (re-scored when the index holds compressed codes).
+    """
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        kind: str = FAISS_INDEX,
+        *,
+        flat_max: int = ANN_FLAT_MAX,
+        hnsw_max: int = ANN_HNSW_MAX,
+        hnsw_m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+        nlist: int = IVF_NLIST,
+        nprobe: int = IVF_NPROBE,
+        pq_m: int = PQ_M,
+        pq_nbits: int = PQ_NBITS,
+        storage: str = VECTOR_STORAGE,
+        refine: int = ANN_REFINE,
+    ) -> None:
+        t0 = time.perf_counter()
+        self.embeddings = embeddings
+        self.n, self.dim = int(embeddings.shape[0]), int(embeddings.shape[1])
+        self.requested = kind
+        self.kind = resolve_index_kind(kind, self.n, flat_max=flat_max, hnsw_max=hnsw_max, pq_nbits=pq_nbits)
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.refine = max(1, refine)
+        self.nlist = 0
+        self.pq_m = 0
+        self.pq_nbits = pq_nbits
+        if storage not in VECTOR_STORAGES:
+            logger.warning(f"Unknown RAG_VECTOR_STORAGE={storage!r} — using float32")
+            storage = "float32"
+        self.storage = "pq" if self.kind == "ivf_pq" else storage
+        self.compressed = self.storage != "float32"
+        self.hnsw_m = hnsw_m
+        qtype = _SQ_TYPES.get(self.storage)
+        ip = faiss.METRIC_INNER_PRODUCT
+
+        if self.kind == "flat":
+            self.index = faiss.IndexFlatIP(self.dim) if qtype is None else faiss.IndexScalarQuantizer(self.dim, qtype, ip)
+        elif self.kind == "hnsw":
+            if qtype is None:
+                self.index = faiss.IndexHNSWFlat(self.dim, hnsw_m, ip)
+            else:
+                self.index = faiss.IndexHNSWSQ(self.dim, qtype, hnsw_m, ip)
+            self.index.hnsw.efConstruction = ef_construction
+        else:
+            wanted = nlist if nlist > 0 else int(4 * np.sqrt(self.n))
+            self.nlist = max(1, min(wanted, self.n // _MIN_POINTS_PER_CENTROID))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            if self.kind == "ivf_pq":
+                self.pq_m = _pq_subquantizers(self.dim, pq_m)
+                self.index = faiss.IndexIVFPQ(quantizer, self.dim, self.nlist, self.pq_m, pq_nbits, ip)
+            elif qtype is None:
+                self.index = faiss.IndexIVFFlat(quantizer, self.dim, self.nlist, ip)
+            else:
+                self.index = faiss.IndexIVFScalarQuantizer(quantizer, self.dim, self.nlist, qtype, ip)
+            self._quantizer = quantizer  # the IVF index does not own it
+        if not self.index.is_trained:
+            self.index.train(self._training_sample())
+        self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+        if self.compressed and self.nlist:
+            self.index.make_direct_map()  # id → code, for decoding without float32 rows
+        self.build_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    def _training_sample(self) -> np.ndarray:
+        centroids = max(self.nlist, (1 << self.pq_nbits) if self.kind == "ivf_pq" else 0)
+        size = min(self.n, max(centroids * _TRAIN_POINTS_PER_CENTROID, _SQ_TRAIN_POINTS))
+        rows = np.random.default_rng(0).choice(self.n, size=size, replace=False) if size < self.n else slice(None)
+        return np.ascontiguousarray(self.embeddings[rows], dtype=np.float32)
+
+    def search(self, queries: np.ndarray, k: int, *, ef_search: Optional[int] = None,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, ids) of shape (len(queries), k), best first; missing slots are id -1."""
+        q = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        k = min(k, self.n)
+        if k <= 0:
+            return np.zeros((q.shape[0], 0), dtype=np.float32), np.zeros((q.shape[0], 0), dtype=np.int64)
+        fetch = min(self.n, k * self.refine) if self.compressed else k
+        params = None
+        if self.kind == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=max(ef_search or self.ef_search, fetch))
+        elif self.kind != "flat":
+            params = faiss.SearchParametersIVF(nprobe=min(nprobe or self.nprobe, self.nlist))
+        scores, ids = self.index.search(q, fetch, params=params)
+        if not self.compressed:
+            return scores, ids
+        rows = self.vectors(np.maximum(ids, 0).reshape(-1)).reshape(ids.shape + (self.dim,))
+        exact = np.einsum("qcd,qd->qc", rows, q)
+        exact[ids < 0] = -np.inf
+        order = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(exact, order, axis=1).astype(np.float32)
+        ids = np.where(np.isfinite(scores), np.take_along_axis(ids, order, axis=1), -1)
+        return scores, ids
+
+    def vectors(self, rows) -> np.ndarray:
+        """float32 rows for ids `rows`: the kept matrix when there is one, else decoded from the codes."""
+        if self.embeddings is not None:
+            return np.asarray(self.embeddings[rows], dtype=np.float32)
+        return self.index.reconstruct_batch(np.ascontiguousarray(rows, dtype=np.int64))
+
+    def drop_vectors(self, mapped: Optional[np.ndarray] = None) -> None:
+        """
+        Release the float32 matrix the index was built from (compressed storage
+        only). `mapped` — the same rows memory-mapped from the index cache —
+        keeps re-scoring exact while only the pages of top candidates are read.
+        """
+        if self.compressed:
+            self.embeddings = mapped
+
+    def bytes_per_vector(self) -> float:
+        """FAISS-resident bytes per vector: codes plus graph links (hnsw) or list ids (ivf)."""
+        if self.kind == "ivf_pq":
+            code = self.pq_m * self.pq_nbits / 8
+        else:
+            code = self.dim * _CODE_BYTES[self.storage]
+        if self.kind == "hnsw":
+            code += 2 * self.hnsw_m * 4 * 1.05  # level-0 links (2M int32) + the sparse upper levels
+        elif self.kind != "flat":
+            code += 8 * (2 if self.compressed else 1)  # inverted-list id (+ direct map when compressed)
+        return round(code, 1)
+
+    def snapshot(self) -> dict:
+        if self.embeddings is None:
+            float32_rows = "dropped"
+        else:
+            float32_rows = "mapped" if _is_mapped(self.embeddings) else "resident"
+        info = {
+            "kind": self.kind,
+            "requested": self.requested,
+            "storage": self.storage,
+            "vectors": self.n,
+            "dim": self.dim,
+            "bytes_per_vector": self.bytes_per_vector(),
+            "float32_rows": float32_rows,
+            "build_ms": self.build_ms,
+        }
+        if self.kind == "hnsw":
+            info["ef_search"] = self.ef_search
+        elif self.kind != "flat":
+            info.update(nlist=self.nlist, nprobe=self.nprobe)
+            if self.kind == "ivf_pq":
+                info["pq_m"] = self.pq_m
+        if self.compressed:
+            info["refine"] = self.refine
+        return info
+
+
+def benchmark(
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    *,
+    k: int = 24,
+    kinds: Sequence[str] = ("hnsw", "ivf_flat", "ivf_pq"),
+    storages: Sequence[str] = ("float32",),
+    ef_search: Sequence[int] = (16, 32, 64, 128, 256),
+    nprobe: Sequence[int] = (1, 4, 8, 16, 32, 64),
+    drop_vectors: bool = True,
+) -> List[dict]:
+    """
+    Recall@k against exact float32 flat search, single-query latency (one query
+    at a time, as the chat path searches) and bytes per vector for each kind,
+    storage and search setting. With `drop_vectors` compressed indexes re-score
+    from their own decoded codes — the worst case, without the mapped cache.
+    """
+    flat = AnnIndex(embeddings, "flat", storage="float32")
+    truth, flat_ms = _timed_search(flat, queries, k)
+    rows = []
+    for kind in ("flat",) + tuple(kinds):
+        for storage in storages if kind != "ivf_pq" else ("float32",):  # PQ is its own codec
+            index = flat if (kind, storage) == ("flat", "float32") else AnnIndex(embeddings, kind, storage=storage)
+            if index.kind != kind:
+                logger.warning(f"{kind} needs a larger corpus than {index.n} vectors — skipped")
+                break
+            if drop_vectors:
+                index.drop_vectors()
+            if kind == "flat":
+                param, values = None, (None,)
+            else:
+                param, values = ("ef_search", ef_search) if kind == "hnsw" else ("nprobe", nprobe)
+            for value in values:
+                if index is flat:
+                    ids, latency = truth, flat_ms
+                else:
+                    ids, latency = _timed_search(index, queries, k, **({param: value} if param else {}))
+                recall = float(np.mean([
+                    len(set(found[found >= 0].tolist()) & set(expected.tolist())) / len(expected)
+                    for found, expected in zip(ids, truth)
+                ]))
+                rows.append({"kind": kind, "storage": index.storage, "param": param, "value": value,
+                             "recall": round(recall, 4), **latency,
+                             "bytes_per_vector": index.bytes_per_vector(), "build_ms": index.build_ms})
+    return rows
+
+
+def _timed_search(index: AnnIndex, queries: np.ndarray, k: int, **params) -> Tuple[np.ndarray, dict]:
+    ids, took = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        _, found = index.search(query, k, **params)
+        took.append((time.perf_counter() - t0) * 1000)
+        ids.append(found[0])
+    return np.stack(ids), {"p50_ms": round(float(np.percentile(took, 50)), 3),
+                           "p95_ms": round(float(np.percentile(took, 95)), 3)}
+
+
+def _synthetic_corpus(n: int, dim: int, queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Clustered unit vectors (topics) and queries drawn near corpus rows, like paraphrased questions."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 200), dim)).astype(np.float32)
+    data = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    picked = data[rng.integers(0, n, queries)] + 0.05 * rng.standard_normal((queries, dim)).astype(np.float32)
+    picked /= np.linalg.norm(picked, axis=1, keepdims=True)
+    return data, picked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall / latency of the FAISS index kinds against flat search")
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=24)
+    parser.add_argument("--kinds", nargs="+", default=["hnsw", "ivf_flat", "ivf_pq"], choices=ANN_INDEX_KINDS[1:])
+    parser.add_argument("--storages", nargs="+", default=["float32"], choices=VECTOR_STORAGES)
+    parser.add_argument("--rescore", default="codes", choices=("codes", "float32"),
+                        help="compressed indexes re-score from decoded codes, or from kept float32 rows (mapped cache)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    corpus, probe = _synthetic_corpus(args.chunks, args.dim, args.queries)
+    print(f"{'kind':<9} {'storage':<8} {'setting':<14} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'B/vector':>9} {'build ms':>10}")
+    for row in benchmark(corpus, probe, k=args.k, kinds=args.kinds, storages=args.storages,
+                         drop_vectors=args.rescore == "codes"):
+        setting = f"{row['param']}={row['value']}" if row["param"] else "-"
+        print(f"{row['kind']:<9} {row['storage']:<8} {setting:<14} {row['recall']:>9.4f} {row['p50_ms']:>8.3f} "
+              f"{row['p95_ms']:>8.3f} {row['bytes_per_vector']:>9.1f} "
+              f"{row['build_ms']:>10.1f}")
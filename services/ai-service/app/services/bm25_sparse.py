@@ -0,0 +1,168 @@
+"""
+BM25 (Okapi, ATIRE idf floor — same scores as rank_bm25.BM25Okapi) over a CSR
+term → document matrix of precomputed per-posting weights.
+
+    weight[t, d] = idf[t] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len[d] / avgdl))
+
+A query gathers the CSR rows of its terms and sums them per document, so the
+cost follows the query's postings rather than the corpus size; `top_k` uses
+`argpartition` over the matched documents only. Raw term frequencies and
+document lengths are kept, so documents can be added or removed without
+re-tokenising the rest (idf, avgdl and weights are recomputed vectorised).
+"""
+
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+class SparseBM25:
+    def __init__(self, corpus: Sequence[Sequence[str]] = (), k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: Dict[str, int] = {}  # term → row, in first-occurrence order (as rank_bm25's idf dict)
+        self._terms = np.zeros(0, dtype=np.int32)  # COO postings
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tf = np.zeros(0, dtype=np.int64)
+        self.doc_len = np.zeros(0, dtype=np.int64)
+        self.add(corpus)
+
+    @property
+    def corpus_size(self) -> int:
+        return int(self.doc_len.shape[0])
+
+    def add(self, corpus: Sequence[Sequence[str]]) -> List[int]:
+        """Append tokenised documents; returns their doc ids."""
+        first = self.corpus_size
+        terms, docs, tfs, lens = [], [], [], []
+        for offset, document in enumerate(corpus):
+            frequencies: Dict[str, int] = {}
+            for word in document:
+                frequencies[word] = frequencies.get(word, 0) + 1
+            for word, tf in frequencies.items():
+                terms.append(self.vocab.setdefault(word, len(self.vocab)))
+                docs.append(first + offset)
+                tfs.append(tf)
+            lens.append(len(document))
+        if lens:
+            self._terms = np.concatenate([self._terms, np.asarray(terms, dtype=np.int32)])
+            self._docs = np.concatenate([self._docs, np.asarray(docs, dtype=np.int32)])
+            self._tf = np.concatenate([self._tf, np.asarray(tfs, dtype=np.int64)])
+            self.doc_len = np.concatenate([self.doc_len, np.asarray(lens, dtype=np.int64)])
+            self._finalize()
+        return list(range(first, self.corpus_size))
+
+    def remove(self, doc_ids: Iterable[int]) -> None:
+        """Drop documents; the remaining ones keep their relative order (ids are renumbered)."""
+        drop = np.zeros(self.corpus_size, dtype=bool)
+        drop[list(doc_ids)] = True
+        self._select(np.flatnonzero(~drop))
+
+    def take(self, order: Sequence[int]) -> "SparseBM25":
+        """New index whose doc i is this index's doc `order[i]` (subset and/or reorder)."""
+        other = SparseBM25(k1=self.k1, b=self.b, epsilon=self.epsilon)
+        other.vocab = dict(self.vocab)
+        other._terms, other._docs, other._tf, other.doc_len = self._terms, self._docs, self._tf, self.doc_len
+        other._select(np.asarray(order, dtype=np.int64))
+        return other
+
+    def _select(self, order: np.ndarray) -> None:
+        remap = np.full(self.corpus_size, -1, dtype=np.int64)
+        remap[order] = np.arange(order.shape[0])
+        new_docs = remap[self._docs] if self._docs.size else self._docs.astype(np.int64)
+        keep = new_docs >= 0
+        self._terms = self._terms[keep]
+        self._docs = new_docs[keep].astype(np.int32)
+        self._tf = self._tf[keep]
+        self.doc_len = self.doc_len[order]
+        # Terms no longer in any document leave the vocabulary (they would skew the average idf)
+        used = np.zeros(len(self.vocab), dtype=bool)
+        used[self._terms] = True
+        if not used.all():
+            new_ids = np.cumsum(used) - 1
+            self.vocab = {term: int(new_ids[i]) for term, i in self.vocab.items() if used[i]}
+            self._terms = new_ids[self._terms].astype(np.int32)
+        self._finalize()
+
+    def _finalize(self) -> None:
+        """CSR layout (postings sorted by term, then doc) and the BM25 weight per posting."""
+        order = np.lexsort((self._docs, self._terms))
+        self._terms, self._docs, self._tf = self._terms[order], self._docs[order], self._tf[order]
+        n_terms = len(self.vocab)
+        df = np.bincount(self._terms, minlength=n_terms)
+        self.indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        n = self.corpus_size
+        idf = [math.log(n - int(freq) + 0.5) - math.log(int(freq) + 0.5) for freq in df]
+        average_idf = sum(idf) / len(idf) if idf else 0.0
+        eps = self.epsilon * average_idf
+        self.idf = np.asarray([value if value >= 0 else eps for value in idf], dtype=np.float64)
+        self.avgdl = int(self.doc_len.sum()) / n if n else 0.0
+
+        tf = self._tf
+        dl = self.doc_len[self._docs]
+        norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / self.avgdl)) if n else tf
+        self.weights = self.idf[self._terms] * norm
+
+    def _postings(self, query: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, summed scores) of documents sharing at least one query term."""
+        rows = [self.vocab[q] for q in query if q in self.vocab]
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        slices = [slice(self.indptr[r], self.indptr[r + 1]) for r in rows]
+        docs = np.unique(np.concatenate([self._docs[sl] for sl in slices])).astype(np.int64)
+        scores = np.zeros(docs.shape[0])
+        for sl in slices:  # term by term, in query order — the same float additions as BM25Okapi
+            scores[np.searchsorted(docs, self._docs[sl])] += self.weights[sl]
+        return docs, scores
+
+    def get_scores(self, query: Sequence[str]) -> np.ndarray:
+        """Dense scores for every document (BM25Okapi.get_scores compatible)."""
+        scores = np.zeros(self.corpus_size)
+        docs, values = self._postings(query)
+        scores[docs] = values
+        return scores
+
+    def top_k(self, query: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Doc ids and scores of the best `k` positive-scoring documents, best first."""
+        docs, values = self._postings(query)
+        positive = values > 0
+        docs, values = docs[positive], values[positive]
+        if k <= 0 or not docs.size:
+            return docs[:0], values[:0]
+        if docs.size > k:
+            part = np.argpartition(-values, k - 1)[:k]
+            docs, values = docs[part], values[part]
+        order = np.lexsort((docs, -values))
+        return docs[order], values[order]
+
+    def save(self, path: Path) -> None:
+        terms = sorted(self.vocab, key=self.vocab.__getitem__)
+        with open(path, "wb") as fh:
+            np.savez(
+                fh,
+                vocab=np.asarray(terms, dtype=str),
+                terms=self._terms,
+                docs=self._docs,
+                tf=self._tf,
+                doc_len=self.doc_len,
+                params=np.asarray([self.k1, self.b, self.epsilon]),
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "SparseBM25":
+        with np.load(path, allow_pickle=False) as data:
+            k1, b, epsilon = (float(x) for x in data["params"])
+            index = cls(k1=k1, b=b, epsilon=epsilon)
+            index.vocab = {str(term): i for i, term in enumerate(data["vocab"])}
+            index._terms = data["terms"]
+            index._docs = data["docs"]
+            index._tf = data["tf"]
+            index.doc_len = data["doc_len"]
+        index._finalize()
+        return index
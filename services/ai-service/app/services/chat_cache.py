@@ -0,0 +1,234 @@
+"""
+Chat-path caches for the RAG chatbot: semantic answers and exact-match query
+embeddings.
+
+Support questions repeat heavily (pricing, cancellation, wallet top-up), so a
+finished LLM answer is stored under its query embedding and served again when
+a later query lands within `threshold` cosine of it — skipping rewrite,
+retrieval, rerank and the LLM round trip. Entries are tied to the knowledge
+index version that produced them: a re-index with new content empties the
+cache. Eviction is LRU over `max_entries` plus a TTL per entry.
+
+Vectors live in one preallocated (max_entries, dim) matrix, so a lookup is a
+single matrix-vector product over the live slots.
+
+Quick-menu chips and common short questions also send byte-identical embed
+texts; `EmbeddingLRU` returns their vectors without a transformer forward pass,
+bounded by a memory budget rather than an entry count.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class _Entry:
+    __slots__ = ("slot", "payload", "created")
+
+    def __init__(self, slot: int, payload: dict, created: float) -> None:
+        self.slot = slot
+        self.payload = payload
+        self.created = created
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        *,
+        max_entries: int = 1024,
+        ttl_s: float = 3600.0,
+        threshold: float = 0.95,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()  # normalized query → entry, LRU first
+        self._slot_keys: List[Optional[str]] = [None] * self.max_entries
+        self._free: List[int] = list(range(self.max_entries - 1, -1, -1))
+        self._matrix: Optional[np.ndarray] = None
+        self._live = np.zeros(self.max_entries, dtype=bool)
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._expired = 0
+        self._invalidations = 0
+        self._similarity_sum = 0.0
+
+    def set_version(self, version: Optional[str]) -> None:
+        """Knowledge index version answers are valid for; a change drops every entry."""
+        with self._lock:
+            if version == self._version:
+                return
+            if self._entries:
+                self._invalidations += 1
+            self._clear_locked()
+            self._version = version
+
+    def lookup(self, vector, version: Optional[str]) -> Optional[Tuple[dict, float]]:
+        """(copy of the stored payload, cosine) of the closest live entry above threshold, else None."""
+        query = _unit(vector)
+        with self._lock:
+            if version != self._version or not self._entries or query.shape[0] != self._dim():
+                self._misses += 1
+                return None
+            sims = self._matrix @ query
+            sims[~self._live] = -np.inf
+            now = self._clock()
+            while True:
+                slot = int(np.argmax(sims))
+                similarity = float(sims[slot])
+                if similarity < self.threshold:
+                    self._misses += 1
+                    return None
+                key = self._slot_keys[slot]
+                entry = self._entries[key]
+                if now - entry.created <= self.ttl_s:
+                    break
+                self._expired += 1
+                self._remove_locked(key)
+                sims[slot] = -np.inf
+            self._entries.move_to_end(key)
+            self._hits += 1
+            self._similarity_sum += similarity
+            return dict(entry.payload), similarity
+
+    def store(self, query_text: str, vector, version: Optional[str], payload: dict) -> None:
+        vec = _unit(vector)
+        key = normalize_query(query_text)
+        with self._lock:
+            if version != self._version:
+                return  # answer built on an index that has since been replaced
+            if self._matrix is None or vec.shape[0] != self._dim():
+                self._clear_locked()
+                self._matrix = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+            if key in self._entries:
+                self._remove_locked(key)
+            if not self._free:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self._evictions += 1
+            slot = self._free.pop()
+            self._matrix[slot] = vec
+            self._live[slot] = True
+            self._slot_keys[slot] = key
+            self._entries[key] = _Entry(slot, dict(payload), self._clock())
+            self._stores += 1
+
+    def _dim(self) -> int:
+        return self._matrix.shape[1] if self._matrix is not None else -1
+
+    def _remove_locked(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._live[entry.slot] = False
+        self._slot_keys[entry.slot] = None
+        self._free.append(entry.slot)
+
+    def _clear_locked(self) -> None:
+        self._entries.clear()
+        self._live[:] = False
+        self._slot_keys = [None] * self.max_entries
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "threshold": self.threshold,
+                "version": self._version,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "mean_hit_similarity": round(self._similarity_sum / self._hits, 4) if self._hits else None,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "expired": self._expired,
+                "invalidations": self._invalidations,
+            }
+
+
+class EmbeddingLRU:
+    """(embedding model, normalized embed text) → read-only float32 vector, LRU within `budget_bytes`."""
+
+    _ENTRY_OVERHEAD = 160  # dict slot, key tuple, ndarray header
+
+    def __init__(self, model_name: str, budget_bytes: int) -> None:
+        self.model_name = model_name
+        self.budget_bytes = max(0, budget_bytes)
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _key(self, text: str) -> Tuple[str, str]:
+        return self.model_name, " ".join(unicodedata.normalize("NFC", text).split())
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return vector
+
+    def put(self, text: str, vector) -> np.ndarray:
+        """Store and return the cached (read-only float32) copy of `vector`."""
+        vec = np.array(vector, dtype=np.float32).reshape(-1)
+        vec.setflags(write=False)
+        key = self._key(text)
+        cost = vec.nbytes + len(key[1]) + self._ENTRY_OVERHEAD
+        if cost > self.budget_bytes:
+            return vec
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes + len(key[1]) + self._ENTRY_OVERHEAD
+            while self._entries and self._bytes + cost > self.budget_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes + len(evicted_key[1]) + self._ENTRY_OVERHEAD
+                self._evictions += 1
+            self._entries[key] = vec
+            self._bytes += cost
+        return vec
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "model": self.model_name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+def _unit(vector) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm > 0 else vec
@@ -0,0 +1,293 @@
+"""
+Compiled tree-ensemble inference for the joblib models.
+
+sklearn's per-call overhead (input validation, joblib dispatch for forests
+saved with n_jobs=-1, per-tree Python loops) dominates at our batch sizes of
+1–500 rows. At load time each fitted ensemble is flattened into contiguous
+node arrays (feature, threshold, left, right, value) shared by all trees, and
+evaluated with a level-synchronous NumPy traversal: every (row, tree) pair
+advances one level per step, and leaves point to themselves so no masking is
+needed. The arrays are read-only and can be shared across workers.
+
+Supported: RandomForestRegressor / DecisionTreeRegressor (single output),
+MultiOutputRegressor wrapping those, GradientBoostingRegressor and
+GradientBoostingClassifier. Anything else raises ValueError and the caller
+keeps the sklearn estimator.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENGINE_SKLEARN = "sklearn"
+ENGINE_COMPILED = "compiled"
+
+KIND_REGRESSOR = "regressor"
+KIND_BINARY = "binary_classifier"
+KIND_MULTICLASS = "multiclass_classifier"
+
+# Rows traversed per step; bounds the (rows × trees) index working set
+CHUNK_ROWS = 1024
+
+# Node / weight arrays that make up a compiled ensemble
+ARRAY_FIELDS = ("feature", "threshold", "left", "right", "value", "roots", "weights", "baseline")
+
+
+class CompiledTreeEnsemble:
+    """Flattened tree ensemble with sklearn-compatible predict / predict_proba."""
+
+    def __init__(
+        self,
+        *,
+        kind: str,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        weights: np.ndarray,
+        baseline: np.ndarray,
+        max_depth: int,
+        n_features: int,
+        classes: Optional[np.ndarray] = None,
+        source: str = "",
+        multioutput: bool = False,
+    ) -> None:
+        self.kind = kind
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        # weights[t, k]: contribution of tree t's leaf value to output k
+        self.weights = weights
+        self.baseline = baseline
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.classes_ = classes
+        self.source = source
+        self.multioutput = bool(multioutput)
+        for name in ARRAY_FIELDS:
+            getattr(self, name).setflags(write=False)
+
+    @property
+    def n_trees(self) -> int:
+        return int(self.roots.shape[0])
+
+    @property
+    def n_nodes(self) -> int:
+        return int(self.feature.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(getattr(self, name).nbytes for name in ARRAY_FIELDS))
+
+    def arrays(self) -> dict:
+        return {name: getattr(self, name) for name in ARRAY_FIELDS}
+
+    def meta(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_depth": self.max_depth,
+            "n_features": self.n_features_in_,
+            "classes": self.classes_.tolist() if self.classes_ is not None else None,
+            "source": self.source,
+            "multioutput": self.multioutput,
+        }
+
+    def _leaf_values(self, X) -> np.ndarray:
+        """(n, n_trees) leaf value reached by every row in every tree."""
+        # sklearn trees evaluate float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"Expected input of shape (n, {self.n_features_in_}), got {X.shape}"
+            )
+        n = X.shape[0]
+        rows = np.arange(n)[:, None]
+        nodes = np.broadcast_to(self.roots, (n, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes]
+
+    def raw_predict(self, X) -> np.ndarray:
+        """(n, n_outputs) summed ensemble output before any link function."""
+        X = np.asarray(X)
+        if X.shape[0] <= CHUNK_ROWS:
+            return self.baseline + self._leaf_values(X) @ self.weights
+        return np.vstack([
+            self.baseline + self._leaf_values(X[start:start + CHUNK_ROWS]) @ self.weights
+            for start in range(0, X.shape[0], CHUNK_ROWS)
+        ])
+
+    def predict(self, X) -> np.ndarray:
+        raw = self.raw_predict(X)
+        if self.kind == KIND_REGRESSOR:
+            return raw if self.multioutput else raw[:, 0]
+        proba = self.predict_proba(X)
+        return self.classes_[np.argmax(proba, axis=1)]
+
+    def predict_proba(self, X) -> np.ndarray:
+        if self.kind == KIND_BINARY:
+            p1 = 1.0 / (1.0 + np.exp(-self.raw_predict(X)[:, 0]))
+            return np.column_stack([1.0 - p1, p1])
+        if self.kind == KIND_MULTICLASS:
+            raw = self.raw_predict(X)
+            exp = np.exp(raw - raw.max(axis=1, keepdims=True))
+            return exp / exp.sum(axis=1, keepdims=True)
+        raise AttributeError("predict_proba is only available for classifiers")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Compilation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _single_output_trees(estimator) -> List:
+    """Return the fitted sklearn `Tree` objects of a single-output forest or tree."""
+    trees = [est.tree_ for est in estimator.estimators_] if hasattr(estimator, "estimators_") else [estimator.tree_]
+    for tree in trees:
+        if tree.n_outputs != 1:
+            raise ValueError("multi-output trees are not supported; wrap in MultiOutputRegressor")
+    return trees
+
+
+def _flatten(tree_groups: List[Tuple[int, float, List]], n_outputs: int):
+    """
+    tree_groups: [(output_index, weight, [Tree, ...]), ...]
+    Concatenate all trees into shared node arrays with absolute child indices.
+    """
+    features, thresholds, lefts, rights, values = [], [], [], [], []
+    roots, weights = [], []
+    offset = 0
+    max_depth = 0
+    for output_index, weight, trees in tree_groups:
+        for tree in trees:
+            n_nodes = tree.node_count
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            is_leaf = left == -1
+            own = np.arange(n_nodes, dtype=np.int64)
+            # Leaves point to themselves so extra traversal steps are no-ops
+            lefts.append(np.where(is_leaf, own, left) + offset)
+            rights.append(np.where(is_leaf, own, right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+            row = np.zeros(n_outputs, dtype=np.float64)
+            row[output_index] = weight
+            weights.append(row)
+            max_depth = max(max_depth, int(tree.max_depth))
+            offset += n_nodes
+
+    return dict(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        value=np.concatenate(values),
+        roots=np.asarray(roots, dtype=np.int64),
+        weights=np.vstack(weights),
+        max_depth=max_depth,
+    )
+
+
+def compile_model(model) -> CompiledTreeEnsemble:
+    """Flatten a fitted sklearn tree ensemble. Raises ValueError when unsupported."""
+    from sklearn.ensemble import (
+        GradientBoostingClassifier,
+        GradientBoostingRegressor,
+        RandomForestRegressor,
+    )
+    from sklearn.multioutput import MultiOutputRegressor
+    from sklearn.tree import DecisionTreeRegressor
+
+    if isinstance(model, MultiOutputRegressor):
+        groups = []
+        for k, est in enumerate(model.estimators_):
+            if not isinstance(est, (RandomForestRegressor, DecisionTreeRegressor)):
+                raise ValueError(f"unsupported MultiOutputRegressor member: {type(est).__name__}")
+            trees = _single_output_trees(est)
+            groups.append((k, 1.0 / len(trees), trees))
+        flat = _flatten(groups, n_outputs=len(groups))
+        return CompiledTreeEnsemble(
+            kind=KIND_REGRESSOR,
+            baseline=np.zeros(len(groups)),
+            n_features=model.estimators_[0].n_features_in_,
+            source=f"MultiOutputRegressor[{type(model.estimators_[0]).__name__}]",
+            multioutput=True,
+            **flat,
+        )
+
+    if isinstance(model, (RandomForestRegressor, DecisionTreeRegressor)):
+        trees = _single_output_trees(model)
+        flat = _flatten([(0, 1.0 / len(trees), trees)], n_outputs=1)
+        return CompiledTreeEnsemble(
+            kind=KIND_REGRESSOR,
+            baseline=np.zeros(1),
+            n_features=model.n_features_in_,
+            source=type(model).__name__,
+            **flat,
+        )
+
+    if isinstance(model, (GradientBoostingRegressor, GradientBoostingClassifier)):
+        n_outputs = model.estimators_.shape[1]
+        groups = [
+            (k, float(model.learning_rate), [model.estimators_[stage, k].tree_])
+            for stage in range(model.estimators_.shape[0])
+            for k in range(n_outputs)
+        ]
+        flat = _flatten(groups, n_outputs=n_outputs)
+        # Constant prior from the init estimator (DummyRegressor / DummyClassifier or "zero")
+        probe = np.zeros((1, model.n_features_in_), dtype=np.float32)
+        baseline = np.asarray(model._raw_predict_init(probe), dtype=np.float64)[0]
+        if isinstance(model, GradientBoostingRegressor):
+            kind, classes = KIND_REGRESSOR, None
+        else:
+            kind = KIND_BINARY if n_outputs == 1 else KIND_MULTICLASS
+            classes = np.asarray(model.classes_)
+        return CompiledTreeEnsemble(
+            kind=kind,
+            baseline=baseline,
+            n_features=model.n_features_in_,
+            classes=classes,
+            source=type(model).__name__,
+            **flat,
+        )
+
+    raise ValueError(f"unsupported model type: {type(model).__name__}")
+
+
+def maybe_compile(model, engine: str, name: str):
+    """
+    Return the estimator to serve for `engine` ("sklearn" | "compiled").
+    Compilation failures are logged and fall back to the sklearn estimator.
+    """
+    if model is None or (engine or ENGINE_SKLEARN).strip().lower() != ENGINE_COMPILED:
+        return model
+    if isinstance(model, CompiledTreeEnsemble):
+        return model
+    try:
+        compiled = compile_model(model)
+    except Exception as exc:
+        logger.warning(f"{name}: tree compilation failed ({exc}) — serving sklearn estimator")
+        return model
+    logger.info(
+        f"{name}: compiled {compiled.n_trees} trees / {compiled.n_nodes} nodes "
+        f"(depth≤{compiled.max_depth}, {compiled.nbytes // 1024} KB)"
+    )
+    return compiled
+
+
+def engine_name(model) -> Optional[str]:
+    if model is None:
+        return None
+    return ENGINE_COMPILED if isinstance(model, CompiledTreeEnsemble) else ENGINE_SKLEARN
@@ -0,0 +1,176 @@
+"""Bounded executor that keeps CPU-bound model inference off the asyncio event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class InferenceOverloadedError(RuntimeError):
+    """Raised when the executor queue or an endpoint's concurrency cap is saturated."""
+
+    def __init__(self, endpoint: str, reason: str):
+        super().__init__(f"Inference overloaded ({endpoint}): {reason}")
+        self.endpoint = endpoint
+        self.reason = reason
+
+
+class InferenceExecutor:
+    """
+    Thread pool sized to the container's cores, with an optional process pool
+    for heavy batches.
+
+    Admission is non-blocking: a call is rejected with InferenceOverloadedError
+    when `max_workers + max_queue` jobs are already pending, or when its
+    endpoint already has `endpoint_limits[endpoint]` jobs in flight. Slots are
+    released when the worker finishes, not when the caller stops waiting, so a
+    timed-out caller still counts against the queue until its job ends.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        max_workers: int,
+        max_queue: int,
+        endpoint_limits: Optional[Dict[str, int]] = None,
+        default_endpoint_limit: int = 0,
+        process_workers: int = 0,
+        process_min_rows: int = 0,
+    ) -> None:
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self.default_endpoint_limit = max(0, default_endpoint_limit)
+        self.process_workers = max(0, process_workers)
+        self.process_min_rows = max(1, process_min_rows)
+
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=f"{name}-infer",
+        )
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._inflight: Dict[str, int] = {}
+        self._completed: Dict[str, int] = {}
+        self._rejected: Dict[str, int] = {}
+
+    def _limit_for(self, endpoint: str) -> int:
+        return self.endpoint_limits.get(endpoint, self.default_endpoint_limit)
+
+    def _acquire(self, endpoint: str) -> None:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected[endpoint] = self._rejected.get(endpoint, 0) + 1
+                raise InferenceOverloadedError(endpoint, f"queue full ({self._pending} pending)")
+            limit = self._limit_for(endpoint)
+            inflight = self._inflight.get(endpoint, 0)
+            if limit and inflight >= limit:
+                self._rejected[endpoint] = self._rejected.get(endpoint, 0) + 1
+                raise InferenceOverloadedError(endpoint, f"concurrency cap {limit} reached")
+            self._pending += 1
+            self._inflight[endpoint] = inflight + 1
+
+    def _release(self, endpoint: str) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._inflight[endpoint] = self._inflight.get(endpoint, 1) - 1
+            self._completed[endpoint] = self._completed.get(endpoint, 0) + 1
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._processes is None:
+                # spawn: never fork a process that already holds torch / BLAS threads
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._processes
+
+    def _pick_pool(self, rows: int) -> Executor:
+        if self.process_workers and rows >= self.process_min_rows:
+            return self._process_pool()
+        return self._threads
+
+    def submit(self, endpoint: str, fn: Callable[..., T], *args, rows: int = 1) -> "Future[T]":
+        """
+        Admit and schedule `fn(*args)`. `rows` lets heavy batches go to the process
+        pool — `fn` and its arguments must then be picklable (module-level function).
+        """
+        self._acquire(endpoint)
+        try:
+            future = self._pick_pool(rows).submit(fn, *args)
+        except BaseException:
+            self._release(endpoint)
+            raise
+        future.add_done_callback(lambda _: self._release(endpoint))
+        return future
+
+    async def run(self, endpoint: str, fn: Callable[..., T], *args, rows: int = 1) -> T:
+        """Await `fn(*args)` on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(endpoint, fn, *args, rows=rows))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "inflight": {k: v for k, v in self._inflight.items() if v},
+                "completed": dict(self._completed),
+                "rejected": dict(self._rejected),
+                "endpoint_limits": dict(self.endpoint_limits),
+                "process_workers": self.process_workers,
+                "process_pool_started": self._processes is not None,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._threads.shutdown(wait=wait, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait, cancel_futures=True)
+
+
+def _default_workers() -> int:
+    return settings.AI_INFERENCE_WORKERS or (os.cpu_count() or 1)
+
+
+def _rag_workers() -> int:
+    return settings.AI_RAG_WORKERS or max(1, (os.cpu_count() or 1) // 4)
+
+
+def rag_torch_threads() -> int:
+    """torch intra-op threads per RAG call: half the cores shared by the RAG workers."""
+    return settings.AI_RAG_TORCH_THREADS or max(1, (os.cpu_count() or 1) // 2 // _rag_workers())
+
+
+# Global instance shared by all /api/predict* handlers
+inference_executor = InferenceExecutor(
+    name="ml",
+    max_workers=_default_workers(),
+    max_queue=settings.AI_INFERENCE_MAX_QUEUE,
+    endpoint_limits=settings.AI_INFERENCE_ENDPOINT_LIMITS,
+    default_endpoint_limit=settings.AI_INFERENCE_DEFAULT_LIMIT,
+    process_workers=settings.AI_INFERENCE_PROCESS_WORKERS,
+    process_min_rows=settings.AI_INFERENCE_PROCESS_MIN_ROWS,
+)
+
+# Dedicated pool for /api/chat torch work (query embedding, hybrid search, rerank)
+rag_executor = InferenceExecutor(
+    name="rag",
+    max_workers=_rag_workers(),
+    max_queue=settings.AI_RAG_MAX_QUEUE,
+)
@@ -0,0 +1,116 @@
+"""
+Process-wide pooled HTTP clients for the LLM providers (OpenAI, Gemini, Claude, Groq).
+
+One ``httpx.AsyncClient`` per provider, created at startup and reused by every
+chat turn and query rewrite, so calls ride an already-open TLS connection
+instead of paying a TCP + TLS handshake each time. HTTP/2 is used when the
+``h2`` package is installed (``httpx[http2]``), otherwise HTTP/1.1 keep-alive.
+Connect and read budgets are separate: a slow handshake fails fast without
+shrinking the time allowed for generation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+LLM_PROVIDERS = ("openai", "gemini", "claude", "groq")
+
+LLM_HTTP2_ENABLED = os.getenv("RAG_LLM_HTTP2", "true").lower() in ("true", "1", "yes")
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("RAG_LLM_CONNECT_TIMEOUT_S", "1.5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("RAG_LLM_MAX_CONNECTIONS", "32"))  # per provider
+LLM_MAX_KEEPALIVE = int(os.getenv("RAG_LLM_MAX_KEEPALIVE", "16"))  # per provider
+LLM_KEEPALIVE_EXPIRY_S = float(os.getenv("RAG_LLM_KEEPALIVE_EXPIRY_S", "90"))
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMHttpPool:
+    """
+    Lazily-created per-provider clients. A client is bound to the event loop it
+    was created on; a call from another loop (tests, scripts using
+    ``asyncio.run``) gets a fresh client for that loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        http2: bool = LLM_HTTP2_ENABLED,
+        connect_timeout_s: float = LLM_CONNECT_TIMEOUT_S,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive: int = LLM_MAX_KEEPALIVE,
+        keepalive_expiry_s: float = LLM_KEEPALIVE_EXPIRY_S,
+    ) -> None:
+        self.http2 = http2 and _h2_available()
+        if http2 and not self.http2:
+            logger.warning("h2 not installed — LLM clients use HTTP/1.1 keep-alive (pip install 'httpx[http2]')")
+        self.connect_timeout_s = connect_timeout_s
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry_s,
+        )
+        self._clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+        self._requests: Dict[str, int] = {}
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=httpx.Timeout(10.0))
+
+    def client(self, provider: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(provider)
+        if entry is None or entry[0] is not loop or entry[1].is_closed:
+            entry = (loop, self._new_client())
+            self._clients[provider] = entry
+        return entry[1]
+
+    def timeout(self, timeout_s: float) -> httpx.Timeout:
+        """`timeout_s` for read / write / pool wait; connect capped separately."""
+        return httpx.Timeout(timeout_s, connect=min(self.connect_timeout_s, timeout_s))
+
+    async def post(self, provider: str, url: str, *, timeout_s: float, **kwargs) -> httpx.Response:
+        self._requests[provider] = self._requests.get(provider, 0) + 1
+        return await self.client(provider).post(url, timeout=self.timeout(timeout_s), **kwargs)
+
+    def stream(self, provider: str, url: str, *, timeout_s: float, **kwargs):
+        """Streamed POST (`async with pool.stream(...) as resp`); `timeout_s` bounds each read."""
+        self._requests[provider] = self._requests.get(provider, 0) + 1
+        return self.client(provider).stream("POST", url, timeout=self.timeout(timeout_s), **kwargs)
+
+    async def start(self, providers=LLM_PROVIDERS) -> None:
+        """Create the clients on the serving loop (connections open on first use)."""
+        for provider in providers:
+            self.client(provider)
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        loop = asyncio.get_running_loop()
+        for client_loop, client in clients.values():
+            if client_loop is loop:
+                await client.aclose()
+
+    def snapshot(self) -> dict:
+        return {
+            "http2": self.http2,
+            "connect_timeout_s": self.connect_timeout_s,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "clients": sorted(self._clients),
+            "requests": dict(self._requests),
+        }
+
+
+# Global pool shared by all LLM calls
+llm_http_pool = LLMHttpPool()
@@ -0,0 +1,426 @@
+"""
+Latency-aware LLM provider calls: hedged requests across the provider order,
+per-provider circuit breakers and adaptive timeouts.
+
+The primary provider is started first; if it has not answered within its hedge
+delay (rolling p90 of its recent latencies, or a fixed default
+until enough samples exist) the next provider is started in parallel. The
+first non-empty answer wins and the still-running calls are cancelled. A
+provider that fails outright hands over to the next one immediately, as the
+old sequential loop did.
+
+Each provider also has a circuit breaker (closed → open → half-open) fed by
+every call outcome, timeouts included. An open breaker skips the provider
+without a network call until its cooldown expires; one probe call then decides
+between closing it and re-opening with a doubled cooldown. Answer calls get a
+timeout of `multiplier × p99` of the provider's recent latencies (bounded by
+the configured timeout) instead of a fixed 5 s.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEDGE_ENABLED = os.getenv("RAG_LLM_HEDGE_ENABLED", "true").lower() in ("true", "1", "yes")
+HEDGE_QUANTILE = float(os.getenv("RAG_LLM_HEDGE_QUANTILE", "0.9"))
+HEDGE_DELAY_MS = float(os.getenv("RAG_LLM_HEDGE_DELAY_MS", "1500"))  # until MIN_SAMPLES latencies are known
+HEDGE_MIN_DELAY_MS = float(os.getenv("RAG_LLM_HEDGE_MIN_DELAY_MS", "300"))
+HEDGE_MAX_DELAY_MS = float(os.getenv("RAG_LLM_HEDGE_MAX_DELAY_MS", "2500"))
+HEDGE_MIN_SAMPLES = int(os.getenv("RAG_LLM_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = int(os.getenv("RAG_LLM_LATENCY_WINDOW", "200"))
+
+BREAKER_ENABLED = os.getenv("RAG_LLM_BREAKER_ENABLED", "true").lower() in ("true", "1", "yes")
+BREAKER_WINDOW = int(os.getenv("RAG_LLM_BREAKER_WINDOW", "20"))  # recent outcomes considered
+BREAKER_MIN_CALLS = int(os.getenv("RAG_LLM_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("RAG_LLM_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_CONSECUTIVE_FAILURES = int(os.getenv("RAG_LLM_BREAKER_CONSECUTIVE_FAILURES", "3"))
+BREAKER_COOLDOWN_S = float(os.getenv("RAG_LLM_BREAKER_COOLDOWN_S", "30"))
+BREAKER_MAX_COOLDOWN_S = float(os.getenv("RAG_LLM_BREAKER_MAX_COOLDOWN_S", "300"))
+
+ADAPTIVE_TIMEOUT_ENABLED = os.getenv("RAG_LLM_ADAPTIVE_TIMEOUT", "true").lower() in ("true", "1", "yes")
+ADAPTIVE_TIMEOUT_QUANTILE = 0.99
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("RAG_LLM_TIMEOUT_MULTIPLIER", "2.0"))
+ADAPTIVE_TIMEOUT_MIN_S = float(os.getenv("RAG_LLM_MIN_TIMEOUT_S", "1.5"))
+
+ProviderCall = Callable[[str], Awaitable[Optional[str]]]
+
+
+class ProviderLatency:
+    """
+    Rolling window of call latencies (ms) for one provider. Answers are exact
+    samples; calls that ended without one (cancelled after a hedge, timed out,
+    failed) are right-censored — the latency was at least the elapsed time.
+    Dropping those would keep only the fast calls and pull the hedge delay and
+    the adaptive timeout down, so `quantile` is a product-limit (Kaplan-Meier)
+    estimate over both; with no censored samples it is the plain order statistic.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self._samples: Deque[Tuple[float, bool]] = deque(maxlen=max(1, window))  # (ms, answered)
+        self._lock = threading.Lock()
+
+    def record(self, ms: float) -> None:
+        with self._lock:
+            self._samples.append((ms, True))
+
+    def record_censored(self, ms: float) -> None:
+        """A call that gave up after `ms` without an answer (latency ≥ ms)."""
+        with self._lock:
+            self._samples.append((ms, False))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            # answers before censorings at the same time (standard product-limit tie rule)
+            samples = sorted(self._samples, key=lambda s: (s[0], not s[1]))
+        if not samples:
+            return None
+        survival = 1.0
+        for i, (ms, answered) in enumerate(samples):
+            if answered:
+                survival *= 1.0 - 1.0 / (len(samples) - i)
+                if 1.0 - survival > q + 1e-9:
+                    return ms
+        # Quantile lies beyond the censored tail: the slowest elapsed time is a lower bound
+        return samples[-1][0]
+
+
+class LLMHedger:
+    def __init__(
+        self,
+        *,
+        enabled: bool = HEDGE_ENABLED,
+        quantile: float = HEDGE_QUANTILE,
+        default_delay_ms: float = HEDGE_DELAY_MS,
+        min_delay_ms: float = HEDGE_MIN_DELAY_MS,
+        max_delay_ms: float = HEDGE_MAX_DELAY_MS,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        window: int = LATENCY_WINDOW,
+    ) -> None:
+        self.enabled = enabled
+        self.quantile = quantile
+        self.default_delay_ms = default_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.min_samples = max(1, min_samples)
+        self.window = window
+        self._latency: Dict[str, ProviderLatency] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def latency(self, provider: str) -> ProviderLatency:
+        with self._lock:
+            tracker = self._latency.get(provider)
+            if tracker is None:
+                tracker = self._latency[provider] = ProviderLatency(self.window)
+            return tracker
+
+    def _count(self, provider: str, counter: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(
+                provider, {"calls": 0, "wins": 0, "failures": 0, "hedges_fired": 0, "wasted": 0}
+            )
+            counters[counter] += 1
+
+    def hedge_delay_ms(self, provider: str) -> float:
+        tracker = self.latency(provider)
+        if len(tracker) < self.min_samples:
+            delay = self.default_delay_ms
+        else:
+            delay = tracker.quantile(self.quantile) or self.default_delay_ms
+        return min(self.max_delay_ms, max(self.min_delay_ms, delay))
+
+    async def call(self, providers: Sequence[str], call: ProviderCall) -> Tuple[Optional[str], Optional[str], dict]:
+        """
+        Race `call(provider)` over `providers` in order. Returns (answer, winner,
+        info) where info = {"providers": launched, "winner", "hedged", "wasted"}.
+        """
+        info: dict = {"providers": [], "winner": None, "hedged": False, "wasted": 0}
+        waiting: List[str] = list(providers)
+        if not waiting:
+            return None, None, info
+        loop = asyncio.get_running_loop()
+        running: Dict["asyncio.Future[Optional[str]]", Tuple[str, float]] = {}
+
+        def launch() -> str:
+            provider = waiting.pop(0)
+            running[asyncio.ensure_future(call(provider))] = (provider, loop.time())
+            info["providers"].append(provider)
+            self._count(provider, "calls")
+            return provider
+
+        latest = launch()
+        try:
+            while running:
+                timeout = self.hedge_delay_ms(latest) / 1000.0 if self.enabled and waiting else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slowest-expected provider still silent: hedge with the next one
+                    self._count(latest, "hedges_fired")
+                    info["hedged"] = True
+                    latest = launch()
+                    continue
+                for task in done:
+                    provider, started = running.pop(task)
+                    try:
+                        answer = task.result()
+                    except Exception as exc:
+                        logger.warning(f"LLM provider {provider} raised: {exc}")
+                        answer = None
+                    if answer:
+                        self.latency(provider).record((loop.time() - started) * 1000)
+                        self._count(provider, "wins")
+                        info["winner"] = provider
+                        return answer, provider, info
+                    # No answer (provider timeout or error): latency is at least this long
+                    self.latency(provider).record_censored((loop.time() - started) * 1000)
+                    self._count(provider, "failures")
+                if not running and waiting:
+                    latest = launch()
+            return None, None, info
+        finally:
+            for task, (provider, started) in running.items():
+                task.cancel()
+                self.latency(provider).record_censored((loop.time() - started) * 1000)
+                info["wasted"] += 1
+                self._count(provider, "wasted")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            providers = sorted(set(self._latency) | set(self._counters))
+            counters = {p: dict(self._counters.get(p, {})) for p in providers}
+        return {
+            "enabled": self.enabled,
+            "quantile": self.quantile,
+            "providers": {
+                p: {
+                    **counters[p],
+                    "samples": len(self.latency(p)),
+                    "p50_ms": _round(self.latency(p).quantile(0.5)),
+                    "hedge_delay_ms": round(self.hedge_delay_ms(p), 1),
+                }
+                for p in providers
+            },
+        }
+
+
+class CircuitBreaker:
+    """
+    Error-rate breaker for one provider. `allow()` gates a call (and claims the
+    single half-open probe); every allowed call must end in `record_success`,
+    `record_failure` or `release` (cancelled — no verdict).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        provider: str,
+        *,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        consecutive_failures: int = BREAKER_CONSECUTIVE_FAILURES,
+        cooldown_s: float = BREAKER_COOLDOWN_S,
+        max_cooldown_s: float = BREAKER_MAX_COOLDOWN_S,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.provider = provider
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.consecutive_failures = max(1, consecutive_failures)
+        self.cooldown_s = cooldown_s
+        self.max_cooldown_s = max(cooldown_s, max_cooldown_s)
+        self._clock = clock
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._state = self.CLOSED
+        self._streak = 0
+        self._trips = 0
+        self._current_cooldown_s = cooldown_s
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> str:
+        if self._state == self.OPEN and self._clock() >= self._open_until:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._refresh()
+
+    def available(self) -> bool:
+        """Would `allow()` let a call through right now (without claiming the probe)?"""
+        with self._lock:
+            state = self._refresh()
+            return state == self.CLOSED or (state == self.HALF_OPEN and not self._probe_in_flight)
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._refresh()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._skipped += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                logger.info(f"LLM circuit for {self.provider} closed again")
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                self._current_cooldown_s = self.cooldown_s
+            self._probe_in_flight = False
+            self._outcomes.append(True)
+            self._streak = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+            self._outcomes.append(False)
+            self._streak += 1
+            if self._state == self.HALF_OPEN:
+                self._trip(min(self.max_cooldown_s, self._current_cooldown_s * 2))
+            elif self._state == self.CLOSED and self._should_trip():
+                self._trip(self.cooldown_s)
+
+    def release(self) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _should_trip(self) -> bool:
+        if self._streak >= self.consecutive_failures:
+            return True
+        calls = len(self._outcomes)
+        failures = calls - sum(self._outcomes)
+        return calls >= self.min_calls and failures / calls >= self.failure_rate
+
+    def _trip(self, cooldown_s: float) -> None:
+        self._state = self.OPEN
+        self._trips += 1
+        self._current_cooldown_s = cooldown_s
+        self._open_until = self._clock() + cooldown_s
+        logger.warning(f"LLM circuit for {self.provider} opened for {cooldown_s:.0f}s (failure streak {self._streak})")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._refresh()
+            calls = len(self._outcomes)
+            return {
+                "state": state,
+                "recent_calls": calls,
+                "failure_rate": round((calls - sum(self._outcomes)) / calls, 3) if calls else 0.0,
+                "consecutive_failures": self._streak,
+                "trips": self._trips,
+                "skipped": self._skipped,
+                "retry_in_s": round(max(0.0, self._open_until - self._clock()), 1) if state == self.OPEN else 0.0,
+            }
+
+
+class LLMBreakers:
+    """Breaker per provider plus adaptive timeouts from the hedger's latency windows."""
+
+    def __init__(
+        self,
+        latency_of: Callable[[str], ProviderLatency],
+        *,
+        enabled: bool = BREAKER_ENABLED,
+        adaptive_timeout: bool = ADAPTIVE_TIMEOUT_ENABLED,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        **breaker_kwargs,
+    ) -> None:
+        self.enabled = enabled
+        self.adaptive_timeout = adaptive_timeout
+        self.min_samples = max(1, min_samples)
+        self._latency_of = latency_of
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                breaker = self._breakers[provider] = CircuitBreaker(provider, **self._breaker_kwargs)
+            return breaker
+
+    def available(self, providers: Sequence[str]) -> List[str]:
+        """Providers whose breaker would admit a call, in order."""
+        if not self.enabled:
+            return list(providers)
+        return [p for p in providers if self.get(p).available()]
+
+    def timeout_s(self, provider: str, ceiling_s: float) -> float:
+        """`multiplier × p99` of recent latencies, within [min, ceiling]; `ceiling_s` until warm."""
+        latency = self._latency_of(provider)
+        if not self.adaptive_timeout or len(latency) < self.min_samples:
+            return ceiling_s
+        p99_ms = latency.quantile(ADAPTIVE_TIMEOUT_QUANTILE) or ceiling_s * 1000
+        adaptive = ADAPTIVE_TIMEOUT_MULTIPLIER * p99_ms / 1000.0
+        return min(ceiling_s, max(min(ADAPTIVE_TIMEOUT_MIN_S, ceiling_s), adaptive))
+
+    async def call(
+        self, provider: str, call: Callable[[], Awaitable[Optional[str]]], *, record: bool = True
+    ) -> Optional[str]:
+        """
+        Run `call()` through the provider's breaker; an open breaker returns None
+        at once. `record=False` (query rewrites, with their own short timeout)
+        only runs while the breaker is closed and leaves no verdict, so slow
+        rewrites can't trip — or take the half-open probe from — answer calls.
+        """
+        if not self.enabled:
+            return await call()
+        breaker = self.get(provider)
+        if not record:
+            return await call() if breaker.state == CircuitBreaker.CLOSED else None
+        if not breaker.allow():
+            return None
+        try:
+            answer = await call()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        if answer:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        return answer
+
+    def snapshot(self, ceiling_s: float) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {
+            provider: {**breaker.snapshot(), "timeout_s": round(self.timeout_s(provider, ceiling_s), 2)}
+            for provider, breaker in sorted(breakers.items())
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+# Global hedger and breakers shared by all LLM calls
+llm_hedger = LLMHedger()
+llm_breakers = LLMBreakers(llm_hedger.latency)
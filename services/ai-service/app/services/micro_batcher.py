@@ -0,0 +1,165 @@
+"""Cross-request micro-batching for transformer calls (query embedding, reranker pairs)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue as queue_module
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Generic, List, Optional, Sequence, TypeVar
+
+from app.services.inference_executor import InferenceOverloadedError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class _Request(Generic[T]):
+    __slots__ = ("items", "future", "enqueued")
+
+    def __init__(self, items: List[T]) -> None:
+        self.items = items
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects requests arriving within `max_wait_ms` of the first one (up to
+    `max_batch` items), runs them as one `fn(items)` call on a dedicated thread
+    and scatters the results back in order.
+
+    A request is a list of items (one query text, or all pairs of one rerank)
+    and is never split across batches; a request larger than `max_batch` runs
+    alone. Submissions beyond `max_queue` pending requests raise
+    InferenceOverloadedError. If `fn` raises, every request in that batch fails.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[List[T]], Sequence[R]],
+        *,
+        max_batch: int,
+        max_wait_ms: float,
+        max_queue: int = 256,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(1, max_queue)
+        self._queue: "queue_module.Queue[Optional[_Request[T]]]" = queue_module.Queue()
+        self._carry: Optional[_Request[T]] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._batches = 0
+        self._items = 0
+        self._largest = 0
+        self._rejected = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name=f"{name}-batch", daemon=True)
+        self._thread.start()
+
+    def submit(self, items: Sequence[T]) -> "Future[List[R]]":
+        request: _Request[T] = _Request(list(items))
+        if not request.items:
+            request.future.set_result([])
+            return request.future
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name} batcher is shut down")
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                raise InferenceOverloadedError(self.name, f"batch queue full ({self._pending} pending)")
+            self._pending += 1
+        self._queue.put(request)
+        return request.future
+
+    async def run(self, items: Sequence[T]) -> List[R]:
+        """Await the results for `items` without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(items))
+
+    def _next_batch(self) -> Optional[List[_Request[T]]]:
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is None:
+            return None
+        batch, size = [first], len(first.items)
+        deadline = time.perf_counter() + self.max_wait_s
+        while size < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue_module.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            if size + len(request.items) > self.max_batch:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            with self._lock:
+                self._pending -= len(batch)
+            # Waiters cancelled while queued (client gone) drop out; the rest can no
+            # longer be cancelled, so setting their results below cannot fail.
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._run_batch(batch)
+            except Exception:  # never let one batch end the loop — later requests would hang
+                logger.exception(f"{self.name} batcher: scatter failed")
+
+    def _run_batch(self, batch: List[_Request[T]]) -> None:
+        items = [item for request in batch for item in request.items]
+        with self._lock:
+            self._batches += 1
+            self._items += len(items)
+            self._largest = max(self._largest, len(items))
+        try:
+            results = list(self.fn(items))
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name}: {len(results)} results for {len(items)} items")
+        except BaseException as exc:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(exc)
+            return
+        offset = 0
+        for request in batch:
+            if not request.future.done():
+                request.future.set_result(results[offset:offset + len(request.items)])
+            offset += len(request.items)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait_s * 1000, 3),
+                "pending": self._pending,
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+        self._queue.put(None)
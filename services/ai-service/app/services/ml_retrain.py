@@ -1,67 +1,125 @@
-"""Run offline training scripts and hot-reload joblib models into running services."""
+"""
+Retrain the tree models in parallel, publish them to the model registry and
+hot-swap the running services onto the new versions. This worker reloads at
+once; the other workers' `RegistryFollower` threads pick up current.json
+within MODEL_REGISTRY_POLL_S.
+"""
 
 from __future__ import annotations
 
 import logging
-import subprocess
-import sys
-from pathlib import Path
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, Optional
+
+from app.core.config import settings
+from app.services.model_registry import MODEL_NAMES, ModelRegistryError, model_registry, service_path
+from app.services.training_orchestrator import ProgressFn, cpu_budget, train_all
 
 logger = logging.getLogger(__name__)
 
-SERVICE_ROOT = Path(__file__).resolve().parents[2]
+# Registry name → settings field holding the model's legacy artifact path
+_OUTPUT_PATHS = {
+    "eta_price": "MODEL_PATH",
+    "accept": "ACCEPT_MODEL_PATH",
+    "wait": "WAIT_MODEL_PATH",
+}
+
+# Keys of the "reload" block in responses (kept for existing dashboards)
+_RELOAD_KEYS = {"eta_price": "prediction", "accept": "accept", "wait": "wait"}
+
 
-_SCRIPTS = (
-    "training/train_model.py",
-    "training/train_accept_model.py",
-    "training/train_wait_model.py",
-)
+def _services() -> dict:
+    from app.services.accept_service import accept_service
+    from app.services.prediction_service import prediction_service
+    from app.services.wait_service import wait_service
 
+    return {"eta_price": prediction_service, "accept": accept_service, "wait": wait_service}
 
-def run_training_scripts_and_reload_models(timeout_sec: int = 900) -> dict:
+
+def run_training_scripts_and_reload_models(
+    timeout_sec: int = 900,
+    on_progress: Optional[ProgressFn] = None,
+) -> dict:
     """
-    Run training/*.py in order, then reload Prediction / Accept / Wait weights from disk.
+    Train all models concurrently into a staging dir, then publish + hot-reload.
 
-    Scripts generate synthetic data today; swap `training/` + datasets later for real ML ops.
+    All-or-nothing: if any job fails or times out nothing is published and the
+    services keep their current versions. Scripts generate synthetic data today;
+    swap `training/` + datasets later for real ML ops.
     """
-    py = sys.executable
-    logs: list[str] = []
+    staging_root = service_path(settings.MODEL_PATH).parent / ".staging"
+    staging_root.mkdir(parents=True, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix="retrain-", dir=staging_root)
+    try:
+        run = train_all(
+            service_path(staging),
+            timeout_sec=timeout_sec,
+            budget=cpu_budget(settings.AI_RETRAIN_CPU_BUDGET),
+            nice=settings.AI_RETRAIN_NICE,
+            on_progress=on_progress,
+        )
+        jobs = {
+            name: {k: v for k, v in job.items() if k in ("ok", "wall_ms", "peak_rss_kb", "error")}
+            for name, job in run["jobs"].items()
+        }
+        detail = "; ".join(
+            f"{name}: {job['wall_ms']}ms" if job["ok"] else f"{name}: {job.get('error')}"
+            for name, job in jobs.items()
+        )
+        if not run["ok"]:
+            logger.error(f"ML retrain failed — nothing published: {detail}")
+            return {"ok": False, "detail": detail, "jobs": jobs, "wall_ms": run["wall_ms"]}
 
-    for script in _SCRIPTS:
-        cmd = [py, str(SERVICE_ROOT / script)]
-        try:
-            proc = subprocess.run(
-                cmd,
-                cwd=str(SERVICE_ROOT),
-                capture_output=True,
-                text=True,
-                timeout=timeout_sec,
-            )
-        except subprocess.TimeoutExpired:
-            return {"ok": False, "detail": f"{script} timed out after {timeout_sec}s"}
-
-        if proc.returncode != 0:
-            tail = (proc.stderr or proc.stdout or "")[-1200:]
-            logger.error("Training failed %s: %s", script, tail)
-            return {
-                "ok": False,
-                "detail": f"{script} exit {proc.returncode}",
-                "stderr_tail": tail,
-            }
-
-        logs.append(f"{script}: ok")
-        logger.info("Training step OK: %s", script)
+        # Services only read immutable registry versions; the legacy paths are
+        # replaced atomically too, so nothing is ever observed half-written.
+        published: Dict[str, dict] = {}
+        for name, output in run["outputs"].items():
+            if settings.MODEL_REGISTRY_ENABLED:
+                published[name] = model_registry.publish(name, output, source="retrain")
+            os.replace(output, service_path(getattr(settings, _OUTPUT_PATHS[name])))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
 
-    from app.services.accept_service import accept_service
-    from app.services.prediction_service import prediction_service
-    from app.services.wait_service import wait_service
-
-    pr_ok = prediction_service.reload_model()
-    acc_ok = accept_service.reload_model()
-    wait_ok = wait_service.reload_model()
+    services = _services()
+    reload = {_RELOAD_KEYS[name]: services[name].reload_model() for name in MODEL_NAMES}
+    logger.info(f"ML retrain finished in {run['wall_ms']}ms ({detail})")
 
     return {
         "ok": True,
-        "detail": "; ".join(logs),
-        "reload": {"prediction": pr_ok, "accept": acc_ok, "wait": wait_ok},
+        "detail": detail,
+        "wall_ms": run["wall_ms"],
+        "workers": run["workers"],
+        "jobs": jobs,
+        "reload": reload,
+        "registry": published,
     }
+
+
+def _registry_action(names: Iterable[str], action) -> dict:
+    if not settings.MODEL_REGISTRY_ENABLED:
+        return {"ok": False, "detail": "MODEL_REGISTRY_ENABLED=false"}
+    services = _services()
+    out: Dict[str, dict] = {}
+    for name in names:
+        try:
+            result = action(name)
+        except ModelRegistryError as exc:
+            out[name] = {"ok": False, "detail": str(exc)}
+            continue
+        out[name] = {"ok": True, **result, "reload": services[name].reload_model()}
+    return {"ok": all(r["ok"] for r in out.values()), "models": out}
+
+
+def rollback_models(names: Optional[Iterable[str]] = None) -> dict:
+    """Re-activate each model's previous registry version and hot-swap it in."""
+    return _registry_action(names or MODEL_NAMES, model_registry.rollback)
+
+
+def pin_model_versions(pins: Dict[str, Optional[str]]) -> dict:
+    """
+    Activate + pin explicit versions ({"accept": "3f2a9c1b0d4e"}); a pinned model
+    ignores retrain publishes until unpinned with a null version.
+    """
+    return _registry_action(pins, lambda name: model_registry.pin(name, pins[name]))
@@ -0,0 +1,319 @@
+"""
+Memory-mapped model artifacts shared across uvicorn workers.
+
+A joblib payload unpickles every tree into private heap memory, so N workers
+hold N copies of each forest (sklearn trees copy their node arrays on
+unpickle, which also defeats ``joblib.load(mmap_mode=...)``). With the compiled
+engine, each artifact gets a sidecar directory next to it:
+
+    app/models/eta_price_model.joblib.compiled/
+        meta.json            format version, source size/mtime, derived-array meta
+        payload.joblib       the joblib payload minus "model" (scaler, versions…)
+        feature.npy …        CompiledTreeEnsemble node arrays
+        extra_<name>.npy     derived arrays (e.g. the ETA lookup grid)
+
+Arrays are opened with ``np.load(mmap_mode="r")``: read-only file-backed
+pages that the kernel shares between every worker mapping the same file.
+The sidecar is rebuilt whenever the source artifact's size/mtime or the
+caller's ``derived_key`` changes; it is written to a temp directory and
+swapped in with ``os.replace`` so readers never see a partial export.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from app.services.compiled_trees import (
+    ARRAY_FIELDS,
+    CompiledTreeEnsemble,
+    ENGINE_COMPILED,
+    engine_name,
+    maybe_compile,
+)
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = ".compiled"
+FORMAT_VERSION = 1
+_EXTRA_PREFIX = "extra_"
+
+DeriveFn = Callable[[dict], Tuple[Dict[str, np.ndarray], dict]]
+
+
+class ModelArtifact:
+    """
+    A loaded joblib payload plus arrays derived from it at export time.
+
+    Services hold exactly one reference to the artifact they serve and replace
+    it with a single assignment, so a request never mixes model / scaler /
+    lookup from two versions. `version` is the registry version (if any) and
+    `derived` holds per-service objects built from the payload (e.g. lookup).
+    """
+
+    def __init__(
+        self,
+        payload: dict,
+        extras: Dict[str, np.ndarray],
+        extras_meta: dict,
+        sidecar: Optional[Path] = None,
+        version: Optional[str] = None,
+    ) -> None:
+        self.payload = payload
+        self.extras = extras
+        self.extras_meta = extras_meta
+        self.sidecar = sidecar
+        self.version = version
+        self.derived: dict = {}
+
+    @property
+    def model(self):
+        return self.payload.get("model")
+
+    @property
+    def storage(self) -> str:
+        return "mmap" if self.sidecar is not None else "heap"
+
+
+def sidecar_dir(artifact_path: Path) -> Path:
+    return artifact_path.with_name(artifact_path.name + SIDECAR_SUFFIX)
+
+
+def _source_stamp(artifact_path: Path) -> dict:
+    stat = artifact_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_meta(directory: Path) -> Optional[dict]:
+    try:
+        return json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _is_fresh(meta: Optional[dict], artifact_path: Path, derived_key: str) -> bool:
+    return bool(
+        meta
+        and meta.get("format") == FORMAT_VERSION
+        and meta.get("source") == _source_stamp(artifact_path)
+        and meta.get("derived_key") == derived_key
+    )
+
+
+def _mmap(path: Path) -> np.ndarray:
+    # plain ndarray view over the memmap: no np.memmap subclass overhead on indexing
+    return np.load(path, mmap_mode="r").view(np.ndarray)
+
+
+def load_compiled(directory: Path) -> Tuple[CompiledTreeEnsemble, Dict[str, np.ndarray], dict]:
+    """Open a sidecar read-only. Returns (ensemble, extras, meta)."""
+    meta = _read_meta(directory)
+    if meta is None:
+        raise FileNotFoundError(f"No compiled sidecar at {directory}")
+    arrays = {name: _mmap(directory / f"{name}.npy") for name in ARRAY_FIELDS}
+    model_meta = meta["model"]
+    classes = model_meta.get("classes")
+    ensemble = CompiledTreeEnsemble(
+        kind=model_meta["kind"],
+        max_depth=model_meta["max_depth"],
+        n_features=model_meta["n_features"],
+        classes=np.asarray(classes) if classes is not None else None,
+        source=model_meta.get("source", ""),
+        multioutput=model_meta.get("multioutput", False),
+        **arrays,
+    )
+    extras = {name: _mmap(directory / f"{_EXTRA_PREFIX}{name}.npy") for name in meta.get("extras", [])}
+    return ensemble, extras, meta
+
+
+def export_compiled(
+    artifact_path: Path,
+    payload: dict,
+    compiled: CompiledTreeEnsemble,
+    extras: Dict[str, np.ndarray],
+    extras_meta: dict,
+    derived_key: str,
+) -> Path:
+    """Write the sidecar for `artifact_path` into a temp dir and swap it in."""
+    directory = sidecar_dir(artifact_path)
+    tmp = directory.with_name(f"{directory.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        for name, array in compiled.arrays().items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(array))
+        for name, array in extras.items():
+            np.save(tmp / f"{_EXTRA_PREFIX}{name}.npy", np.ascontiguousarray(array))
+        joblib.dump({k: v for k, v in payload.items() if k != "model"}, tmp / "payload.joblib")
+        meta = {
+            "format": FORMAT_VERSION,
+            "source": _source_stamp(artifact_path),
+            "derived_key": derived_key,
+            "model": compiled.meta(),
+            "extras": sorted(extras),
+            "extras_meta": extras_meta,
+        }
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+        # A directory cannot be renamed over a non-empty one: move the old export
+        # aside first. Workers that already mapped its files keep valid pages.
+        old = directory.with_name(f"{directory.name}.old-{os.getpid()}")
+        try:
+            os.replace(directory, old)
+        except FileNotFoundError:
+            old = None
+        try:
+            os.replace(tmp, directory)
+        except OSError:
+            # another worker swapped its (identical) export in first
+            logger.info(f"{directory.name}: concurrent export won the swap — using it")
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return directory
+
+
+def load_model_artifact(
+    artifact_path: Path,
+    engine: str,
+    name: str,
+    derived_key: str = "",
+    derive: Optional[DeriveFn] = None,
+) -> ModelArtifact:
+    """
+    Load `artifact_path` for serving with `engine`.
+
+    compiled: open the mmap sidecar if fresh, otherwise unpickle, compile,
+    export and reopen it (so this worker shares pages too). If the export
+    cannot be written (read-only filesystem) the compiled arrays stay on heap.
+    sklearn / uncompilable models: plain ``joblib.load``.
+
+    `derive(payload)` runs against the unpickled sklearn payload and returns
+    (arrays, meta) stored alongside the model; `derived_key` invalidates them.
+    """
+    compiled_engine = (engine or "").strip().lower() == ENGINE_COMPILED
+    directory = sidecar_dir(artifact_path)
+
+    if compiled_engine and _is_fresh(_read_meta(directory), artifact_path, derived_key):
+        try:
+            return _open_sidecar(directory, name)
+        except Exception as exc:
+            logger.warning(f"{name}: compiled sidecar unreadable ({exc}) — re-exporting")
+
+    payload = joblib.load(artifact_path)
+    extras, extras_meta = derive(payload) if derive is not None else ({}, {})
+    model = maybe_compile(payload["model"], engine, name)
+    if not isinstance(model, CompiledTreeEnsemble):
+        return ModelArtifact({**payload, "model": model}, extras, extras_meta)
+
+    try:
+        export_compiled(artifact_path, payload, model, extras, extras_meta, derived_key)
+        return _open_sidecar(directory, name)
+    except Exception as exc:
+        logger.warning(f"{name}: compiled sidecar export failed ({exc}) — arrays kept on heap")
+        return ModelArtifact({**payload, "model": model}, extras, extras_meta)
+
+
+def _open_sidecar(directory: Path, name: str) -> ModelArtifact:
+    ensemble, extras, meta = load_compiled(directory)
+    payload = joblib.load(directory / "payload.joblib")
+    payload["model"] = ensemble
+    logger.info(f"{name}: mapped {ensemble.nbytes // 1024} KB read-only from {directory}")
+    return ModelArtifact(payload, extras, meta.get("extras_meta", {}), sidecar=directory)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Memory accounting
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _iter_trees(model):
+    if hasattr(model, "tree_"):
+        yield model.tree_
+    estimators = getattr(model, "estimators_", None)
+    if estimators is not None:
+        for est in np.ravel(np.asarray(estimators, dtype=object)):
+            yield from _iter_trees(est)
+
+
+def estimator_nbytes(model) -> int:
+    """Bytes held by a model's node/value arrays (heap estimate for sklearn)."""
+    if model is None:
+        return 0
+    if isinstance(model, CompiledTreeEnsemble):
+        return model.nbytes
+    total = 0
+    for tree in _iter_trees(model):
+        state = tree.__getstate__()
+        total += state["nodes"].nbytes + state["values"].nbytes
+    return int(total)
+
+
+def _smaps_usage(directory: Path) -> Optional[Dict[str, int]]:
+    """Rss / Pss / shared / private bytes of this process's mappings under `directory`."""
+    prefix = str(directory.resolve()) + os.sep
+    usage = {"rss_bytes": 0, "pss_bytes": 0, "shared_bytes": 0, "private_bytes": 0}
+    fields = {
+        "Rss:": "rss_bytes",
+        "Pss:": "pss_bytes",
+        "Shared_Clean:": "shared_bytes",
+        "Shared_Dirty:": "shared_bytes",
+        "Private_Clean:": "private_bytes",
+        "Private_Dirty:": "private_bytes",
+    }
+    try:
+        with open("/proc/self/smaps", encoding="utf-8", errors="replace") as fh:
+            in_scope = False
+            for line in fh:
+                key, _, rest = line.partition(" ")
+                if not key.endswith(":"):
+                    # mapping header: "start-end perms offset dev inode [path]"
+                    parts = line.split(None, 5)
+                    in_scope = len(parts) == 6 and parts[5].strip().startswith(prefix)
+                elif in_scope and key in fields:
+                    usage[fields[key]] += int(rest.split()[0]) * 1024
+    except OSError:
+        return None
+    return usage
+
+
+def model_memory(model, sidecar: Optional[Path] = None) -> dict:
+    """
+    Memory report for one served model. mmap-backed models report kernel
+    numbers from /proc/self/smaps: `shared_bytes` are pages also mapped by
+    another worker. Heap models are private by construction (nbytes estimate).
+    """
+    nbytes = estimator_nbytes(model)
+    report = {
+        "engine": engine_name(model),
+        "storage": "mmap" if sidecar is not None else "heap",
+        "nbytes": nbytes,
+    }
+    usage = _smaps_usage(sidecar) if sidecar is not None else None
+    if usage is not None:
+        report.update(usage)
+    else:
+        report.update({"rss_bytes": nbytes, "shared_bytes": 0, "private_bytes": nbytes})
+    return report
+
+
+def process_memory() -> dict:
+    """Whole-process RSS split (anon = private heap, file = mapped files incl. models)."""
+    keys = {"VmRSS:": "rss_bytes", "RssAnon:": "rss_anon_bytes", "RssFile:": "rss_file_bytes", "RssShmem:": "rss_shmem_bytes"}
+    report = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/status", encoding="utf-8") as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] in keys:
+                    report[keys[parts[0]]] = int(parts[1]) * 1024
+    except OSError:
+        pass
+    return report
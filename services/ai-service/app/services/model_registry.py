@@ -0,0 +1,410 @@
+"""
+On-disk model registry: immutable, content-hashed versions and an atomic pointer.
+
+    app/models/registry/<name>/
+        versions/<sha256[:12]>/model.joblib   never modified after registration
+        versions/<sha256[:12]>/manifest.json  hash, size, metrics, feature/model version
+        current.json                          {"version", "pinned", "activated_at"}
+        history.json                          activation log, newest last
+
+Services only ever load from a version directory, so a retrain can never
+expose a half-written file; switching versions is a single ``os.replace`` of
+``current.json``. Registry writes are serialised across workers with an
+advisory file lock (on platforms that provide ``fcntl``). Each process's
+services follow the pointer through `RegistryFollower`, so a switch made by
+the worker that handled /api/internal/refresh reaches the others within
+MODEL_REGISTRY_POLL_S.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import joblib
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX dev machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_NAME = "model.joblib"
+MODEL_NAMES = ("eta_price", "accept", "wait")
+
+# Scalar payload fields copied into the manifest (training scripts store metrics here)
+_METADATA_SKIP = {"model", "scaler"}
+
+
+class ModelRegistryError(RuntimeError):
+    """Unknown model / version, or nothing to roll back to."""
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path: Path, data) -> None:
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path, default=None):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return default
+
+
+def _payload_metadata(artifact_path: Path) -> dict:
+    """Scalar / list fields of the joblib payload (metrics, feature names, model_version)."""
+    try:
+        payload = joblib.load(artifact_path)
+    except Exception as exc:
+        logger.warning(f"Registry: could not read metadata from {artifact_path} ({exc})")
+        return {}
+    if not isinstance(payload, dict):
+        return {}
+    return {
+        key: value
+        for key, value in payload.items()
+        if key not in _METADATA_SKIP and isinstance(value, (str, int, float, bool, list))
+    }
+
+
+class ModelRegistry:
+    def __init__(self, root: Path, keep: int = 5) -> None:
+        self.root = root
+        self.keep = max(2, keep)
+        self._lock = threading.RLock()
+
+    # ── layout ──────────────────────────────────────────────────────────────
+
+    def _model_dir(self, name: str) -> Path:
+        if name not in MODEL_NAMES:
+            raise ModelRegistryError(f"Unknown model '{name}' (expected one of {', '.join(MODEL_NAMES)})")
+        return self.root / name
+
+    def _version_dir(self, name: str, version: str) -> Path:
+        return self._model_dir(name) / "versions" / version
+
+    def artifact_path(self, name: str, version: str) -> Path:
+        return self._version_dir(name, version) / ARTIFACT_NAME
+
+    @contextlib.contextmanager
+    def _locked(self, name: str) -> Iterator[None]:
+        model_dir = self._model_dir(name)
+        model_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(model_dir / ".lock", "a+") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ── reads ───────────────────────────────────────────────────────────────
+
+    def current(self, name: str) -> Optional[dict]:
+        return _read_json(self._model_dir(name) / "current.json")
+
+    def pointer_stamp(self, name: str) -> Optional[Tuple[int, int]]:
+        """(inode, mtime_ns) of current.json — changes on every activation (os.replace)."""
+        try:
+            stat = (self._model_dir(name) / "current.json").stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def current_version(self, name: str) -> Optional[str]:
+        pointer = self.current(name)
+        return pointer.get("version") if pointer else None
+
+    def manifest(self, name: str, version: str) -> dict:
+        manifest = _read_json(self._version_dir(name, version) / "manifest.json")
+        if manifest is None:
+            raise ModelRegistryError(f"{name}: version '{version}' is not registered")
+        return manifest
+
+    def versions(self, name: str) -> List[dict]:
+        versions_dir = self._model_dir(name) / "versions"
+        if not versions_dir.is_dir():
+            return []
+        manifests = [
+            m for m in (_read_json(d / "manifest.json") for d in versions_dir.iterdir() if d.is_dir() and not d.name.startswith(".")) if m
+        ]
+        return sorted(manifests, key=lambda m: (m.get("created_at", ""), m["version"]))
+
+    def history(self, name: str) -> List[dict]:
+        return _read_json(self._model_dir(name) / "history.json", default=[])
+
+    def describe(self) -> Dict[str, dict]:
+        out = {}
+        for name in MODEL_NAMES:
+            pointer = self.current(name) or {}
+            out[name] = {
+                "current": pointer.get("version"),
+                "pinned": bool(pointer.get("pinned")),
+                "activated_at": pointer.get("activated_at"),
+                "versions": [m["version"] for m in self.versions(name)],
+            }
+        return out
+
+    # ── writes ──────────────────────────────────────────────────────────────
+
+    def register(self, name: str, artifact_path: Path, source: str = "") -> dict:
+        """Copy `artifact_path` into its content-hashed version dir (idempotent)."""
+        model_dir = self._model_dir(name)
+        (model_dir / "versions").mkdir(parents=True, exist_ok=True)
+        # Hash the staged copy, not the source, so the version id always matches the stored bytes
+        tmp = model_dir / "versions" / f".staging-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        try:
+            shutil.copy2(artifact_path, tmp / ARTIFACT_NAME)
+            sha = _sha256(tmp / ARTIFACT_NAME)
+            version = sha[:12]
+            with self._locked(name):
+                version_dir = self._version_dir(name, version)
+                if (version_dir / "manifest.json").exists():
+                    return self.manifest(name, version)
+                metadata = _payload_metadata(tmp / ARTIFACT_NAME)
+                manifest = {
+                    "name": name,
+                    "version": version,
+                    "sha256": sha,
+                    "size_bytes": (tmp / ARTIFACT_NAME).stat().st_size,
+                    "created_at": _now(),
+                    "source": source or str(artifact_path),
+                    "model_version": metadata.pop("model_version", None),
+                    "feature_version": metadata.pop("feature_version", settings.FEATURE_VERSION),
+                    "metadata": metadata,
+                }
+                _write_json_atomic(tmp / "manifest.json", manifest)
+                os.replace(tmp, version_dir)
+                logger.info(f"Registry: {name} registered version {version}")
+                self._prune_locked(name)
+                return manifest
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def activate(self, name: str, version: str, action: str = "activate", pin: Optional[bool] = None) -> dict:
+        """Point `current` at `version`. `pin=None` keeps the existing pin flag."""
+        with self._locked(name):
+            return self._activate_locked(name, version, action, pin)
+
+    def _activate_locked(self, name: str, version: str, action: str, pin: Optional[bool]) -> dict:
+        manifest = self.manifest(name, version)
+        previous = self.current(name) or {}
+        pinned = bool(previous.get("pinned")) if pin is None else pin
+        if previous.get("version") == version and bool(previous.get("pinned")) == pinned:
+            return {"version": version, "previous": version, "changed": False, "pinned": pinned}
+
+        model_dir = self._model_dir(name)
+        _write_json_atomic(
+            model_dir / "current.json",
+            {"version": version, "pinned": pinned, "activated_at": _now(), "sha256": manifest["sha256"]},
+        )
+        history = self.history(name)
+        history.append({"version": version, "previous": previous.get("version"), "action": action, "at": _now()})
+        _write_json_atomic(model_dir / "history.json", history[-50:])
+        logger.info(f"Registry: {name} {action} {previous.get('version')} → {version} (pinned={pinned})")
+        return {
+            "version": version,
+            "previous": previous.get("version"),
+            "changed": previous.get("version") != version,
+            "pinned": pinned,
+        }
+
+    def publish(self, name: str, artifact_path: Path, source: str = "") -> dict:
+        """Register a freshly trained artifact and activate it unless the model is pinned."""
+        manifest = self.register(name, artifact_path, source=source)
+        with self._locked(name):
+            pointer = self.current(name) or {}
+            if pointer.get("pinned"):
+                logger.info(f"Registry: {name} pinned to {pointer['version']} — {manifest['version']} registered only")
+                return {"version": pointer["version"], "registered": manifest["version"], "changed": False, "pinned": True}
+            result = self._activate_locked(name, manifest["version"], "publish", pin=None)
+            result["registered"] = manifest["version"]
+            return result
+
+    def rollback(self, name: str) -> dict:
+        """Re-activate the version that was current before the present one."""
+        with self._locked(name):
+            current = self.current_version(name)
+            for entry in reversed(self.history(name)):
+                previous = entry.get("previous")
+                if entry.get("version") == current and previous and previous != current:
+                    if (self._version_dir(name, previous) / "manifest.json").exists():
+                        return self._activate_locked(name, previous, "rollback", pin=None)
+            raise ModelRegistryError(f"{name}: no previous version to roll back to")
+
+    def pin(self, name: str, version: Optional[str]) -> dict:
+        """Activate and pin `version`; `None` clears the pin and keeps the current version."""
+        with self._locked(name):
+            if version is None:
+                current = self.current_version(name)
+                if current is None:
+                    raise ModelRegistryError(f"{name}: nothing to unpin")
+                return self._activate_locked(name, current, "unpin", pin=False)
+            return self._activate_locked(name, self._resolve_prefix(name, version), "pin", pin=True)
+
+    def _resolve_prefix(self, name: str, version: str) -> str:
+        matches = [m["version"] for m in self.versions(name) if m["version"].startswith(version)]
+        if len(matches) != 1:
+            raise ModelRegistryError(f"{name}: version '{version}' matches {len(matches)} registered versions")
+        return matches[0]
+
+    def _prune_locked(self, name: str) -> None:
+        """Keep the newest `keep` versions plus whatever `current` points at."""
+        current = self.current_version(name)
+        versions = self.versions(name)
+        for manifest in versions[: max(0, len(versions) - self.keep)]:
+            if manifest["version"] != current:
+                shutil.rmtree(self._version_dir(name, manifest["version"]), ignore_errors=True)
+
+    def resolve(self, name: str, legacy_path: Path) -> Tuple[Path, Optional[str]]:
+        """
+        Artifact to load for `name`: the current registry version, bootstrapping
+        the registry from `legacy_path` on first use. Falls back to the legacy
+        path if the registry cannot be written (read-only filesystem).
+        """
+        version = self.current_version(name)
+        if version is None:
+            if not legacy_path.exists():
+                raise FileNotFoundError(str(legacy_path))
+            try:
+                version = self.publish(name, legacy_path, source="bootstrap")["version"]
+            except OSError as exc:
+                logger.warning(f"Registry: bootstrap of {name} failed ({exc}) — loading {legacy_path}")
+                return legacy_path, None
+        return self.artifact_path(name, version), version
+
+
+def service_path(value: str) -> Path:
+    """Resolve a configured path relative to the ai-service root."""
+    path = Path(value)
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parents[2] / path
+    return path
+
+
+model_registry = ModelRegistry(service_path(settings.MODEL_REGISTRY_DIR), keep=settings.MODEL_REGISTRY_KEEP)
+
+
+class RegistryFollower:
+    """
+    Background thread that keeps this process's services on the registry
+    pointer. Every MODEL_REGISTRY_POLL_S it ``stat``s each followed model's
+    current.json (parsed only when its inode / mtime moved) and, when it names
+    another version than the one loaded, calls ``service.reload_model()`` —
+    which builds the new artifact (sidecar compile, lookup grid) while requests
+    keep reading the old one, then swaps the reference. A failed reload is
+    retried with a doubling delay (capped at `max_backoff_s`) until it succeeds
+    or the pointer moves again.
+    """
+
+    def __init__(self, *, autostart: bool = True, max_backoff_s: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.autostart = autostart
+        self.max_backoff_s = max_backoff_s
+        self._clock = clock
+        self._entries: List[dict] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = 0
+
+    def follow(self, name: str, service) -> None:
+        """Track `service` (``.version`` / ``.reload_model() -> bool``) for model `name`."""
+        with self._lock:
+            self._entries.append({
+                "name": name,
+                "service": weakref.ref(service),
+                "stamp": model_registry.pointer_stamp(name) if settings.MODEL_REGISTRY_ENABLED else None,
+                "failures": 0,
+                "retry_at": 0.0,
+            })
+            alive = self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+            if self.autostart and not alive and settings.MODEL_REGISTRY_POLL_S > 0:
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="model-registry-follower", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while settings.MODEL_REGISTRY_POLL_S > 0:
+            self._wake.wait(settings.MODEL_REGISTRY_POLL_S)
+            self._wake.clear()
+            try:
+                self.check()
+            except Exception as exc:  # keep following — one bad pass must not end the thread
+                logger.error(f"Registry follower pass failed: {exc}")
+
+    def check(self) -> Dict[str, str]:
+        """One pass over the followed models; returns {name: version} of the swaps made."""
+        if not settings.MODEL_REGISTRY_ENABLED:
+            return {}
+        swapped: Dict[str, str] = {}
+        with self._lock:
+            self._entries = [entry for entry in self._entries if entry["service"]() is not None]
+            entries = list(self._entries)
+        for entry in entries:
+            name, service = entry["name"], entry["service"]()
+            if service is None or self._clock() < entry["retry_at"]:
+                continue
+            stamp = model_registry.pointer_stamp(name)
+            if stamp is None or stamp == entry["stamp"]:
+                continue
+            version = model_registry.current_version(name)
+            if version is None or version == service.version:
+                entry["stamp"] = stamp
+                continue
+            if service.reload_model():
+                entry.update(stamp=stamp, failures=0, retry_at=0.0)
+                swapped[name] = version
+                logger.info(f"Registry: {name} switched to {version} (pointer moved by another worker)")
+            else:
+                entry["failures"] += 1
+                delay = min(self.max_backoff_s, settings.MODEL_REGISTRY_POLL_S * 2 ** entry["failures"])
+                entry["retry_at"] = self._clock() + delay
+                logger.warning(f"Registry: {name} reload to {version} failed — retrying in {delay:.0f}s")
+        return swapped
+
+
+registry_follower = RegistryFollower()
+
+
+def follow_registry(name: str, service) -> None:
+    """Keep `service` on the registry's current version of `name` (background reloads)."""
+    registry_follower.follow(name, service)
+
+
+def resolve_model_path(name: str, legacy_path: Path, version: Optional[str] = None) -> Tuple[Path, Optional[str]]:
+    """Path + registry version a service should load (`version` overrides `current`)."""
+    if not settings.MODEL_REGISTRY_ENABLED:
+        return legacy_path, None
+    if version is not None:
+        return model_registry.artifact_path(name, version), version
+    return model_registry.resolve(name, legacy_path)
@@ -0,0 +1,436 @@
+"""
+ONNX Runtime backend for the RAG bi-encoder and cross-encoder reranker
+(RAG_INFERENCE_BACKEND=onnx; PyTorch stays the default and the fallback).
+
+`python -m app.services.onnx_backend export` (image build) converts
+
+    the sentence-transformers embedder — transformer + pooling as one graph
+    the cross-encoder — sequence-classification logits
+
+to ONNX and applies dynamic int8 quantisation (MatMul / Gather weights stored
+as int8, activations quantised per batch), one directory per model:
+
+    <RAG_ONNX_DIR>/<org>__<model>/
+        model_int8.onnx   dynamic-int8 graph (served by default)
+        fp32/             float32 graph + external weights (--no-quantize / --keep-fp32)
+        tokenizer files
+        onnx_meta.json    kind, model name, max length, dim / labels, activation
+
+`... compare` runs both backends on the knowledge base chunks and writes
+report.json next to them: embedding cosine agreement, reranker score delta and
+top-k agreement, per-call latency, weight bytes.
+
+At serve time the weights live only in the ONNX Runtime sessions (int8: about
+a quarter of the torch float32 tensors); transformers is used for tokenising
+only. `OnnxEncoder.encode` / `OnnxCrossEncoder.predict` take the same
+arguments the micro-batchers pass to SentenceTransformer / CrossEncoder.
+Sessions run sequentially with `intra_op_num_threads` set to the RAG thread
+budget and spinning disabled, so idle sessions don't hold cores that
+/api/predict needs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import inspect
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.rag_index_cache import cache_root
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKEND = os.getenv("RAG_INFERENCE_BACKEND", "torch").lower()  # torch | onnx
+ONNX_DIR = os.getenv("RAG_ONNX_DIR", "app/models/onnx")
+ONNX_QUANTIZE = os.getenv("RAG_ONNX_QUANTIZE", "true").lower() in ("true", "1", "yes")
+ONNX_OPSET = 17
+
+META_FILE = "onnx_meta.json"
+FP32_FILE = "fp32/model.onnx"  # big graphs spill weights into external files — keep them in one directory
+INT8_FILE = "model_int8.onnx"
+
+
+def onnx_root() -> Optional[Path]:
+    """RAG_ONNX_DIR → absolute path (relative to the ai-service root)."""
+    return cache_root(ONNX_DIR)
+
+
+def model_dir(root: Path, model_name: str) -> Path:
+    return root / model_name.replace("/", "__")
+
+
+def _session(path: Path, threads: int):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = max(1, threads)
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+
+class _OnnxModel:
+    def __init__(self, session, tokenizer, meta: dict, path: Optional[Path] = None) -> None:
+        self.session = session
+        self.tokenizer = tokenizer
+        self.meta = meta
+        self.max_length = int(meta.get("max_length", 512))
+        self.input_names = [i.name for i in session.get_inputs()]
+        self.backend = "onnx-int8" if meta.get("quantized") else "onnx"
+        self.weight_bytes = _file_bytes(path) if path is not None else 0
+
+    def _run(self, encoded: Dict[str, np.ndarray]) -> np.ndarray:
+        feed = {name: np.asarray(encoded[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(None, feed)[0]
+
+
+class OnnxEncoder(_OnnxModel):
+    """Sentence embeddings from the exported bi-encoder graph (pooling included)."""
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False, **_kwargs) -> np.ndarray:
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        out = np.zeros((len(texts), int(self.meta["dim"])), dtype=np.float32)
+        # Length-sorted batches pad less (same as SentenceTransformer.encode)
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), max(1, batch_size)):
+            rows = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in rows], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np",
+            )
+            out[rows] = self._run(encoded)
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.where(norms == 0, 1.0, norms)
+        return out
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """(query, passage) relevance scores from the exported cross-encoder graph."""
+
+    def predict(self, pairs, batch_size: int = 32, show_progress_bar: bool = False, **_kwargs) -> np.ndarray:
+        pairs = list(pairs)
+        scores: List[np.ndarray] = []
+        for start in range(0, len(pairs), max(1, batch_size)):
+            batch = pairs[start:start + batch_size]
+            encoded = self.tokenizer(
+                [p[0] for p in batch], [p[1] for p in batch], padding=True,
+                truncation="longest_first", max_length=self.max_length, return_tensors="np",
+            )
+            scores.append(self._run(encoded))
+        logits = np.concatenate(scores) if scores else np.zeros((0, int(self.meta.get("num_labels", 1))))
+        if self.meta.get("activation") == "sigmoid":
+            logits = 1.0 / (1.0 + np.exp(-logits))
+        return logits[:, 0] if logits.shape[1] == 1 else logits
+
+
+def _load(model_name: str, kind: str, cls, root: Optional[Path], quantized: bool, threads: int):
+    root = root if root is not None else onnx_root()
+    directory = model_dir(root, model_name) if root is not None else None
+    if directory is None or not (directory / META_FILE).exists():
+        logger.warning(
+            f"No ONNX export for {model_name} under {root} — using PyTorch "
+            "(python -m app.services.onnx_backend export)"
+        )
+        return None
+    try:
+        import onnxruntime  # noqa: F401
+        from transformers import AutoTokenizer
+    except ImportError as exc:
+        logger.warning(f"ONNX backend unavailable ({exc}) — using PyTorch")
+        return None
+    try:
+        meta = json.loads((directory / META_FILE).read_text(encoding="utf-8"))
+        if meta.get("kind") != kind or meta.get("model") != model_name:
+            raise ValueError(f"export is a {meta.get('kind')} of {meta.get('model')}")
+        path = directory / (INT8_FILE if quantized and (directory / INT8_FILE).exists() else FP32_FILE)
+        meta["quantized"] = path.name == INT8_FILE
+        t0 = time.time()
+        model = cls(_session(path, threads), AutoTokenizer.from_pretrained(str(directory)), meta, path)
+        logger.info(f"ONNX {kind} loaded: {path} ({model.weight_bytes / 1e6:.0f} MB, {threads} threads) "
+                    f"in {time.time() - t0:.2f}s")
+        return model
+    except Exception as exc:
+        logger.warning(f"ONNX {kind} {model_name} not loaded ({exc}) — using PyTorch")
+        return None
+
+
+def load_onnx_encoder(model_name: str, *, threads: int, root: Optional[Path] = None,
+                      quantized: bool = ONNX_QUANTIZE) -> Optional[OnnxEncoder]:
+    """Exported bi-encoder for `model_name`, or None (caller falls back to PyTorch)."""
+    return _load(model_name, "encoder", OnnxEncoder, root, quantized, threads)
+
+
+def load_onnx_cross_encoder(model_name: str, *, threads: int, root: Optional[Path] = None,
+                            quantized: bool = ONNX_QUANTIZE) -> Optional[OnnxCrossEncoder]:
+    """Exported cross-encoder for `model_name`, or None (caller falls back to PyTorch)."""
+    return _load(model_name, "cross_encoder", OnnxCrossEncoder, root, quantized, threads)
+
+
+def _file_bytes(path: Path) -> int:
+    """Graph file, plus its external weight files for the float32 export."""
+    if path.parent.name != Path(FP32_FILE).parent.name:
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.parent.iterdir() if p.is_file())
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Export (build time — needs torch, sentence-transformers, onnx)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _torch_export(module, args, path: Path, input_names: List[str], output_name: str) -> None:
+    import torch
+
+    axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    axes[output_name] = {0: "batch"}
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            module, args, str(path), input_names=input_names, output_names=[output_name],
+            dynamic_axes=axes, opset_version=ONNX_OPSET, do_constant_folding=True, **kwargs,
+        )
+
+
+def _quantize(directory: Path, keep_fp32: bool) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    fp32 = directory / FP32_FILE
+    quantize_dynamic(str(fp32), str(directory / INT8_FILE), weight_type=QuantType.QInt8)
+    if not keep_fp32:
+        shutil.rmtree(fp32.parent)
+
+
+def _staging(root: Path, model_name: str) -> Path:
+    final = model_dir(root, model_name)
+    tmp = final.parent / f".{final.name}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    (tmp / FP32_FILE).parent.mkdir(parents=True)
+    return tmp
+
+
+def _publish(tmp: Path, root: Path, model_name: str) -> Path:
+    directory = model_dir(root, model_name)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    return directory
+
+
+def export_encoder(model_name: str, root: Path, *, quantize: bool = True, keep_fp32: bool = False) -> Path:
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu").eval()
+
+    class _Pooled(torch.nn.Module):
+        def __init__(self, st):
+            super().__init__()
+            self.st = st
+
+        def forward(self, input_ids, attention_mask):
+            return self.st({"input_ids": input_ids, "attention_mask": attention_mask})["sentence_embedding"]
+
+    tmp = _staging(root, model_name)
+    sample = model.tokenizer(["xin chào", "giá cước giờ cao điểm"], padding=True, return_tensors="pt")
+    _torch_export(_Pooled(model), (sample["input_ids"], sample["attention_mask"]), tmp / FP32_FILE,
+                  ["input_ids", "attention_mask"], "sentence_embedding")
+    model.tokenizer.save_pretrained(str(tmp))
+    meta = {
+        "kind": "encoder",
+        "model": model_name,
+        "max_length": int(model.max_seq_length),
+        "dim": int(model.get_sentence_embedding_dimension()),
+        "opset": ONNX_OPSET,
+        "torch_weight_bytes": _torch_weight_bytes(model),
+    }
+    (tmp / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    if quantize:
+        _quantize(tmp, keep_fp32)
+    return _publish(tmp, root, model_name)
+
+
+def export_cross_encoder(model_name: str, root: Path, *, max_length: int = 512, quantize: bool = True,
+                         keep_fp32: bool = False) -> Path:
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    cross = CrossEncoder(model_name, max_length=max_length, device="cpu")
+    hf_model = cross.model.eval()
+
+    class _Logits(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+    tmp = _staging(root, model_name)
+    sample = cross.tokenizer(["hủy chuyến có mất phí không"], ["Phí hủy chuyến là 10.000đ."],
+                             padding=True, truncation="longest_first", return_tensors="pt")
+    _torch_export(_Logits(hf_model), (sample["input_ids"], sample["attention_mask"]), tmp / FP32_FILE,
+                  ["input_ids", "attention_mask"], "logits")
+    cross.tokenizer.save_pretrained(str(tmp))
+    meta = {
+        "kind": "cross_encoder",
+        "model": model_name,
+        "max_length": max_length,
+        "num_labels": int(hf_model.config.num_labels),
+        "activation": "sigmoid" if isinstance(cross.default_activation_function, torch.nn.Sigmoid) else "identity",
+        "opset": ONNX_OPSET,
+        "torch_weight_bytes": _torch_weight_bytes(hf_model),
+    }
+    (tmp / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    if quantize:
+        _quantize(tmp, keep_fp32)
+    return _publish(tmp, root, model_name)
+
+
+def _torch_weight_bytes(model) -> int:
+    return int(sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers())))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Parity / latency report
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _latency_ms(fn, repeats: int) -> dict:
+    fn()  # warm-up (allocations, first-run graph setup)
+    took = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        took.append((time.perf_counter() - t0) * 1000)
+    return {"p50_ms": round(float(np.percentile(took, 50)), 2), "p95_ms": round(float(np.percentile(took, 95)), 2)}
+
+
+def compare_encoders(torch_model, onnx_model, queries: Sequence[str], passages: Sequence[str],
+                     repeats: int = 20) -> dict:
+    """Cosine between the two backends' unit embeddings, and single-query / passage-batch latency."""
+    texts = list(queries) + list(passages)
+    ref = torch_model.encode(texts, batch_size=32, show_progress_bar=False, normalize_embeddings=True)
+    got = onnx_model.encode(texts, batch_size=32, show_progress_bar=False, normalize_embeddings=True)
+    cosine = np.sum(np.asarray(ref, dtype=np.float32) * got, axis=1)
+    # Retrieval agreement: each query's top-5 passages under both backends
+    n = len(queries)
+    top = min(5, len(passages))
+    ref_top = np.argsort(-(ref[:n] @ ref[n:].T), axis=1)[:, :top]
+    got_top = np.argsort(-(got[:n] @ got[n:].T), axis=1)[:, :top]
+    overlap = np.mean([len(set(a) & set(b)) / top for a, b in zip(ref_top.tolist(), got_top.tolist())]) if n else 1.0
+    query = [queries[0]] if queries else [passages[0]]
+    batch = list(passages[:32])
+    return {
+        "texts": len(texts),
+        "cosine_min": round(float(cosine.min()), 5),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "top5_overlap": round(float(overlap), 4),
+        "torch": {
+            "query": _latency_ms(lambda: torch_model.encode(query, batch_size=1, show_progress_bar=False), repeats),
+            "batch32": _latency_ms(lambda: torch_model.encode(batch, batch_size=32, show_progress_bar=False),
+                                   max(3, repeats // 4)),
+        },
+        "onnx": {
+            "query": _latency_ms(lambda: onnx_model.encode(query, batch_size=1), repeats),
+            "batch32": _latency_ms(lambda: onnx_model.encode(batch, batch_size=32), max(3, repeats // 4)),
+        },
+    }
+
+
+def compare_cross_encoders(torch_model, onnx_model, queries: Sequence[str], passages: Sequence[str],
+                           pool: int = 20, repeats: int = 10) -> dict:
+    """Score delta and top-k agreement over `pool` passages per query (one chat turn's rerank)."""
+    deltas, same_top1, overlaps = [], [], []
+    for query in queries:
+        pairs = [[query, passage] for passage in passages[:pool]]
+        ref = np.asarray(torch_model.predict(pairs, batch_size=len(pairs), show_progress_bar=False), dtype=np.float64)
+        got = np.asarray(onnx_model.predict(pairs, batch_size=len(pairs)), dtype=np.float64)
+        deltas.append(np.abs(ref - got).max())
+        same_top1.append(int(np.argmax(ref) == np.argmax(got)))
+        top = min(5, len(pairs))
+        overlaps.append(len(set(np.argsort(-ref)[:top]) & set(np.argsort(-got)[:top])) / top)
+    pairs = [[queries[0], passage] for passage in passages[:pool]] if queries else []
+    return {
+        "queries": len(queries),
+        "pairs_per_query": min(pool, len(passages)),
+        "max_abs_score_delta": round(float(max(deltas, default=0.0)), 5),
+        "top1_agreement": round(float(np.mean(same_top1)) if same_top1 else 1.0, 4),
+        "top5_overlap": round(float(np.mean(overlaps)) if overlaps else 1.0, 4),
+        "torch": _latency_ms(lambda: torch_model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+                             repeats),
+        "onnx": _latency_ms(lambda: onnx_model.predict(pairs, batch_size=len(pairs)), repeats),
+    }
+
+
+def _report(embedder: str, reranker: Optional[str], root: Path, threads: int) -> dict:
+    import torch
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    from app.services.rag_service import KNOWLEDGE_DIR, _build_chunks, _build_qa_answers, _load_documents
+
+    torch.set_num_threads(threads)
+    docs = _load_documents(KNOWLEDGE_DIR)
+    passages = [chunk.text for chunk in _build_chunks(docs)][:64]
+    queries = [item.question for item in _build_qa_answers(docs)][:16] or passages[:8]
+    report = {"threads": threads, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+
+    onnx_embedder = load_onnx_encoder(embedder, threads=threads, root=root)
+    if onnx_embedder is not None:
+        torch_embedder = SentenceTransformer(embedder, device="cpu")
+        report["embedder"] = {
+            "model": embedder,
+            "backend": onnx_embedder.backend,
+            "torch_weight_bytes": onnx_embedder.meta.get("torch_weight_bytes"),
+            "onnx_weight_bytes": onnx_embedder.weight_bytes,
+            **compare_encoders(torch_embedder, onnx_embedder, queries, passages),
+        }
+        del torch_embedder
+    if reranker:
+        onnx_reranker = load_onnx_cross_encoder(reranker, threads=threads, root=root)
+        if onnx_reranker is not None:
+            torch_reranker = CrossEncoder(reranker, max_length=int(onnx_reranker.max_length), device="cpu")
+            report["reranker"] = {
+                "model": reranker,
+                "backend": onnx_reranker.backend,
+                "torch_weight_bytes": onnx_reranker.meta.get("torch_weight_bytes"),
+                "onnx_weight_bytes": onnx_reranker.weight_bytes,
+                **compare_cross_encoders(torch_reranker, onnx_reranker, queries[:8], passages),
+            }
+    return report
+
+
+if __name__ == "__main__":
+    from app.services.inference_executor import rag_torch_threads
+    from app.services.rag_service import EMBEDDING_MODEL_NAME, RERANKER_ENABLED, RERANKER_MODEL
+
+    parser = argparse.ArgumentParser(description="Export the RAG models to ONNX (int8) and compare with PyTorch")
+    parser.add_argument("command", choices=("export", "compare"))
+    parser.add_argument("--embedder", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--reranker", default=RERANKER_MODEL if RERANKER_ENABLED else "")
+    parser.add_argument("--no-quantize", action="store_true", help="keep float32 weights only")
+    parser.add_argument("--keep-fp32", action="store_true", help="keep model.onnx next to the int8 graph")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads for compare (0 = RAG budget)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    target = onnx_root()
+    if target is None:
+        raise SystemExit("RAG_ONNX_DIR is empty")
+    if args.command == "export":
+        quantize = not args.no_quantize
+        logger.info(f"Exported {export_encoder(args.embedder, target, quantize=quantize, keep_fp32=args.keep_fp32)}")
+        if args.reranker:
+            path = export_cross_encoder(args.reranker, target, quantize=quantize, keep_fp32=args.keep_fp32)
+            logger.info(f"Exported {path}")
+    else:
+        result = _report(args.embedder, args.reranker or None, target, args.threads or rag_torch_threads())
+        (target / "report.json").write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
@@ -1,10 +1,8 @@
 """Prediction service with ML model"""
 
 import logging
-import joblib
 import time
-from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional, Sequence
 import numpy as np
 
 from app.schemas.prediction import (
@@ -15,33 +13,192 @@ from app.schemas.prediction import (
     TimeOfDayEnum,
 )
 from app.core.config import settings
+from app.services.compiled_trees import engine_name
+from app.services.model_artifacts import ModelArtifact, load_model_artifact, model_memory
+from app.services.model_registry import follow_registry, resolve_model_path, service_path
 
 logger = logging.getLogger(__name__)
 
 
+class EtaLookupTable:
+    """
+    Dense (distance × time_of_day × day_type) table sampled from the forest.
+
+    The ETA model has one continuous input and two binary flags, so its whole
+    input space is four 1-D curves. Each curve is sampled every ``step_km``
+    over the trained distance range and answered by linear interpolation;
+    rows outside the range are left for the forest.
+    """
+
+    def __init__(self, grid: np.ndarray, min_km: float, max_km: float, step_km: float, report: Dict[str, object]):
+        # grid[combo, i] = forest output at min_km + i * step_km; combo = time_of_day * 2 + day_type
+        self.grid = grid
+        self.grid.setflags(write=False)
+        self.min_km = float(min_km)
+        self.max_km = float(max_km)
+        self.step_km = float(step_km)
+        self.size = int(grid.shape[1])
+        self.report = report
+
+    @classmethod
+    def sample(cls, model, scaler, min_km: float, max_km: float, step_km: float) -> "EtaLookupTable":
+        """Sample the model over the grid and attach the midpoint accuracy report."""
+        size = int(round((float(max_km) - float(min_km)) / float(step_km))) + 1
+        distances = float(min_km) + float(step_km) * np.arange(size)
+        grid = np.empty((4, size, 2), dtype=float)
+        for combo in range(4):
+            grid[combo] = model.predict(scaler.transform(cls._rows(distances, combo)))
+        table = cls(grid, min_km, max_km, step_km, report={})
+        table.report = table._accuracy_report(model, scaler, distances)
+        return table
+
+    @staticmethod
+    def _rows(distances: np.ndarray, combo: int) -> np.ndarray:
+        rows = np.empty((len(distances), 3), dtype=float)
+        rows[:, 0] = distances
+        rows[:, 1] = combo // 2
+        rows[:, 2] = combo % 2
+        return rows
+
+    def covers(self, distance_km: np.ndarray) -> np.ndarray:
+        return (distance_km >= self.min_km) & (distance_km <= self.max_km)
+
+    def lookup(self, raw: np.ndarray) -> np.ndarray:
+        """Interpolated (N, 2) [eta, price] for raw rows already inside the grid."""
+        pos = (raw[:, 0] - self.min_km) / self.step_km
+        i0 = np.clip(np.floor(pos).astype(int), 0, self.size - 2)
+        w = np.clip(pos - i0, 0.0, 1.0)[:, None]
+        combo = (raw[:, 1] * 2 + raw[:, 2]).astype(int)
+        return self.grid[combo, i0] * (1.0 - w) + self.grid[combo, i0 + 1] * w
+
+    def _accuracy_report(self, model, scaler, distances: np.ndarray) -> Dict[str, object]:
+        """Compare grid vs forest at the midpoints between grid nodes (worst case for interpolation)."""
+        midpoints = distances[:-1] + self.step_km / 2
+        eta_err, price_err, eta_minute_mismatch = [], [], 0
+        for combo in range(4):
+            rows = self._rows(midpoints, combo)
+            forest = model.predict(scaler.transform(rows))
+            grid = self.lookup(rows)
+            eta_err.append(np.abs(grid[:, 0] - forest[:, 0]))
+            price_err.append(np.abs(grid[:, 1] - forest[:, 1]))
+            eta_minute_mismatch += int(np.count_nonzero(
+                np.clip(grid[:, 0], 1, 120).astype(int) != np.clip(forest[:, 0], 1, 120).astype(int)
+            ))
+        eta_err = np.concatenate(eta_err)
+        price_err = np.concatenate(price_err)
+        return {
+            "points": int(self.grid.shape[0] * self.grid.shape[1]),
+            "range_km": [self.min_km, self.max_km],
+            "step_km": self.step_km,
+            "bytes": int(self.grid.nbytes),
+            "samples_checked": int(eta_err.size),
+            "eta_mae": round(float(eta_err.mean()), 4),
+            "eta_max_abs_err": round(float(eta_err.max()), 4),
+            "eta_minute_mismatch_rate": round(eta_minute_mismatch / max(1, eta_err.size), 4),
+            "price_mae": round(float(price_err.mean()), 5),
+            "price_max_abs_err": round(float(price_err.max()), 5),
+        }
+
+
 class PredictionService:
     """Service for making predictions using trained ML model"""
     
     def __init__(self):
         """Initialize service and load model"""
-        self.model = None
-        self.scaler = None
+        # Everything a request reads (model, scaler, lookup) lives on one artifact,
+        # replaced by a single reference assignment on reload.
+        self._artifact: Optional[ModelArtifact] = None
         self.load_model()
+        follow_registry("eta_price", self)  # rollback / pin / retrain done by another worker
 
-    def _resolve_model_path(self) -> Path:
-        model_path = Path(settings.MODEL_PATH)
-        if not model_path.is_absolute():
-            service_root = Path(__file__).resolve().parents[2]
-            model_path = service_root / model_path
-        return model_path
+    @property
+    def model(self):
+        artifact = self._artifact
+        return artifact.model if artifact is not None else None
+
+    @property
+    def scaler(self):
+        artifact = self._artifact
+        return artifact.payload.get('scaler') if artifact is not None else None
+
+    @property
+    def lookup(self) -> Optional[EtaLookupTable]:
+        artifact = self._artifact
+        return artifact.derived.get('lookup') if artifact is not None else None
+
+    @property
+    def version(self) -> Optional[str]:
+        artifact = self._artifact
+        return artifact.version if artifact is not None else None
+
+    def _load_artifacts(self, version: Optional[str] = None):
+        model_path, registry_version = resolve_model_path(
+            "eta_price", service_path(settings.MODEL_PATH), version
+        )
+        artifact = load_model_artifact(
+            model_path,
+            settings.ETA_MODEL_ENGINE,
+            "eta_price_model",
+            derived_key=self._lookup_key(),
+            derive=self._derive_lookup,
+        )
+        artifact.version = registry_version
+        grid = artifact.extras.get("eta_lookup_grid")
+        if grid is not None:
+            artifact.derived['lookup'] = EtaLookupTable(
+                grid,
+                settings.ETA_LOOKUP_MIN_KM,
+                settings.ETA_LOOKUP_MAX_KM,
+                settings.ETA_LOOKUP_STEP_KM,
+                artifact.extras_meta.get("eta_lookup", {}),
+            )
+        return model_path, artifact
+
+    @staticmethod
+    def _lookup_key() -> str:
+        if not settings.ETA_LOOKUP_ENABLED:
+            return "eta_lookup:off"
+        return (
+            f"eta_lookup:{settings.ETA_LOOKUP_MIN_KM}:"
+            f"{settings.ETA_LOOKUP_MAX_KM}:{settings.ETA_LOOKUP_STEP_KM}"
+        )
+
+    def _derive_lookup(self, payload: dict):
+        """
+        Grid stored next to the compiled forest. Sampled from the sklearn forest:
+        same outputs as the compiled ensemble, and its Cython traversal is faster
+        on the ~40k-row build.
+        """
+        table = self._build_lookup(payload['model'], payload['scaler'])
+        if table is None:
+            return {}, {}
+        return {"eta_lookup_grid": table.grid}, {"eta_lookup": table.report}
+
+    def _build_lookup(self, model, scaler) -> Optional[EtaLookupTable]:
+        if not settings.ETA_LOOKUP_ENABLED:
+            return None
+        start_time = time.perf_counter()
+        try:
+            table = EtaLookupTable.sample(
+                model,
+                scaler,
+                settings.ETA_LOOKUP_MIN_KM,
+                settings.ETA_LOOKUP_MAX_KM,
+                settings.ETA_LOOKUP_STEP_KM,
+            )
+        except Exception as exc:
+            logger.warning(f"ETA lookup table build failed ({exc}) — forest inference only")
+            return None
+        logger.info(
+            f"ETA lookup table built in {int((time.perf_counter() - start_time) * 1000)}ms: "
+            f"{table.report}"
+        )
+        return table
 
     def load_model(self):
         """Load trained model from disk"""
         try:
-            model_path = self._resolve_model_path()
-            model_data = joblib.load(model_path)
-            self.model = model_data['model']
-            self.scaler = model_data['scaler']
+            model_path, self._artifact = self._load_artifacts()
             logger.info(f"Model loaded successfully from {model_path}")
         except FileNotFoundError:
             logger.error(f"Model file not found at {settings.MODEL_PATH}")
@@ -50,210 +207,264 @@ class PredictionService:
             logger.error(f"Error loading model: {str(e)}")
             raise RuntimeError(f"Error loading model: {str(e)}")
 
-    def reload_model(self) -> bool:
-        """Reload eta/price model from disk after retrain. Keeps previous weights if reload fails."""
+    def reload_model(self, version: Optional[str] = None) -> bool:
+        """
+        Load the current (or given) registry version into a shadow artifact, then
+        swap it in. Keeps previous weights if reload fails.
+        """
         try:
-            model_path = self._resolve_model_path()
-            model_data = joblib.load(model_path)
-            self.model = model_data['model']
-            self.scaler = model_data['scaler']
+            model_path, artifact = self._load_artifacts(version)
+            self._artifact = artifact
             logger.info(f"Prediction model reloaded from {model_path}")
             return True
         except Exception as exc:
             logger.error(f"Prediction model reload failed: {exc}")
             return False
-    
-    def _encode_features(self, request: PredictionRequest) -> np.ndarray:
+
+    @property
+    def engine(self) -> Optional[str]:
+        return engine_name(self.model)
+
+    def memory_report(self) -> Dict[str, object]:
+        artifact = self._artifact
+        if artifact is None:
+            return model_memory(None)
+        return model_memory(artifact.model, artifact.sidecar)
+
+    @property
+    def lookup_report(self) -> Optional[Dict[str, object]]:
+        return self.lookup.report if self.lookup is not None else None
+
+    def _encode_raw_features(self, requests: Sequence[PredictionRequest]) -> np.ndarray:
         """
-        Encode request features for model input
-        
+        Encode request features for model input (before scaling)
+
         Features:
         - distance_km (continuous)
         - time_of_day (categorical: 0=OFF_PEAK, 1=RUSH_HOUR)
         - day_type (categorical: 0=WEEKDAY, 1=WEEKEND)
-        
+
         Returns:
-            numpy array of shape (1, 3) with scaled features
+            numpy array of shape (N, 3): [distance_km, time_of_day, day_type]
         """
-        # One-hot encode categorical features
-        time_of_day_encoded = 1 if request.time_of_day == TimeOfDayEnum.RUSH_HOUR else 0
-        day_type_encoded = 1 if request.day_type == DayTypeEnum.WEEKEND else 0
-        
-        # Create feature array: [distance_km, time_of_day, day_type]
-        features = np.array([
-            request.distance_km,
-            time_of_day_encoded,
-            day_type_encoded
-        ]).reshape(1, -1)
-        
-        # Scale features using fitted scaler
-        features_scaled = self.scaler.transform(features)
-        
-        return features_scaled
-    
-    def predict(self, request: PredictionRequest) -> Dict[str, float]:
+        n = len(requests)
+        features = np.empty((n, 3), dtype=float)
+        features[:, 0] = np.fromiter((r.distance_km for r in requests), dtype=float, count=n)
+        features[:, 1] = np.fromiter(
+            (r.time_of_day == TimeOfDayEnum.RUSH_HOUR for r in requests), dtype=float, count=n
+        )
+        features[:, 2] = np.fromiter(
+            (r.day_type == DayTypeEnum.WEEKEND for r in requests), dtype=float, count=n
+        )
+        return features
+
+    def _encode_features(self, request: PredictionRequest) -> np.ndarray:
+        """Scaled (1, 3) feature row for a single request."""
+        return self.scaler.transform(self._encode_raw_features([request]))
+
+    def predict(self, request: PredictionRequest) -> Dict[str, object]:
         """
         Make prediction for ETA and price multiplier
-        
+
         Args:
             request: PredictionRequest with distance, time_of_day, day_type
-            
+
         Returns:
             Dictionary with eta_minutes and price_multiplier
         """
+        batch = self.predict_batch([request])
+        prediction = batch['results'][0]
+
+        logger.info(
+            f"Prediction: distance={request.distance_km}km, "
+            f"time={request.time_of_day}, day={request.day_type} "
+            f"-> ETA={prediction['eta_minutes']}min, multiplier={prediction['price_multiplier']}"
+        )
+        return prediction
+
+    def predict_batch(self, requests: Sequence[PredictionRequest]) -> Dict[str, object]:
+        """
+        Predict ETA and price multiplier for N trips with one scaler transform
+        and one forest ``predict`` over an (N, 3) matrix.
+
+        Returns:
+            Dictionary with per-row ``results`` (same shape as ``predict``) and
+            the batch-level ``inference_ms``.
+        """
         start_time = time.perf_counter()
         try:
-            # Encode features
-            features_scaled = self._encode_features(request)
-            
-            # Make prediction (model outputs eta and price_multiplier)
-            predictions = self.model.predict(features_scaled)[0]
-            
-            # Extract predictions
-            eta_minutes = int(max(1, min(120, predictions[0])))  # Clamp to [1, 120]
-            price_multiplier = float(max(1.0, min(2.0, predictions[1])))  # Clamp to [1.0, 2.0]
-            confidence_score = self._compute_confidence_score(request, eta_minutes, price_multiplier)
-            bounded_radius = self._compute_recommended_radius(request, eta_minutes, price_multiplier)
-            bounded_surge_hint = float(
-                max(settings.SUGGESTED_SURGE_MIN, min(settings.SUGGESTED_SURGE_MAX, round(price_multiplier, 2)))
-            )
+            raw = self._encode_raw_features(requests)
+            predictions = self._predict_raw(raw)
+
+            distance = raw[:, 0]
+            rush = raw[:, 1] > 0
+            weekend = raw[:, 2] > 0
+
+            eta_minutes = np.clip(predictions[:, 0], 1, 120).astype(int)  # Clamp to [1, 120]
+            price_multiplier = np.clip(predictions[:, 1], 1.0, 2.0)  # Clamp to [1.0, 2.0]
+            price_rounded = np.round(price_multiplier, 2)
+
+            confidence_score = self._compute_confidence_score(distance, rush, eta_minutes, price_multiplier)
+            bounded_radius = self._compute_recommended_radius(distance, rush, weekend, eta_minutes, price_multiplier)
+            bounded_surge_hint = np.clip(price_rounded, settings.SUGGESTED_SURGE_MIN, settings.SUGGESTED_SURGE_MAX)
+            insights = self._build_operational_insights(distance, rush, weekend, eta_minutes, price_rounded)
             inference_ms = int((time.perf_counter() - start_time) * 1000)
-            
-            logger.info(
-                f"Prediction: distance={request.distance_km}km, "
-                f"time={request.time_of_day}, day={request.day_type} "
-                f"-> ETA={eta_minutes}min, multiplier={price_multiplier}"
-            )
-            
+
+            results = [
+                {
+                    'eta_minutes': eta,
+                    'price_multiplier': price,
+                    'recommended_driver_radius_km': radius,
+                    'surge_hint': surge,
+                    'confidence_score': confidence,
+                    'reason_code': 'AI_OK',
+                    'model_version': settings.MODEL_VERSION,
+                    'feature_version': settings.FEATURE_VERSION,
+                    'inference_ms': inference_ms,
+                    'insights': insight,
+                }
+                for eta, price, radius, surge, confidence, insight in zip(
+                    eta_minutes.tolist(),
+                    price_rounded.tolist(),
+                    bounded_radius.tolist(),
+                    bounded_surge_hint.tolist(),
+                    confidence_score.tolist(),
+                    insights,
+                )
+            ]
+
+            logger.debug(f"Batch prediction: {len(results)} rows, inference={inference_ms}ms")
+
             return {
-                'eta_minutes': eta_minutes,
-                'price_multiplier': round(price_multiplier, 2),
-                'recommended_driver_radius_km': bounded_radius,
-                'surge_hint': bounded_surge_hint,
-                'confidence_score': confidence_score,
-                'reason_code': 'AI_OK',
+                'results': results,
                 'model_version': settings.MODEL_VERSION,
                 'feature_version': settings.FEATURE_VERSION,
                 'inference_ms': inference_ms,
-                'insights': self._build_operational_insights(
-                    request,
-                    eta_minutes=eta_minutes,
-                    price_multiplier=round(price_multiplier, 2),
-                ),
             }
-            
+
         except Exception as e:
             logger.error(f"Error making prediction: {str(e)}")
             raise RuntimeError(f"Prediction inference failed: {str(e)}") from e
 
-    def _compute_confidence_score(
-        self,
-        request: PredictionRequest,
-        eta_minutes: int,
-        price_multiplier: float,
-    ) -> float:
-        score = 0.75
+    def _predict_raw(self, raw: np.ndarray) -> np.ndarray:
+        """(N, 2) [eta, price] — grid lookup inside the trained range, forest outside it."""
+        artifact = self._artifact
+        model, scaler, lookup = artifact.model, artifact.payload['scaler'], artifact.derived.get('lookup')
+        if lookup is None:
+            return model.predict(scaler.transform(raw))
 
-        if request.distance_km <= 8:
-            score += 0.15
-        elif request.distance_km > 20:
-            score -= 0.15
+        in_grid = lookup.covers(raw[:, 0])
+        if in_grid.all():
+            return lookup.lookup(raw)
 
-        if request.time_of_day == TimeOfDayEnum.RUSH_HOUR:
-            score -= 0.05
+        predictions = np.empty((raw.shape[0], 2), dtype=float)
+        if in_grid.any():
+            predictions[in_grid] = lookup.lookup(raw[in_grid])
+        predictions[~in_grid] = model.predict(scaler.transform(raw[~in_grid]))
+        return predictions
 
-        if eta_minutes > 45:
-            score -= 0.10
+    def _compute_confidence_score(
+        self,
+        distance_km: np.ndarray,
+        rush_hour: np.ndarray,
+        eta_minutes: np.ndarray,
+        price_multiplier: np.ndarray,
+    ) -> np.ndarray:
+        score = np.full(distance_km.shape, 0.75)
 
-        if price_multiplier >= 1.6:
-            score -= 0.08
+        score += np.where(distance_km <= 8, 0.15, np.where(distance_km > 20, -0.15, 0.0))
+        score -= np.where(rush_hour, 0.05, 0.0)
+        score -= np.where(eta_minutes > 45, 0.10, 0.0)
+        score -= np.where(price_multiplier >= 1.6, 0.08, 0.0)
 
-        return round(max(0.05, min(0.99, score)), 2)
+        return np.round(np.clip(score, 0.05, 0.99), 2)
 
     def _compute_recommended_radius(
         self,
-        request: PredictionRequest,
-        eta_minutes: int,
-        price_multiplier: float,
-    ) -> float:
-        radius = 2.5
-
-        if request.time_of_day == TimeOfDayEnum.RUSH_HOUR:
-            radius += 0.7
-
-        if request.day_type == DayTypeEnum.WEEKEND:
-            radius += 0.3
-
-        if request.distance_km >= 12:
-            radius += 0.4
-
-        if eta_minutes >= 30:
-            radius += 0.6
+        distance_km: np.ndarray,
+        rush_hour: np.ndarray,
+        weekend: np.ndarray,
+        eta_minutes: np.ndarray,
+        price_multiplier: np.ndarray,
+    ) -> np.ndarray:
+        radius = np.full(distance_km.shape, 2.5)
 
-        if price_multiplier >= 1.4:
-            radius += 0.4
+        radius += np.where(rush_hour, 0.7, 0.0)
+        radius += np.where(weekend, 0.3, 0.0)
+        radius += np.where(distance_km >= 12, 0.4, 0.0)
+        radius += np.where(eta_minutes >= 30, 0.6, 0.0)
+        radius += np.where(price_multiplier >= 1.4, 0.4, 0.0)
 
-        return round(
-            max(settings.SUGGESTED_RADIUS_MIN_KM, min(settings.SUGGESTED_RADIUS_MAX_KM, radius)),
+        return np.round(
+            np.clip(radius, settings.SUGGESTED_RADIUS_MIN_KM, settings.SUGGESTED_RADIUS_MAX_KM),
             1,
         )
 
     def _build_operational_insights(
         self,
-        request: PredictionRequest,
-        eta_minutes: int,
-        price_multiplier: float,
-    ) -> Dict[str, object]:
-        demand_score = 0
-
-        if request.time_of_day == TimeOfDayEnum.RUSH_HOUR:
-          demand_score += 2
-        if request.day_type == DayTypeEnum.WEEKEND:
-          demand_score += 1
-        if request.distance_km >= 12:
-          demand_score += 1
-        if price_multiplier >= 1.3:
-          demand_score += 1
-
-        if demand_score >= 4:
-            demand_level = DemandLevelEnum.HIGH
-        elif demand_score >= 2:
-            demand_level = DemandLevelEnum.MEDIUM
-        else:
-            demand_level = DemandLevelEnum.LOW
-
-        if request.distance_km <= 8 and request.time_of_day == TimeOfDayEnum.OFF_PEAK:
-            eta_confidence = ConfidenceLevelEnum.HIGH
-        elif request.distance_km <= 20:
-            eta_confidence = ConfidenceLevelEnum.MEDIUM
-        else:
-            eta_confidence = ConfidenceLevelEnum.LOW
-
-        recommended_radius = 2.5
-        if demand_level == DemandLevelEnum.MEDIUM:
-            recommended_radius = 4.0
-        elif demand_level == DemandLevelEnum.HIGH:
-            recommended_radius = 6.0
-
-        if eta_minutes >= 35:
-            recommended_radius = min(recommended_radius + 1.0, 10.0)
-
-        if price_multiplier >= 1.5:
-            surge_reason = 'Demand is significantly above normal supply expectations'
-        elif request.time_of_day == TimeOfDayEnum.RUSH_HOUR:
-            surge_reason = 'Rush hour demand is increasing ETA and fare pressure'
-        elif request.day_type == DayTypeEnum.WEEKEND:
-            surge_reason = 'Weekend travel pattern is raising pickup competition'
-        else:
-            surge_reason = 'Normal traffic and supply conditions'
+        distance_km: np.ndarray,
+        rush_hour: np.ndarray,
+        weekend: np.ndarray,
+        eta_minutes: np.ndarray,
+        price_multiplier: np.ndarray,
+    ) -> List[Dict[str, object]]:
+        demand_score = (
+            np.where(rush_hour, 2, 0)
+            + np.where(weekend, 1, 0)
+            + np.where(distance_km >= 12, 1, 0)
+            + np.where(price_multiplier >= 1.3, 1, 0)
+        )
+        demand_level = np.select(
+            [demand_score >= 4, demand_score >= 2],
+            [DemandLevelEnum.HIGH.value, DemandLevelEnum.MEDIUM.value],
+            default=DemandLevelEnum.LOW.value,
+        )
 
-        return {
-            'demand_level': demand_level.value,
-            'eta_confidence': eta_confidence.value,
-            'recommended_driver_radius_km': round(recommended_radius, 1),
-            'surge_reason': surge_reason,
-        }
+        eta_confidence = np.select(
+            [(distance_km <= 8) & ~rush_hour, distance_km <= 20],
+            [ConfidenceLevelEnum.HIGH.value, ConfidenceLevelEnum.MEDIUM.value],
+            default=ConfidenceLevelEnum.LOW.value,
+        )
+
+        recommended_radius = np.select(
+            [demand_level == DemandLevelEnum.HIGH.value, demand_level == DemandLevelEnum.MEDIUM.value],
+            [6.0, 4.0],
+            default=2.5,
+        )
+        recommended_radius = np.where(
+            eta_minutes >= 35, np.minimum(recommended_radius + 1.0, 10.0), recommended_radius
+        )
+
+        surge_reason = np.select(
+            [price_multiplier >= 1.5, rush_hour, weekend],
+            [
+                'Demand is significantly above normal supply expectations',
+                'Rush hour demand is increasing ETA and fare pressure',
+                'Weekend travel pattern is raising pickup competition',
+            ],
+            default='Normal traffic and supply conditions',
+        )
+
+        return [
+            {
+                'demand_level': level,
+                'eta_confidence': confidence,
+                'recommended_driver_radius_km': radius,
+                'surge_reason': reason,
+            }
+            for level, confidence, radius, reason in zip(
+                demand_level.tolist(),
+                eta_confidence.tolist(),
+                np.round(recommended_radius, 1).tolist(),
+                surge_reason.tolist(),
+            )
+        ]
 
 
 # Global instance
 prediction_service = PredictionService()
+
+
+def predict_batch_in_worker(requests: Sequence[PredictionRequest]) -> Dict[str, object]:
+    """Picklable entry point for the inference process pool (loads the model once per worker)."""
+    return prediction_service.predict_batch(requests)
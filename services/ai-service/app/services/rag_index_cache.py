@@ -0,0 +1,156 @@
+"""
+Persistent RAG index cache: embeddings, chunk / Q&A tables and BM25 statistics.
+
+    <RAG_CACHE_DIR>/<key>/
+        embeddings.npy   float32, L2-normalised — memory-mapped read-only on load
+        chunks.json      [{"text", "source", "title", "tokens"}]
+        qa.json          Q&A fast-path table with its precomputed token sets
+        bm25.npz         SparseBM25 postings (vocab, term/doc/tf triples, doc lengths, k1/b/epsilon)
+        meta.json        key, embedding model, counts, created_at
+
+`key` hashes the knowledge documents together with everything that changes the
+derived data (embedding model, chunking parameters, CACHE_FORMAT), so a restart
+of the same image maps the previous build instead of re-encoding every chunk
+and any edit under app/data/knowledge gets a fresh entry. Entries are written
+to a temp dir and renamed into place: workers starting concurrently either see
+a complete entry or build their own.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.bm25_sparse import SparseBM25
+
+logger = logging.getLogger(__name__)
+
+# Bump when chunking / tokenisation / record layout changes
+CACHE_FORMAT = 3
+
+SERVICE_ROOT = Path(__file__).resolve().parents[2]
+
+
+def cache_key(docs: Iterable[Tuple[str, str, str]], embedding_model: str, params: dict) -> str:
+    """Content hash of (filename, title, content) docs + embedding model + build params."""
+    digest = hashlib.sha256()
+    header = {"format": CACHE_FORMAT, "embedding_model": embedding_model, **params}
+    digest.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+    for doc in docs:
+        for part in doc:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+    return digest.hexdigest()[:24]
+
+
+def cache_root(value: str) -> Optional[Path]:
+    """RAG_CACHE_DIR → absolute path (relative to the ai-service root); empty disables the cache."""
+    if not value:
+        return None
+    path = Path(value)
+    return path if path.is_absolute() else SERVICE_ROOT / path
+
+
+class RagIndexCache:
+    def __init__(self, root: Path, keep: int = 3) -> None:
+        self.root = root
+        self.keep = max(1, keep)
+
+    def entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def load(self, key: str) -> Optional[dict]:
+        """Cached entry for `key` ({"embeddings", "chunks", "qa", "bm25", "meta"}) or None."""
+        entry = self.entry_dir(key)
+        if not (entry / "meta.json").exists():
+            return None
+        try:
+            meta = json.loads((entry / "meta.json").read_text(encoding="utf-8"))
+            chunks = json.loads((entry / "chunks.json").read_text(encoding="utf-8"))
+            qa = json.loads((entry / "qa.json").read_text(encoding="utf-8"))
+            embeddings = self._map(entry)
+            bm25 = SparseBM25.load(entry / "bm25.npz") if (entry / "bm25.npz").exists() else None
+        except Exception as exc:
+            logger.warning(f"RAG index cache {key} unreadable ({exc}) — rebuilding")
+            return None
+        if meta.get("key") != key or len(embeddings) != len(chunks):
+            logger.warning(f"RAG index cache {key} is inconsistent — rebuilding")
+            return None
+        return {"embeddings": embeddings, "chunks": chunks, "qa": qa, "bm25": bm25, "meta": meta}
+
+    def map_embeddings(self, key: str) -> Optional[np.ndarray]:
+        """Read-only memory map of the entry's embeddings (None if absent): pages load on access, shared by workers."""
+        entry = self.entry_dir(key)
+        try:
+            return self._map(entry) if (entry / "meta.json").exists() else None
+        except Exception as exc:
+            logger.warning(f"RAG index cache {key} embeddings not mapped ({exc})")
+            return None
+
+    @staticmethod
+    def _map(entry: Path) -> np.ndarray:
+        return np.load(entry / "embeddings.npy", mmap_mode="r").view(np.ndarray)
+
+    def save(
+        self,
+        key: str,
+        *,
+        embeddings: np.ndarray,
+        chunks: List[dict],
+        qa: List[dict],
+        bm25=None,
+        meta: Optional[dict] = None,
+    ) -> Path:
+        entry = self.entry_dir(key)
+        if (entry / "meta.json").exists():
+            return entry
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".{key}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        try:
+            np.save(tmp / "embeddings.npy", np.ascontiguousarray(embeddings, dtype=np.float32))
+            (tmp / "chunks.json").write_text(json.dumps(chunks, ensure_ascii=False), encoding="utf-8")
+            (tmp / "qa.json").write_text(json.dumps(qa, ensure_ascii=False), encoding="utf-8")
+            if bm25 is not None:
+                bm25.save(tmp / "bm25.npz")
+            info = {
+                "key": key,
+                "format": CACHE_FORMAT,
+                "chunks": len(chunks),
+                "qa_answers": len(qa),
+                "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                **(meta or {}),
+            }
+            (tmp / "meta.json").write_text(json.dumps(info, indent=2, ensure_ascii=False), encoding="utf-8")
+            try:
+                os.replace(tmp, entry)
+            except OSError:
+                # Another worker published the same key first
+                if not (entry / "meta.json").exists():
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        logger.info(f"RAG index cache written: {entry}")
+        self._prune(keep_key=key)
+        return entry
+
+    def _prune(self, keep_key: str) -> None:
+        """Drop all but the newest `keep` entries (mapped files stay valid until unmapped)."""
+        entries = sorted(
+            (p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith(".") and p.name != keep_key),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True,
+        )
+        for stale in entries[self.keep - 1:]:
+            shutil.rmtree(stale, ignore_errors=True)
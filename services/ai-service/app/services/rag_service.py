@@ -17,6 +17,9 @@ Pipeline (upgraded):
         (OpenAI → Gemini → rulebase/template fallback).
 """
 
+import asyncio
+import hashlib
+import json
 import logging
 import os
 import random
@@ -24,8 +27,20 @@ import re
 import threading
 import time
 import unicodedata
+from collections import Counter
+from itertools import chain
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.bm25_sparse import SparseBM25
+from app.services.chat_cache import EmbeddingLRU, SemanticAnswerCache
+from app.services.inference_executor import rag_executor, rag_torch_threads
+from app.services.llm_http import llm_http_pool
+from app.services.llm_resilience import llm_breakers, llm_hedger
+from app.services.micro_batcher import MicroBatcher
+from app.services.onnx_backend import INFERENCE_BACKEND, load_onnx_cross_encoder, load_onnx_encoder
+from app.services.rag_index_cache import RagIndexCache, cache_key, cache_root
 
 logger = logging.getLogger(__name__)
 
@@ -34,23 +49,30 @@ logger = logging.getLogger(__name__)
 # ─────────────────────────────────────────────────────────────────────────────
 _np = None
 _faiss = None
+_AnnIndex = None
 _SentenceTransformer = None
 _CrossEncoder = None
-_httpx = None
-_BM25Okapi = None
 
 
-def _ensure_imports():
-    global _np, _faiss, _SentenceTransformer, _CrossEncoder, _httpx, _BM25Okapi
+def _ensure_index_imports():
+    """NumPy / FAISS only — enough to build or map a VectorIndex."""
+    global _np, _faiss, _AnnIndex
     if _np is None:
         import numpy as np
         _np = np
     if _faiss is None:
         try:
             import faiss
+            from app.services.ann_index import AnnIndex
             _faiss = faiss
+            _AnnIndex = AnnIndex
         except ImportError:
             logger.warning("faiss-cpu not installed — falling back to NumPy cosine search")
+
+
+def _ensure_imports():
+    global _SentenceTransformer, _CrossEncoder
+    _ensure_index_imports()
     if _SentenceTransformer is None:
         from sentence_transformers import SentenceTransformer
         _SentenceTransformer = SentenceTransformer
@@ -60,15 +82,6 @@ def _ensure_imports():
             _CrossEncoder = CrossEncoder
         except ImportError:
             logger.warning("CrossEncoder not available — reranking disabled")
-    if _httpx is None:
-        import httpx
-        _httpx = httpx
-    if _BM25Okapi is None:
-        try:
-            from rank_bm25 import BM25Okapi
-            _BM25Okapi = BM25Okapi
-        except ImportError:
-            logger.warning("rank_bm25 not installed — BM25 search disabled, using semantic only")
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -94,6 +107,17 @@ RAG_COSINE_ABSENT = float(os.getenv("RAG_COSINE_ABSENT", "0.22"))  # below → n
 RAG_COSINE_LLM = float(os.getenv("RAG_COSINE_LLM", "0.30"))  # at/above → allow LLM synthesis
 QA_FAST_PATH_ENABLED = os.getenv("RAG_QA_FAST_PATH_ENABLED", "true").lower() in ("true", "1", "yes")
 QA_FAST_PATH_THRESHOLD = float(os.getenv("RAG_QA_FAST_PATH_THRESHOLD", "0.68"))
+# Persistent index cache (embeddings + chunk/Q&A tables + BM25), keyed by KB
+# content and embedding model — restarts map it instead of re-encoding. "" disables.
+RAG_CACHE_DIR = os.getenv("RAG_CACHE_DIR", "app/data/rag_cache")
+# Semantic answer cache: finished LLM answers keyed by query embedding, reused
+# above the cosine threshold for history-free / self-contained questions.
+ANSWER_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL_S = float(os.getenv("RAG_ANSWER_CACHE_TTL_S", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+# Exact-match query embedding cache (quick-menu chips, repeated short questions). 0 disables.
+EMBED_CACHE_MB = float(os.getenv("RAG_EMBED_CACHE_MB", "8"))
 
 # Cross-encoder reranker — biggest single accuracy lever after retrieval.
 # bge-reranker-v2-m3 (568 MB) is multilingual and excellent for Vietnamese.
@@ -431,37 +455,43 @@ def _apply_answer_polish(payload: dict) -> dict:
 # ─────────────────────────────────────────────────────────────────────────────
 
 class Chunk:
-    __slots__ = ("text", "source", "title")
+    __slots__ = ("text", "source", "title", "tokens")
 
-    def __init__(self, text: str, source: str, title: str):
+    def __init__(self, text: str, source: str, title: str, tokens: Optional[List[str]] = None):
         self.text = text
         self.source = source
         self.title = title
+        # BM25 tokens, kept so re-indexing never re-tokenises unchanged chunks
+        self.tokens = tokens if tokens is not None else _tokenize_vi(text)
+
+    def to_record(self) -> dict:
+        return {"text": self.text, "source": self.source, "title": self.title, "tokens": self.tokens}
 
     def __repr__(self):
         return f"Chunk(source={self.source!r}, text[:60]={self.text[:60]!r})"
 
 
+def _load_document(txt_file: Path) -> Optional[Tuple[str, str, str]]:
+    try:
+        content = txt_file.read_text(encoding="utf-8")
+    except Exception as exc:
+        logger.error(f"Failed to load {txt_file}: {exc}")
+        return None
+    title = txt_file.stem
+    for line in content.split("\n")[:5]:
+        if line.startswith("TIÊU ĐỀ:"):
+            title = line.replace("TIÊU ĐỀ:", "").strip()
+            break
+    logger.info(f"Loaded: {txt_file.name} ({len(content)} chars)")
+    return (txt_file.name, title, content)
+
+
 def _load_documents(knowledge_dir: Path) -> List[Tuple[str, str, str]]:
-    docs = []
     if not knowledge_dir.exists():
         logger.warning(f"Knowledge directory not found: {knowledge_dir}")
-        return docs
-
-    for txt_file in sorted(knowledge_dir.glob("*.txt")):
-        try:
-            content = txt_file.read_text(encoding="utf-8")
-            title = txt_file.stem
-            for line in content.split("\n")[:5]:
-                if line.startswith("TIÊU ĐỀ:"):
-                    title = line.replace("TIÊU ĐỀ:", "").strip()
-                    break
-            docs.append((txt_file.name, title, content))
-            logger.info(f"Loaded: {txt_file.name} ({len(content)} chars)")
-        except Exception as exc:
-            logger.error(f"Failed to load {txt_file}: {exc}")
-
-    return docs
+        return []
+    docs = (_load_document(txt_file) for txt_file in sorted(knowledge_dir.glob("*.txt")))
+    return [doc for doc in docs if doc is not None]
 
 
 def _split_qa_pairs(text: str) -> List[str]:
@@ -575,6 +605,22 @@ class KnowledgeAnswer:
         self.plain_question = _strip_diacritics(self.question.lower())
         self.plain_search = _strip_diacritics(search.lower())
 
+    def to_record(self) -> dict:
+        record = {slot: getattr(self, slot) for slot in self.__slots__}
+        record["tokens"] = sorted(self.tokens)
+        record["question_tokens"] = sorted(self.question_tokens)
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict) -> "KnowledgeAnswer":
+        """Rebuild from `to_record()` without re-tokenising."""
+        item = cls.__new__(cls)
+        for slot in cls.__slots__:
+            setattr(item, slot, record[slot])
+        item.tokens = set(item.tokens)
+        item.question_tokens = set(item.question_tokens)
+        return item
+
 
 def _extract_categories(content: str) -> str:
     for line in content.split("\n")[:8]:
@@ -606,8 +652,53 @@ def _build_qa_answers(docs: List[Tuple[str, str, str]]) -> List[KnowledgeAnswer]
     return qa_answers
 
 
-def _match_qa_answer(query: str, qa_answers: List[KnowledgeAnswer]) -> Optional[Tuple[float, KnowledgeAnswer]]:
-    if not QA_FAST_PATH_ENABLED or not qa_answers:
+class QaIndex:
+    """
+    Inverted indexes over the Q&A fast-path table so `_match_qa_answer` only
+    scores Q&A rows that can reach the threshold: token → row ids (all text /
+    question only) for the overlap scores, and character trigram → row ids over
+    `plain_search` for the substring checks (a row contains the query only if
+    it has every trigram of it). Row ids follow table order, which keeps the
+    linear scan's tie-breaking.
+    """
+
+    __slots__ = ("answers", "postings", "question_postings", "trigrams")
+
+    def __init__(self, answers: List[KnowledgeAnswer]):
+        self.answers = answers
+        postings: Dict[str, List[int]] = {}
+        question_postings: Dict[str, List[int]] = {}
+        trigrams: Dict[str, Set[int]] = {}
+        for i, item in enumerate(answers):
+            for token in item.tokens:
+                postings.setdefault(token, []).append(i)
+            for token in item.question_tokens:
+                question_postings.setdefault(token, []).append(i)
+            text = item.plain_search
+            for gram in {text[j:j + 3] for j in range(len(text) - 2)}:
+                trigrams.setdefault(gram, set()).add(i)
+        self.postings = postings
+        self.question_postings = question_postings
+        self.trigrams = {gram: frozenset(ids) for gram, ids in trigrams.items()}
+
+    def containing(self, plain_query: str) -> Set[int]:
+        """Row ids whose `plain_search` contains `plain_query` (len >= 3)."""
+        grams = sorted(
+            (self.trigrams.get(plain_query[j:j + 3], frozenset()) for j in range(len(plain_query) - 2)),
+            key=len,
+        )
+        if not grams or not grams[0]:
+            return set()
+        candidates = set(grams[0])
+        for ids in grams[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return candidates
+        return {i for i in candidates if plain_query in self.answers[i].plain_search}
+
+
+def _match_qa_answer(query: str, qa_index: QaIndex) -> Optional[Tuple[float, KnowledgeAnswer]]:
+    if not QA_FAST_PATH_ENABLED or not qa_index.answers:
         return None
 
     expanded = _expand_quick_menu_label(query)
@@ -616,24 +707,28 @@ def _match_qa_answer(query: str, qa_answers: List[KnowledgeAnswer]) -> Optional[
         return None
 
     plain_query = _strip_diacritics(query.strip().lower())
+    n_tokens = len(q_tokens)
+    # Rows sharing no token and not containing the query score 0 — never scanned
+    all_hits = Counter(chain.from_iterable(qa_index.postings.get(t, ()) for t in q_tokens))
+    question_hits = Counter(chain.from_iterable(qa_index.question_postings.get(t, ()) for t in q_tokens))
+    substring = qa_index.containing(plain_query) if len(plain_query) >= 8 else set()
+
     best: Optional[Tuple[float, KnowledgeAnswer]] = None
-    for item in qa_answers:
+    for i in sorted(substring.union(all_hits)):
+        item = qa_index.answers[i]
         if not item.tokens:
             continue
 
-        all_overlap = len(q_tokens & item.tokens) / max(1, len(q_tokens))
-        question_overlap = len(q_tokens & item.question_tokens) / max(1, len(q_tokens)) if item.question_tokens else 0.0
+        all_overlap = all_hits[i] / n_tokens
+        question_overlap = question_hits[i] / n_tokens
         score = max(all_overlap, question_overlap * 1.08)
 
-        if len(plain_query) >= 8:
-            if plain_query in item.plain_question:
-                score = max(score, 0.96)
-            elif plain_query in item.plain_search:
-                score = max(score, 0.78)
+        if i in substring:
+            score = max(score, 0.96 if plain_query in item.plain_question else 0.78)
 
         # Very short menu labels like "Quy định vận hành" should only fast-path
         # when most meaningful tokens are present.
-        if len(q_tokens) <= 4 and all_overlap < 0.75 and question_overlap < 0.75:
+        if n_tokens <= 4 and all_overlap < 0.75 and question_overlap < 0.75:
             continue
 
         if best is None or score > best[0]:
@@ -644,26 +739,44 @@ def _match_qa_answer(query: str, qa_answers: List[KnowledgeAnswer]) -> Optional[
     return None
 
 
-def _lexical_overlap_score(query_text: str, chunk: Chunk) -> float:
+class _LexicalQuery:
+    """Query side of `_lexical_overlap_score`, tokenised once per search."""
+
+    __slots__ = ("tokens", "meaningful", "plain")
+
+    def __init__(self, query_text: str, tokens: Optional[List[str]] = None):
+        self.tokens = set(tokens if tokens is not None else _tokenize_vi(query_text))
+        self.meaningful = [t for t in self.tokens if len(t) >= 4][:8]
+        self.plain = _strip_diacritics(query_text.lower())
+
+
+def _lexical_features(chunks: List[Chunk]) -> List[Tuple[FrozenSet[str], str]]:
+    """Per chunk: token set and diacritic-stripped haystack of "title\ntext", computed once."""
+    title_tokens: Dict[str, List[str]] = {}
+    features = []
+    for chunk in chunks:
+        if chunk.title not in title_tokens:
+            title_tokens[chunk.title] = _tokenize_vi(chunk.title)
+        # "title\ntext" tokenises as title tokens + text tokens (= Chunk.tokens)
+        doc_tokens = frozenset(title_tokens[chunk.title]).union(chunk.tokens)
+        features.append((doc_tokens, _strip_diacritics(f"{chunk.title}\n{chunk.text}".lower())))
+    return features
+
+
+def _lexical_overlap_score(query: _LexicalQuery, doc_tokens: FrozenSet[str], plain_doc: str) -> float:
     """Small deterministic precision boost when reranker is off."""
-    q_tokens = set(_tokenize_vi(query_text))
-    if not q_tokens:
+    if not query.tokens:
         return 0.0
-    haystack = f"{chunk.title}\n{chunk.text}"
-    doc_tokens = set(_tokenize_vi(haystack))
     if not doc_tokens:
         return 0.0
-    overlap = len(q_tokens & doc_tokens) / max(1, len(q_tokens))
+    overlap = len(query.tokens & doc_tokens) / max(1, len(query.tokens))
 
-    plain_query = _strip_diacritics(query_text.lower())
-    plain_doc = _strip_diacritics(haystack.lower())
     phrase_bonus = 0.0
-    meaningful = [t for t in q_tokens if len(t) >= 4]
-    for token in meaningful[:8]:
+    for token in query.meaningful:
         if token in plain_doc:
             phrase_bonus += 0.015
 
-    if len(plain_query) >= 8 and plain_query in plain_doc:
+    if len(query.plain) >= 8 and query.plain in plain_doc:
         phrase_bonus += 0.12
     return min(1.0, overlap + min(0.12, phrase_bonus))
 
@@ -672,39 +785,83 @@ def _lexical_overlap_score(query_text: str, chunk: Chunk) -> float:
 # Vector + BM25 hybrid index
 # ─────────────────────────────────────────────────────────────────────────────
 
+def _unit_rows(embeddings):
+    np = _np
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms = np.where(norms == 0, 1.0, norms)
+    return (embeddings / norms).astype("float32")
+
+
+def _top_indices(scores, k: int):
+    """Indices of the `k` largest `scores`, best first — argpartition, then sort only those k."""
+    np = _np
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
 class VectorIndex:
-    def __init__(self, chunks: List[Chunk], embeddings):
-        _ensure_imports()
+    def __init__(self, chunks: List[Chunk], embeddings, bm25=None, normalized: bool = False):
+        """
+        `normalized=True` takes float32 unit-norm `embeddings` as-is (e.g. the
+        memory-mapped index cache); `bm25` reuses a fitted SparseBM25 whose
+        doc ids follow `chunks`. With compressed FAISS storage
+        (RAG_VECTOR_STORAGE) `embeddings` may later be swapped for the mapped
+        cache copy or dropped — read rows through `vectors()`.
+        """
+        _ensure_index_imports()
         np = _np
         self.chunks = chunks
         self.n = len(chunks)
 
-        # Normalize embeddings for cosine similarity via inner product
-        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-        norms = np.where(norms == 0, 1.0, norms)
-        self.embeddings = (embeddings / norms).astype("float32")
+        # Normalized embeddings → cosine similarity via inner product
+        self.embeddings = embeddings if normalized else _unit_rows(embeddings)
 
-        # FAISS index
+        # FAISS index — flat / HNSW / IVF chosen by corpus size (RAG_FAISS_INDEX)
         if _faiss is not None:
-            dim = self.embeddings.shape[1]
-            self.index = _faiss.IndexFlatIP(dim)
-            self.index.add(self.embeddings)
+            self.ann = _AnnIndex(self.embeddings)
+            self.index = self.ann.index
             self.use_faiss = True
-            logger.info(f"FAISS index: {self.index.ntotal} vectors, dim={dim}")
+            logger.info(
+                f"FAISS {self.ann.kind} index: {self.index.ntotal} vectors, dim={self.ann.dim} "
+                f"({self.ann.build_ms}ms)"
+            )
         else:
+            self.ann = None
             self.index = None
             self.use_faiss = False
 
+        # Lexical precision pass: chunk token sets / stripped text never change
+        self.lexical = _lexical_features(chunks)
+
         # BM25 index
-        self.bm25 = None
-        if _BM25Okapi is not None:
-            tokenized = [_tokenize_vi(c.text) for c in chunks]
-            self.bm25 = _BM25Okapi(tokenized)
-            logger.info("BM25 index built alongside FAISS")
+        self.bm25 = bm25
+        if self.bm25 is None:
+            self.bm25 = SparseBM25([c.tokens for c in chunks])
+            logger.info(f"BM25 index built alongside FAISS: {len(self.bm25.vocab)} terms")
+
+    def vectors(self, rows):
+        """float32 unit-norm rows of `rows` (exact, or decoded from the FAISS codes once dropped)."""
+        if self.embeddings is not None:
+            return self.embeddings[rows]
+        return self.ann.vectors(rows)
+
+    def release_vectors(self, mapped=None) -> None:
+        """
+        Compressed storage: stop holding the float32 matrix the index was built
+        from. `mapped` (the index cache's memory-mapped copy) keeps exact cosine
+        re-scoring; without it candidates are re-scored from the codes.
+        """
+        if self.ann is None or not self.ann.compressed:
+            return
+        self.ann.drop_vectors(mapped)
+        self.embeddings = mapped
 
     def _semantic_ranks(self, query_embedding, k: int) -> dict:
         """Return {chunk_idx: rrf_contribution} from semantic search."""
-        _ensure_imports()
+        _ensure_index_imports()
         np = _np
         q = query_embedding.astype("float32")
         norm = np.linalg.norm(q)
@@ -714,34 +871,24 @@ class VectorIndex:
 
         ranks = {}
         if self.use_faiss:
-            scores, indices = self.index.search(q, k)
+            scores, indices = self.ann.search(q, k)
             for rank, (score, idx) in enumerate(zip(scores[0], indices[0])):
                 if idx >= 0 and float(score) >= MIN_FAISS_PREFILTER:
                     ranks[int(idx)] = 1.0 / (60 + rank)
         else:
             sims = (self.embeddings @ q.T).flatten()
-            top = np.argsort(sims)[::-1][:k]
+            top = _top_indices(sims, k)
             for rank, idx in enumerate(top):
                 if float(sims[idx]) >= MIN_FAISS_PREFILTER:
                     ranks[int(idx)] = 1.0 / (60 + rank)
         return ranks
 
-    def _bm25_ranks(self, query_text: str, k: int) -> dict:
-        """Return {chunk_idx: rrf_contribution} from BM25 keyword search."""
-        if self.bm25 is None:
+    def _bm25_ranks(self, tokens: List[str], k: int) -> dict:
+        """Return {chunk_idx: rrf_contribution} from BM25 keyword search over query `tokens`."""
+        if self.bm25 is None or not tokens:
             return {}
-        _ensure_imports()
-        np = _np
-        tokens = _tokenize_vi(query_text)
-        if not tokens:
-            return {}
-        scores = self.bm25.get_scores(tokens)
-        top = np.argsort(scores)[::-1][:k]
-        ranks = {}
-        for rank, idx in enumerate(top):
-            if float(scores[idx]) > 0:
-                ranks[int(idx)] = 1.0 / (60 + rank)
-        return ranks
+        top, _scores = self.bm25.top_k(tokens, k)
+        return {int(idx): 1.0 / (60 + rank) for rank, idx in enumerate(top)}
 
     def search_hybrid(
         self,
@@ -756,14 +903,15 @@ class VectorIndex:
         """
         k_inner = min(top_k * 3, self.n)
 
+        query_tokens = _tokenize_vi(query_text)
         semantic = self._semantic_ranks(query_embedding, k_inner)
-        bm25 = self._bm25_ranks(query_text, k_inner)
+        bm25 = self._bm25_ranks(query_tokens, k_inner)
 
         all_indices = set(semantic.keys()) | set(bm25.keys())
         if not all_indices:
             return []
 
-        _ensure_imports()
+        _ensure_index_imports()
         np = _np
         q = query_embedding.astype("float32")
         norm = np.linalg.norm(q)
@@ -771,11 +919,13 @@ class VectorIndex:
             q = q / norm
         q1 = q.flatten()
 
+        lexical_query = _LexicalQuery(query_text, query_tokens)
         rrf = {i: semantic.get(i, 0.0) + bm25.get(i, 0.0) for i in all_indices}
+        candidates = sorted(all_indices)
+        cosines = self.vectors(candidates) @ q1
         scored_indices: List[Tuple[float, int, float]] = []
-        for i in all_indices:
-            cos = float(np.dot(self.embeddings[i], q1))
-            lexical = _lexical_overlap_score(query_text, self.chunks[i])
+        for i, cos in zip(candidates, cosines.tolist()):
+            lexical = _lexical_overlap_score(lexical_query, *self.lexical[i])
             both_channels_bonus = 0.012 if i in semantic and i in bm25 else 0.0
             # RRF scores are small (~0.016 per channel). This blend keeps RRF as
             # the base while making high-cosine and exact-keyword candidates less
@@ -810,16 +960,24 @@ class VectorIndex:
         try:
             pairs = [[query, c[2].text] for c in candidates]
             scores = reranker.predict(pairs, show_progress_bar=False)
-            zipped = list(zip(scores, candidates))
-            zipped.sort(key=lambda x: -float(x[0]))
-            return [c for _, c in zipped[:top_k]]
+            return self.order_by_scores(candidates, scores, top_k)
         except Exception as exc:
             logger.warning("Reranker prediction failed (%s) — using hybrid order", exc)
             return candidates[:top_k]
 
+    @staticmethod
+    def order_by_scores(
+        candidates: List[Tuple[float, float, Chunk]],
+        scores,
+        top_k: int,
+    ) -> List[Tuple[float, float, Chunk]]:
+        zipped = list(zip(scores, candidates))
+        zipped.sort(key=lambda x: -float(x[0]))
+        return [c for _, c in zipped[:top_k]]
+
     def search(self, query_embedding, top_k: int = TOP_K) -> List[Tuple[float, Chunk]]:
         """Pure semantic search (kept for compatibility)."""
-        _ensure_imports()
+        _ensure_index_imports()
         np = _np
         q = query_embedding.astype("float32")
         norm = np.linalg.norm(q)
@@ -828,7 +986,7 @@ class VectorIndex:
         q = q.reshape(1, -1)
 
         if self.use_faiss:
-            scores, indices = self.index.search(q, top_k)
+            scores, indices = self.ann.search(q, top_k)
             return [
                 (float(score), self.chunks[idx])
                 for score, idx in zip(scores[0], indices[0])
@@ -836,7 +994,7 @@ class VectorIndex:
             ]
         else:
             sims = (self.embeddings @ q.T).flatten()
-            top = _np.argsort(sims)[::-1][:top_k]
+            top = _top_indices(sims, top_k)
             return [
                 (float(sims[i]), self.chunks[i])
                 for i in top
@@ -884,6 +1042,23 @@ def _enrich_query(query: str, history: Optional[List[dict]]) -> str:
     return " ".join(context_parts)
 
 
+def _history_insensitive(query: str, history: Optional[List[dict]]) -> bool:
+    """
+    No history, or a self-contained question (long enough, no follow-up
+    pronoun) that neither enrichment nor rewrite would resolve against it —
+    such answers may be shared through the answer cache.
+    """
+    if not history:
+        return True
+    return _enrich_query(query, history) == query and not _should_rewrite(query)
+
+
+def _cacheable_answer(result: dict) -> bool:
+    """Grounded LLM answers only — templates and rule-based replies are already cheap."""
+    mode = result.get("mode") or ""
+    return mode.startswith("llm_") and "no_context" not in mode and "rag_unavailable" not in mode
+
+
 def _keyword_hits(low: str, plain: str, keywords: tuple[str, ...]) -> bool:
     """Match either raw lowercase or diacritic-stripped (user often types without accents)."""
     for k in keywords:
@@ -1031,26 +1206,26 @@ async def _call_llm_claude(
     if not ANTHROPIC_API_KEY:
         return None
     try:
-        _ensure_imports()
-        async with _httpx.AsyncClient(timeout=timeout_s) as client:
-            resp = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": ANTHROPIC_API_KEY,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": model or LLM_MODEL_CLAUDE,
-                    "max_tokens": max_tokens,
-                    "temperature": temperature,
-                    "system": system_prompt,
-                    "messages": messages,
-                },
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            return data["content"][0]["text"].strip()
+        resp = await llm_http_pool.post(
+            "claude",
+            "https://api.anthropic.com/v1/messages",
+            headers={
+                "x-api-key": ANTHROPIC_API_KEY,
+                "anthropic-version": "2023-06-01",
+                "content-type": "application/json",
+            },
+            json={
+                "model": model or LLM_MODEL_CLAUDE,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "system": system_prompt,
+                "messages": messages,
+            },
+            timeout_s=timeout_s,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        return data["content"][0]["text"].strip()
     except Exception as exc:
         logger.warning(f"Claude API failed: {exc}")
         return None
@@ -1068,28 +1243,70 @@ async def _call_llm_groq(
     if not GROQ_API_KEY:
         return None
     try:
-        _ensure_imports()
-        async with _httpx.AsyncClient(timeout=timeout_s) as client:
-            resp = await client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": model or LLM_MODEL_GROQ,
-                    "messages": [{"role": "system", "content": system_prompt}] + messages,
-                    "max_tokens": max_tokens,
-                    "temperature": temperature,
-                },
-            )
-            resp.raise_for_status()
-            return resp.json()["choices"][0]["message"]["content"].strip()
+        resp = await llm_http_pool.post(
+            "groq",
+            "https://api.groq.com/openai/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {GROQ_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": model or LLM_MODEL_GROQ,
+                "messages": [{"role": "system", "content": system_prompt}] + messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            },
+            timeout_s=timeout_s,
+        )
+        resp.raise_for_status()
+        return resp.json()["choices"][0]["message"]["content"].strip()
     except Exception as exc:
         logger.warning(f"Groq API failed: {exc}")
         return None
 
 
+def _gemini_payload(
+    messages: List[dict],
+    *,
+    system_prompt: str,
+    max_tokens: int,
+    temperature: float,
+    model_name: str,
+) -> Optional[dict]:
+    """generateContent / streamGenerateContent body, or None without user/assistant turns."""
+    contents = []
+    for m in messages:
+        role = m.get("role", "user")
+        text = m.get("content", "")
+        if role == "user":
+            contents.append({"role": "user", "parts": [{"text": text}]})
+        elif role == "assistant":
+            contents.append({"role": "model", "parts": [{"text": text}]})
+    if not contents:
+        return None
+
+    gen_config: dict = {
+        "maxOutputTokens": max_tokens,
+        "temperature": temperature,
+    }
+    # Disable thinking for Gemini 2.5 models — RAG context already does the reasoning;
+    # thinking adds 15-40s latency with no benefit for retrieval-grounded QA.
+    if "2.5" in model_name:
+        gen_config["thinkingConfig"] = {"thinkingBudget": 0}
+
+    return {
+        "systemInstruction": {"parts": [{"text": system_prompt}]},
+        "contents": contents,
+        "generationConfig": gen_config,
+        "safetySettings": [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
+        ],
+    }
+
+
 async def _call_llm_gemini(
     messages: List[dict],
     *,
@@ -1103,52 +1320,30 @@ async def _call_llm_gemini(
     if not GEMINI_API_KEY:
         return None
     try:
-        _ensure_imports()
-        contents = []
-        for m in messages:
-            role = m.get("role", "user")
-            text = m.get("content", "")
-            if role == "user":
-                contents.append({"role": "user", "parts": [{"text": text}]})
-            elif role == "assistant":
-                contents.append({"role": "model", "parts": [{"text": text}]})
-        if not contents:
-            return None
-
         model_name = model or LLM_MODEL_GEMINI
+        payload = _gemini_payload(
+            messages,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model_name=model_name,
+        )
+        if payload is None:
+            return None
         url = (
             f"https://generativelanguage.googleapis.com/v1beta/models/"
             f"{model_name}:generateContent"
         )
-        gen_config: dict = {
-            "maxOutputTokens": max_tokens,
-            "temperature": temperature,
-        }
-        # Disable thinking for Gemini 2.5 models — RAG context already does the reasoning;
-        # thinking adds 15-40s latency with no benefit for retrieval-grounded QA.
-        if "2.5" in model_name:
-            gen_config["thinkingConfig"] = {"thinkingBudget": 0}
-
-        payload = {
-            "systemInstruction": {"parts": [{"text": system_prompt}]},
-            "contents": contents,
-            "generationConfig": gen_config,
-            "safetySettings": [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
-            ],
-        }
-        async with _httpx.AsyncClient(timeout=timeout_s) as client:
-            resp = await client.post(
-                url,
-                params={"key": GEMINI_API_KEY},
-                json=payload,
-                headers={"Content-Type": "application/json"},
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        resp = await llm_http_pool.post(
+            "gemini",
+            url,
+            params={"key": GEMINI_API_KEY},
+            json=payload,
+            headers={"Content-Type": "application/json"},
+            timeout_s=timeout_s,
+        )
+        resp.raise_for_status()
+        data = resp.json()
 
         cands = data.get("candidates") or []
         if not cands:
@@ -1174,23 +1369,23 @@ async def _call_llm_openai(
     if not OPENAI_API_KEY:
         return None
     try:
-        _ensure_imports()
-        async with _httpx.AsyncClient(timeout=timeout_s) as client:
-            resp = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": model or LLM_MODEL_OPENAI,
-                    "messages": [{"role": "system", "content": system_prompt}] + messages,
-                    "max_tokens": max_tokens,
-                    "temperature": temperature,
-                },
-            )
-            resp.raise_for_status()
-            return resp.json()["choices"][0]["message"]["content"].strip()
+        resp = await llm_http_pool.post(
+            "openai",
+            "https://api.openai.com/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": model or LLM_MODEL_OPENAI,
+                "messages": [{"role": "system", "content": system_prompt}] + messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            },
+            timeout_s=timeout_s,
+        )
+        resp.raise_for_status()
+        return resp.json()["choices"][0]["message"]["content"].strip()
     except Exception as exc:
         logger.warning(f"OpenAI API failed: {exc}")
         return None
@@ -1205,6 +1400,39 @@ async def _call_llm_provider(
     temperature: float = LLM_TEMPERATURE,
     timeout_s: float = LLM_TIMEOUT_S,
     rewrite: bool = False,
+) -> Optional[str]:
+    """
+    Provider call behind its circuit breaker: an open breaker returns None
+    without touching the network. Answer calls use the adaptive timeout
+    (capped at `timeout_s`); rewrites keep their own short budget and don't
+    count towards the breaker.
+    """
+    if not rewrite:
+        timeout_s = llm_breakers.timeout_s(provider, timeout_s)
+    return await llm_breakers.call(
+        provider,
+        lambda: _request_llm_provider(
+            provider,
+            messages,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout_s=timeout_s,
+            rewrite=rewrite,
+        ),
+        record=not rewrite,
+    )
+
+
+async def _request_llm_provider(
+    provider: str,
+    messages: List[dict],
+    *,
+    system_prompt: str,
+    max_tokens: int,
+    temperature: float,
+    timeout_s: float,
+    rewrite: bool,
 ) -> Optional[str]:
     model = _provider_model(provider, rewrite=rewrite)
     if provider == "claude":
@@ -1246,6 +1474,167 @@ async def _call_llm_provider(
     return None
 
 
+class ChatStream:
+    """
+    Event sink for `RagService.chat_stream`: retrieval metadata, answer deltas
+    and resets (a provider failed mid-answer — the client drops the partial
+    text). Metadata is held back until generation actually starts, so template
+    and rule-based answers go out as the single final event.
+    """
+
+    def __init__(self) -> None:
+        self.queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue()
+        self.started = time.perf_counter()
+        self.first_token_ms: Optional[int] = None
+        self._meta: dict = {"sources": [], "retrieval_count": 0, "score_max": 0.0, "mode": "no_context"}
+        self._meta_sent = False
+        self._streamed = False
+
+    def set_meta(self, meta: dict) -> None:
+        self._meta = meta
+
+    def open(self) -> None:
+        if not self._meta_sent:
+            self._meta_sent = True
+            self.queue.put_nowait({"event": "meta", "data": self._meta})
+
+    def delta(self, text: str) -> None:
+        if self.first_token_ms is None:
+            self.first_token_ms = int((time.perf_counter() - self.started) * 1000)
+        self._streamed = True
+        self.queue.put_nowait({"event": "delta", "data": {"text": text}})
+
+    def reset(self) -> None:
+        if self._streamed:
+            self._streamed = False
+            self.queue.put_nowait({"event": "reset", "data": {}})
+
+
+async def _sse_json(resp):
+    """JSON payloads of the `data:` lines of a provider's SSE response."""
+    async for line in resp.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
+
+
+def _stream_delta_text(provider: str, event: dict) -> Optional[str]:
+    if provider == "claude":
+        if event.get("type") == "content_block_delta":
+            return (event.get("delta") or {}).get("text")
+        return None
+    if provider == "gemini":
+        cands = event.get("candidates") or []
+        if not cands:
+            return None
+        return "".join(p.get("text", "") for p in cands[0].get("content", {}).get("parts") or [])
+    choices = event.get("choices") or []
+    if not choices:
+        return None
+    return (choices[0].get("delta") or {}).get("content")
+
+
+def _stream_request(provider: str, messages: List[dict], model: str) -> Optional[Tuple[str, dict]]:
+    """(url, httpx kwargs) of the provider's streaming endpoint, or None when not configured."""
+    system_prompt, max_tokens, temperature = SYSTEM_PROMPT, LLM_MAX_TOKENS, LLM_TEMPERATURE
+    if provider == "claude" and ANTHROPIC_API_KEY:
+        return "https://api.anthropic.com/v1/messages", {
+            "headers": {
+                "x-api-key": ANTHROPIC_API_KEY,
+                "anthropic-version": "2023-06-01",
+                "content-type": "application/json",
+            },
+            "json": {
+                "model": model,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "system": system_prompt,
+                "messages": messages,
+                "stream": True,
+            },
+        }
+    if provider == "gemini" and GEMINI_API_KEY:
+        payload = _gemini_payload(
+            messages,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model_name=model,
+        )
+        if payload is None:
+            return None
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent"
+        return url, {
+            "params": {"key": GEMINI_API_KEY, "alt": "sse"},
+            "headers": {"Content-Type": "application/json"},
+            "json": payload,
+        }
+    openai_style = {
+        "openai": ("https://api.openai.com/v1/chat/completions", OPENAI_API_KEY),
+        "groq": ("https://api.groq.com/openai/v1/chat/completions", GROQ_API_KEY),
+    }
+    if provider in openai_style and openai_style[provider][1]:
+        url, key = openai_style[provider]
+        return url, {
+            "headers": {"Authorization": f"Bearer {key}", "Content-Type": "application/json"},
+            "json": {
+                "model": model,
+                "messages": [{"role": "system", "content": system_prompt}] + messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "stream": True,
+            },
+        }
+    return None
+
+
+async def _request_llm_stream(
+    provider: str,
+    messages: List[dict],
+    stream: ChatStream,
+    *,
+    timeout_s: float,
+) -> Optional[str]:
+    request = _stream_request(provider, messages, _provider_model(provider))
+    if request is None:
+        return None
+    url, kwargs = request
+    parts: List[str] = []
+    try:
+        async with llm_http_pool.stream(provider, url, timeout_s=timeout_s, **kwargs) as resp:
+            resp.raise_for_status()
+            async for event in _sse_json(resp):
+                text = _stream_delta_text(provider, event)
+                if text:
+                    parts.append(text)
+                    stream.delta(text)
+    except Exception as exc:
+        logger.warning(f"{provider} streaming failed: {exc}")
+        return None
+    return "".join(parts).strip() or None
+
+
+async def _stream_llm_provider(
+    provider: str,
+    messages: List[dict],
+    stream: ChatStream,
+    *,
+    timeout_s: float = LLM_TIMEOUT_S,
+) -> Optional[str]:
+    """Streamed answer call behind the provider's breaker; `timeout_s` bounds each read."""
+    timeout_s = llm_breakers.timeout_s(provider, timeout_s)
+    return await llm_breakers.call(
+        provider,
+        lambda: _request_llm_stream(provider, messages, stream, timeout_s=timeout_s),
+    )
+
+
 def _template_answer(query: str, retrieved: List[Tuple[float, Chunk]]) -> str:
     """Last-resort answer when all LLMs fail — friendly Mia-voice excerpt.
 
@@ -1356,11 +1745,10 @@ async def _maybe_rewrite_query(
         return None, None, None
     if not _should_rewrite(query):
         return None, None, None
-    providers = _configured_rewrite_provider_order()
+    providers = llm_breakers.available(_configured_rewrite_provider_order())
     if not providers:
         return None, None, None
     try:
-        _ensure_imports()
         # Build a compact history context
         recent: List[str] = []
         if history:
@@ -1416,7 +1804,18 @@ async def _generate_answer(
     history: Optional[List[dict]] = None,
     *,
     allow_template_fallback: bool = True,
+    trace: Optional[dict] = None,
+    stream: Optional[ChatStream] = None,
 ) -> Tuple[Optional[str], str, str, Optional[str]]:
+    """
+    LLM answer over the configured provider order minus open circuits, hedged
+    by `llm_hedger` (a slow primary gets raced by the next provider). `trace` receives the
+    launched providers, winner, hedged flag and wasted-call count.
+
+    With `stream`, tokens are pushed to it as they arrive instead. Streamed calls
+    are not hedged (sent tokens cannot be taken back): providers are tried in
+    order and a provider failing mid-answer is followed by a reset event.
+    """
     context = _format_context(retrieved)[:MAX_CONTEXT_CHARS] if retrieved else ""
 
     llm_messages: List[dict] = []
@@ -1443,10 +1842,27 @@ async def _generate_answer(
         )
     llm_messages.append({"role": "user", "content": user_content})
 
-    for provider in _configured_llm_provider_order():
-        answer = await _call_llm_provider(provider, llm_messages)
-        if answer:
-            return answer, f"llm_{provider}", provider, _provider_model(provider)
+    providers = llm_breakers.available(_configured_llm_provider_order())
+    if stream is not None:
+        answer, provider, race = None, None, {"providers": [], "winner": None, "hedged": False, "wasted": 0}
+        if providers:
+            stream.open()
+        for name in providers:
+            race["providers"].append(name)
+            answer = await _stream_llm_provider(name, llm_messages, stream)
+            if answer:
+                provider = race["winner"] = name
+                break
+            stream.reset()
+    else:
+        answer, provider, race = await llm_hedger.call(
+            providers,
+            lambda name: _call_llm_provider(name, llm_messages),
+        )
+    if trace is not None:
+        trace.update(race)
+    if answer:
+        return answer, f"llm_{provider}", provider, _provider_model(provider)
 
     if allow_template_fallback:
         return _template_answer(query, retrieved), "retrieval", "template", None
@@ -1458,6 +1874,112 @@ async def _generate_answer(
 # Main RAG Service
 # ─────────────────────────────────────────────────────────────────────────────
 
+def _torch_param_bytes(model) -> int:
+    """Sum of parameter + buffer bytes for a SentenceTransformer / CrossEncoder (weight file bytes for ONNX)."""
+    if hasattr(model, "weight_bytes"):
+        return model.weight_bytes
+    module = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    return int(sum(t.numel() * t.element_size() for t in tensors))
+
+
+def _configure_torch_threads() -> None:
+    """Cap torch intra-op threads so chat compute leaves cores for /api/predict."""
+    try:
+        import torch
+    except ImportError:
+        return
+    threads = rag_torch_threads()
+    torch.set_num_threads(threads)
+    logger.info(f"torch intra-op threads: {threads}")
+
+
+def _model_backend(model) -> Optional[str]:
+    return getattr(model, "backend", "torch") if model is not None else None
+
+
+def _load_embedder():
+    """Bi-encoder: the ONNX Runtime export when RAG_INFERENCE_BACKEND=onnx and present, else PyTorch."""
+    if INFERENCE_BACKEND == "onnx":
+        model = load_onnx_encoder(EMBEDDING_MODEL_NAME, threads=rag_torch_threads())
+        if model is not None:
+            return model
+    _ensure_imports()
+    _configure_torch_threads()
+    logger.info(f"Loading embedding model: {EMBEDDING_MODEL_NAME}")
+    return _SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+def _query_encoder(model):
+    """Batch fn for the query-embedding MicroBatcher: one padded encode for all texts."""
+    def encode(texts: List[str]):
+        return model.encode(texts, batch_size=len(texts), show_progress_bar=False, normalize_embeddings=True)
+    return encode
+
+
+def _pair_scorer(reranker):
+    """Batch fn for the reranker MicroBatcher: (query, passage) pairs of many requests at once."""
+    def score(pairs: List[List[str]]):
+        return reranker.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+    return score
+
+
+def _search(index: "VectorIndex", query_vector, enriched_query: str, pool_k: int, submitted: float):
+    """Hybrid search on `rag_executor`; returns (hits, ms spent queued for a worker)."""
+    queued_ms = int((time.perf_counter() - submitted) * 1000)
+    return index.search_hybrid(query_vector, enriched_query, top_k=pool_k), queued_ms
+
+
+async def _rerank(batcher: MicroBatcher, query: str, candidates, top_k: int):
+    """Cross-encoder order via the shared batcher; hybrid order if it fails or is saturated."""
+    try:
+        scores = await batcher.run([[query, c[2].text] for c in candidates])
+    except Exception as exc:
+        logger.warning("Reranker prediction failed (%s) — using hybrid order", exc)
+        return candidates[:top_k]
+    return VectorIndex.order_by_scores(candidates, scores, top_k)
+
+
+def _stream_meta(raw_hits: list, rewrite_used: Optional[str], reranker_active: bool) -> dict:
+    """First SSE event: what retrieval found, with the mode branch `_chat` will take."""
+    score_max = max((h[1] for h in raw_hits), default=0.0)
+    if not raw_hits or score_max < RAG_COSINE_ABSENT:
+        mode = "no_context"
+    elif score_max < RAG_COSINE_LLM:
+        mode = "low_confidence"
+    else:
+        mode = "rag"
+    return {
+        "sources": list(dict.fromkeys(h[2].title for h in raw_hits)) if mode != "no_context" else [],
+        "retrieval_count": len(raw_hits),
+        "score_max": round(float(score_max), 4),
+        "mode": mode,
+        "reranker_active": reranker_active,
+        "rewrite_query": rewrite_used,
+    }
+
+
+async def _timed(timings: dict, stage: str, awaitable):
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = timings.get(stage, 0) + int((time.perf_counter() - start) * 1000)
+
+
+def _index_cache_key(docs: List[Tuple[str, str, str]], backend: str = "torch") -> str:
+    params = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "e5_prefix": _USE_E5_PREFIX}
+    if backend != "torch":
+        params["embedding_backend"] = backend  # int8 ONNX vectors differ slightly from PyTorch ones
+    return cache_key(docs, EMBEDDING_MODEL_NAME, params)
+
+
+_cache_root = cache_root(RAG_CACHE_DIR)
+_index_cache: Optional[RagIndexCache] = RagIndexCache(_cache_root) if _cache_root is not None else None
+
+
 class RagService:
     def __init__(self):
         self._ready = False
@@ -1467,14 +1989,40 @@ class RagService:
         self._index: Optional[VectorIndex] = None
         self._chunks: List[Chunk] = []
         self._qa_answers: List[KnowledgeAnswer] = []
+        self._qa_index = QaIndex([])
         self._init_error: Optional[str] = None
+        self._index_key: Optional[str] = None
+        self._index_source: Optional[str] = None  # "cache" | "built" | "patched"
+        # Per-file change detection: name → (filename, title, content) / (mtime_ns, size, sha256)
+        self._docs: Dict[str, Tuple[str, str, str]] = {}
+        self._file_state: Dict[str, Tuple[int, int, str]] = {}
         self._rag_lock = threading.RLock()
+        self._reload_lock = threading.Lock()  # one re-index at a time (encoding runs outside _rag_lock)
+        self._answer_cache = SemanticAnswerCache(
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl_s=ANSWER_CACHE_TTL_S,
+            threshold=ANSWER_CACHE_THRESHOLD,
+        )
+        self._embed_cache = EmbeddingLRU(EMBEDDING_MODEL_NAME, int(EMBED_CACHE_MB * 1024 * 1024))
+        # Cross-request micro-batchers, created on first use for the loaded models
+        self._embed_batcher: Optional[MicroBatcher] = None
+        self._rerank_batcher: Optional[MicroBatcher] = None
 
     def _maybe_load_reranker(self) -> None:
         """Lazy-load BGE cross-encoder. Failures degrade gracefully to hybrid-only."""
         if self._reranker_load_attempted or not RERANKER_ENABLED:
             return
         self._reranker_load_attempted = True
+        if INFERENCE_BACKEND == "onnx":
+            self._reranker = load_onnx_cross_encoder(RERANKER_MODEL, threads=rag_torch_threads())
+            if self._reranker is not None:
+                return
+            try:
+                _ensure_imports()
+            except ImportError as exc:
+                logger.warning(f"sentence-transformers not available ({exc}) — reranker disabled")
+                return
+            _configure_torch_threads()
         if _CrossEncoder is None:
             logger.info("CrossEncoder class not available — reranker disabled")
             return
@@ -1487,29 +2035,213 @@ class RagService:
             logger.warning(f"Reranker load failed ({exc}) — hybrid order only")
             self._reranker = None
 
+    def _batchers(self) -> Tuple[Optional[MicroBatcher], Optional[MicroBatcher]]:
+        """(query embedding, reranker) batchers for the loaded models — None if not loaded."""
+        with self._rag_lock:
+            if self._embed_batcher is None and self._model is not None:
+                self._embed_batcher = MicroBatcher(
+                    "rag-embed",
+                    _query_encoder(self._model),
+                    max_batch=settings.AI_RAG_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.AI_RAG_BATCH_MAX_WAIT_MS,
+                    max_queue=settings.AI_RAG_MAX_QUEUE,
+                )
+            if self._rerank_batcher is None and self._reranker is not None:
+                self._rerank_batcher = MicroBatcher(
+                    "rag-rerank",
+                    _pair_scorer(self._reranker),
+                    max_batch=settings.AI_RAG_RERANK_MAX_PAIRS,
+                    max_wait_ms=settings.AI_RAG_BATCH_MAX_WAIT_MS,
+                    max_queue=settings.AI_RAG_MAX_QUEUE,
+                )
+            return self._embed_batcher, self._rerank_batcher
+
+    async def _embed_query_text(self, batcher: MicroBatcher, text: str, timings: Dict[str, int]):
+        """Query vector for an embed text: exact-match cache, else the micro-batched encoder."""
+        vector = self._embed_cache.get(text)
+        if vector is None:
+            vector = self._embed_cache.put(text, (await _timed(timings, "embed", batcher.run([text])))[0])
+        return vector
+
+    def embedding_cache_snapshot(self) -> dict:
+        return self._embed_cache.snapshot()
+
+    def answer_cache_snapshot(self) -> dict:
+        return {"enabled": ANSWER_CACHE_ENABLED, **self._answer_cache.snapshot()}
+
+    def batcher_snapshot(self) -> dict:
+        with self._rag_lock:
+            batchers = (self._embed_batcher, self._rerank_batcher)
+        return {b.name: b.snapshot() for b in batchers if b is not None}
+
+    def _scan_knowledge(self):
+        """
+        Stat KNOWLEDGE_DIR and re-read only files whose (mtime, size) moved; a
+        content hash decides whether a touched file actually changed.
+        Returns (docs_by_name, file_state, {"added", "modified", "deleted"}).
+        """
+        docs: Dict[str, Tuple[str, str, str]] = {}
+        state: Dict[str, Tuple[int, int, str]] = {}
+        changes: Dict[str, List[str]] = {"added": [], "modified": [], "deleted": []}
+        if not KNOWLEDGE_DIR.exists():
+            logger.warning(f"Knowledge directory not found: {KNOWLEDGE_DIR}")
+            paths = []
+        else:
+            paths = sorted(KNOWLEDGE_DIR.glob("*.txt"))
+
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            previous = self._file_state.get(path.name)
+            if previous is not None and previous[:2] == (stat.st_mtime_ns, stat.st_size) and path.name in self._docs:
+                docs[path.name] = self._docs[path.name]
+                state[path.name] = previous
+                continue
+            doc = _load_document(path)
+            if doc is None:
+                continue
+            sha = hashlib.sha256(doc[2].encode("utf-8")).hexdigest()
+            docs[path.name] = doc
+            state[path.name] = (stat.st_mtime_ns, stat.st_size, sha)
+            if previous is None:
+                changes["added"].append(path.name)
+            elif previous[2] != sha:
+                changes["modified"].append(path.name)
+
+        changes["deleted"] = sorted(set(self._file_state) - set(state))
+        return docs, state, changes
+
+    def _build_knowledge(self, docs: List[Tuple[str, str, str]], model, reuse: Optional[Set[str]] = None) -> dict:
+        """
+        Chunks, Q&A table and VectorIndex for `docs`. Mapped from the index cache
+        when the content/model key matches; otherwise only files outside `reuse`
+        (names whose content is unchanged since the current index) are chunked
+        and encoded with `model`, the rest keep their current vectors / Q&A rows.
+        Returns {"chunks", "qa_answers", "index", "key", "source", "reembedded"}.
+        """
+        _ensure_index_imports()
+        np = _np
+        key = _index_cache_key(docs, _model_backend(model))
+        cached = _index_cache.load(key) if _index_cache is not None else None
+        if cached is not None:
+            chunks = [Chunk(**record) for record in cached["chunks"]]
+            qa_answers = [KnowledgeAnswer.from_record(record) for record in cached["qa"]]
+            index = None
+            if chunks:
+                index = VectorIndex(chunks, cached["embeddings"], bm25=cached["bm25"], normalized=True)
+            logger.info(f"RAG index cache hit {key}: {len(chunks)} chunks, {len(qa_answers)} Q&A")
+            return {
+                "chunks": chunks,
+                "qa_answers": qa_answers,
+                "index": index,
+                "key": key,
+                "source": "cache",
+                "reembedded": 0,
+            }
+
+        reuse = reuse or set()
+        with self._rag_lock:
+            old_index = self._index
+            old_qa = list(self._qa_answers)
+        if old_index is None:
+            reuse = set()
+
+        fresh_docs = [doc for doc in docs if doc[0] not in reuse]
+        fresh_chunks = _build_chunks(fresh_docs) if fresh_docs else []
+        fresh_qa = _build_qa_answers(fresh_docs) if fresh_docs else []
+        fresh_vectors = None
+        if fresh_chunks:
+            logger.info(f"Encoding {len(fresh_chunks)} chunks...")
+            texts = [_embed_passage(c.text) for c in fresh_chunks]
+            fresh_vectors = _unit_rows(model.encode(
+                texts, batch_size=32, show_progress_bar=False, normalize_embeddings=True
+            ))
+
+        # Reassemble in document order so the result matches a full rebuild
+        rows: Dict[Tuple[bool, str], List[int]] = {}
+        for i, chunk in enumerate(old_index.chunks if reuse else []):
+            rows.setdefault((True, chunk.source), []).append(i)
+        for i, chunk in enumerate(fresh_chunks):
+            rows.setdefault((False, chunk.source), []).append(i)
+        qa_by_source: Dict[Tuple[bool, str], List[KnowledgeAnswer]] = {}
+        for item in old_qa if reuse else []:
+            qa_by_source.setdefault((True, item.source), []).append(item)
+        for item in fresh_qa:
+            qa_by_source.setdefault((False, item.source), []).append(item)
+
+        chunks, qa_answers, pieces, bm25_order = [], [], [], []
+        n_kept = old_index.n if reuse else 0
+        for name, _title, _content in docs:
+            group = (name in reuse, name)
+            picked = rows.get(group, [])
+            if picked:
+                chunks.extend((old_index.chunks if group[0] else fresh_chunks)[i] for i in picked)
+                pieces.append(old_index.vectors(picked) if group[0] else fresh_vectors[picked])
+                # BM25 doc ids below: retained old rows first, then the fresh chunks
+                bm25_order.extend(picked if group[0] else (n_kept + i for i in picked))
+            qa_answers.extend(qa_by_source.get(group, []))
+
+        index = None
+        if chunks:
+            bm25 = None
+            if reuse and old_index.bm25 is not None:
+                # Term statistics of unchanged chunks are kept; only fresh chunks are counted
+                kept = old_index.bm25.take(range(old_index.n))
+                kept.add([c.tokens for c in fresh_chunks])
+                bm25 = kept.take(bm25_order)
+            index = VectorIndex(chunks, np.vstack(pieces), bm25=bm25, normalized=True)
+
+        if _index_cache is not None:
+            try:
+                _index_cache.save(
+                    key,
+                    embeddings=index.embeddings if index is not None else np.zeros((0, 0), dtype="float32"),
+                    chunks=[c.to_record() for c in chunks],
+                    qa=[item.to_record() for item in qa_answers],
+                    bm25=index.bm25 if index is not None else None,
+                    meta={"embedding_model": EMBEDDING_MODEL_NAME, "documents": len(docs)},
+                )
+            except Exception as exc:
+                logger.warning(f"RAG index cache not written ({exc})")
+        if index is not None:
+            # Compressed FAISS storage re-scores from the mapped cache copy instead of a resident matrix
+            index.release_vectors(_index_cache.map_embeddings(key) if _index_cache is not None else None)
+        return {
+            "chunks": chunks,
+            "qa_answers": qa_answers,
+            "index": index,
+            "key": key,
+            "source": "patched" if reuse else "built",
+            "reembedded": len(fresh_chunks),
+        }
+
+    def _swap_knowledge(self, built: dict, docs: Dict[str, Tuple[str, str, str]], state: dict) -> None:
+        with self._rag_lock:
+            self._chunks = built["chunks"]
+            self._qa_answers = built["qa_answers"]
+            self._qa_index = QaIndex(built["qa_answers"])
+            self._index = built["index"]
+            self._index_key = built["key"]
+            self._index_source = built["source"]
+            self._answer_cache.set_version(built["key"])
+            self._docs = docs
+            self._file_state = state
+            self._ready = True
+
     def _initialize_locked(self) -> bool:
         """Assume `_rag_lock` is held. First-time load of embedder + index."""
         try:
-            _ensure_imports()
+            _ensure_index_imports()
             t0 = time.time()
 
-            logger.info(f"Loading embedding model: {EMBEDDING_MODEL_NAME}")
-            self._model = _SentenceTransformer(EMBEDDING_MODEL_NAME)
+            self._model = _load_embedder()
 
-            docs = _load_documents(KNOWLEDGE_DIR)
+            docs, state, _ = self._scan_knowledge()
             if not docs:
                 logger.warning("No knowledge documents found")
-
-            self._qa_answers = _build_qa_answers(docs)
-            self._chunks = _build_chunks(docs)
-
-            if self._chunks:
-                logger.info(f"Encoding {len(self._chunks)} chunks...")
-                texts = [_embed_passage(c.text) for c in self._chunks]
-                embeddings = self._model.encode(
-                    texts, batch_size=32, show_progress_bar=False, normalize_embeddings=True
-                )
-                self._index = VectorIndex(self._chunks, embeddings)
+            self._swap_knowledge(self._build_knowledge(list(docs.values()), self._model), docs, state)
 
             # Reranker may call Hugging Face; load in a daemon thread so init does not
             # block on long retries / OOM spike while hybrid RAG is already usable.
@@ -1537,12 +2269,15 @@ class RagService:
 
     def reload_knowledge_from_disk(self) -> dict:
         """
-        Rebuild FAISS/BM25 from KNOWLEDGE_DIR (.txt). Embedding model stays in memory.
-        Safe to call from a background thread. Chat requests may use the previous index
-        until the swap completes.
+        Re-index KNOWLEDGE_DIR (.txt) incrementally: only added / modified files are
+        re-chunked and re-embedded, deleted files are dropped, and the Q&A table,
+        BM25 statistics and FAISS index are reassembled from the retained rows.
+        No-op when nothing changed. Embedding model stays in memory. Safe to call
+        from a background thread; chat requests use the previous index until the swap.
         """
+        t0 = time.perf_counter()
         try:
-            _ensure_imports()
+            _ensure_index_imports()
             with self._rag_lock:
                 if self._model is None:
                     if self._ready:
@@ -1553,35 +2288,47 @@ class RagService:
                         "chunks": len(self._chunks),
                         "qa_answers": len(self._qa_answers),
                         "action": "full_init",
+                        "elapsed_ms": int((time.perf_counter() - t0) * 1000),
                         "error": self._init_error,
                     }
 
-            docs = _load_documents(KNOWLEDGE_DIR)
-            chunks = _build_chunks(docs)
-            qa_answers = _build_qa_answers(docs)
-            if not chunks:
-                with self._rag_lock:
-                    self._chunks = []
-                    self._index = None
-                    self._qa_answers = qa_answers
-                    self._ready = True
-                return {"ok": True, "chunks": 0, "qa_answers": len(qa_answers), "action": "reload"}
-
-            model = self._model
-            texts = [_embed_passage(c.text) for c in chunks]
-            embeddings = model.encode(
-                texts, batch_size=32, show_progress_bar=False, normalize_embeddings=True
-            )
-            new_index = VectorIndex(chunks, embeddings)
+            with self._reload_lock:
+                docs, state, changes = self._scan_knowledge()
+                files_changed = sum(len(names) for names in changes.values())
+                if files_changed == 0:
+                    with self._rag_lock:
+                        self._docs = docs
+                        self._file_state = state
+                    return {
+                        "ok": True,
+                        "chunks": len(self._chunks),
+                        "qa_answers": len(self._qa_answers),
+                        "action": "unchanged",
+                        "files_changed": 0,
+                        "chunks_reembedded": 0,
+                        "elapsed_ms": int((time.perf_counter() - t0) * 1000),
+                    }
 
-            with self._rag_lock:
-                self._chunks = chunks
-                self._index = new_index
-                self._qa_answers = qa_answers
-                self._ready = True
+                unchanged = set(docs) - set(changes["added"]) - set(changes["modified"])
+                built = self._build_knowledge(list(docs.values()), self._model, reuse=unchanged)
+                self._swap_knowledge(built, docs, state)
 
-            logger.info("RAG knowledge reloaded: %s chunks", len(chunks))
-            return {"ok": True, "chunks": len(chunks), "qa_answers": len(qa_answers), "action": "reload"}
+            elapsed_ms = int((time.perf_counter() - t0) * 1000)
+            logger.info(
+                "RAG knowledge reloaded: %s chunks (%s, %s files changed, %s re-embedded) in %sms",
+                len(built["chunks"]), built["source"], files_changed, built["reembedded"], elapsed_ms,
+            )
+            return {
+                "ok": True,
+                "chunks": len(built["chunks"]),
+                "qa_answers": len(built["qa_answers"]),
+                "action": "reload",
+                "index_source": built["source"],
+                "files_changed": files_changed,
+                "files": changes,
+                "chunks_reembedded": built["reembedded"],
+                "elapsed_ms": elapsed_ms,
+            }
 
         except Exception as exc:
             logger.error(f"RAG reload failed: {exc}", exc_info=True)
@@ -1591,6 +2338,27 @@ class RagService:
     def is_ready(self) -> bool:
         return self._ready
 
+    def model_memory(self) -> dict:
+        """
+        Parameter bytes of the embedder / reranker. torch weights are unpickled
+        into each worker's heap (ONNX Runtime copies its initializers there too),
+        so they are always private to the process.
+        """
+        with self._rag_lock:
+            models = {"rag_embedder": self._model, "rag_reranker": self._reranker}
+        report = {}
+        for name, model in models.items():
+            nbytes = _torch_param_bytes(model)
+            report[name] = {
+                "loaded": model is not None,
+                "storage": "heap",
+                "nbytes": nbytes,
+                "rss_bytes": nbytes,
+                "shared_bytes": 0,
+                "private_bytes": nbytes,
+            }
+        return report
+
     def get_health_snapshot(self) -> dict:
         """Non-secret diagnostics for /api/health (ops: RAG up, chunk count, key presence)."""
         llm = get_llm_diagnostics()
@@ -1600,17 +2368,26 @@ class RagService:
                 "chunks": len(self._chunks),
                 "qa_answers": len(self._qa_answers),
                 "vector_index": self._index is not None,
+                "ann_index": self._index.ann.snapshot() if self._index is not None and self._index.ann else None,
+                "index_cache_key": self._index_key,
+                "index_source": self._index_source,
                 "init_error": self._init_error,
                 "reranker_enabled": RERANKER_ENABLED,
                 "reranker_active": self._reranker is not None,
                 "reranker_load_attempted": self._reranker_load_attempted,
                 "reranker_model": RERANKER_MODEL,
                 "embedding_model": EMBEDDING_MODEL_NAME,
+                "inference_backend": {
+                    "requested": INFERENCE_BACKEND,
+                    "embedder": _model_backend(self._model),
+                    "reranker": _model_backend(self._reranker),
+                },
                 "top_k_default": TOP_K,
                 "rerank_pool": RERANK_POOL,
                 "min_faiss_prefilter": MIN_FAISS_PREFILTER,
                 "cosine_absent": RAG_COSINE_ABSENT,
                 "cosine_llm": RAG_COSINE_LLM,
+                "llm_breakers": llm_breakers.snapshot(LLM_TIMEOUT_S),
                 **llm,
             }
 
@@ -1619,6 +2396,68 @@ class RagService:
         message: str,
         history: Optional[List[dict]] = None,
         top_k: int = TOP_K,
+        stream: Optional[ChatStream] = None,
+    ) -> dict:
+        """
+        Answer `message`. Query embedding and rerank go through cross-request
+        micro-batchers and hybrid search runs on `rag_executor`, so torch compute
+        never blocks the event loop; raises InferenceOverloadedError when the
+        embedding queue or the pool is saturated. Per-stage latency is returned
+        in `timings_ms`, the provider race (hedging) in `llm_hedge`. Grounded
+        LLM answers to history-insensitive questions go into the semantic answer
+        cache; a near-identical later question gets them back with mode=cache.
+        """
+        timings: Dict[str, int] = {}
+        llm_race: dict = {}
+        started = time.perf_counter()
+        cache_probe: dict = {}
+        result = await self._chat(message, history, top_k, timings, llm_race, stream, cache_probe)
+        if cache_probe and _cacheable_answer(result):
+            self._answer_cache.store(
+                cache_probe["query"],
+                cache_probe["vector"],
+                cache_probe["version"],
+                {k: v for k, v in result.items() if k not in ("latency_ms", "timings_ms", "llm_hedge")},
+            )
+        timings["total"] = int((time.perf_counter() - started) * 1000)
+        if stream is not None and stream.first_token_ms is not None:
+            timings["first_token"] = stream.first_token_ms
+        result["timings_ms"] = timings
+        result["llm_hedge"] = llm_race or None
+        return result
+
+    async def chat_stream(
+        self,
+        message: str,
+        history: Optional[List[dict]] = None,
+        top_k: int = TOP_K,
+    ) -> AsyncIterator[dict]:
+        """
+        `chat()` as events: {"event": "meta"} (sources, scores, provisional mode)
+        once generation starts, "delta" / "reset" while tokens arrive, then
+        "done" carrying the full polished `chat()` result. Template, rule-based
+        and small-talk answers produce only "done". Errors from `chat()`
+        (e.g. InferenceOverloadedError) propagate to the consumer.
+        """
+        stream = ChatStream()
+        task = asyncio.ensure_future(self.chat(message, history, top_k, stream=stream))
+        task.add_done_callback(lambda _: stream.queue.put_nowait(None))
+        try:
+            while (event := await stream.queue.get()) is not None:
+                yield event
+            yield {"event": "done", "data": task.result()}
+        finally:
+            task.cancel()
+
+    async def _chat(
+        self,
+        message: str,
+        history: Optional[List[dict]],
+        top_k: int,
+        timings: Dict[str, int],
+        llm_race: dict,
+        stream: Optional[ChatStream],
+        cache_probe: dict,
     ) -> dict:
         t0 = time.time()
         stripped = message.strip()
@@ -1633,13 +2472,15 @@ class RagService:
             return _apply_answer_polish(small)
 
         if not self._ready:
-            if not self.initialize():
-                answer, mode, llm_provider, llm_model = await _generate_answer(
+            if not await _timed(timings, "init", asyncio.to_thread(self.initialize)):
+                answer, mode, llm_provider, llm_model = await _timed(timings, "llm", _generate_answer(
                     stripped,
                     [],
                     history=history,
                     allow_template_fallback=False,
-                )
+                    trace=llm_race,
+                    stream=stream,
+                ))
                 if answer:
                     return _apply_answer_polish({
                         "answer": answer,
@@ -1670,9 +2511,9 @@ class RagService:
                 })
 
         with self._rag_lock:
-            qa_answers = list(self._qa_answers)
+            qa_index = self._qa_index
 
-        fast_match = _match_qa_answer(stripped, qa_answers)
+        fast_match = _match_qa_answer(stripped, qa_index)
         def rulebase_fallback_payload() -> Optional[dict]:
             """Use exact Q&A only after LLM providers are unavailable."""
             if not fast_match:
@@ -1697,7 +2538,9 @@ class RagService:
         with self._rag_lock:
             model = self._model
             index = self._index
+            index_key = self._index_key
             reranker = self._reranker
+        embed_batcher, rerank_batcher = self._batchers()
 
         raw_hits: List[Tuple[float, float, Chunk]] = []
         rewrite_used: Optional[str] = None
@@ -1706,10 +2549,27 @@ class RagService:
         if index is not None and stripped and model is not None:
             retrieval_query = _expand_quick_menu_label(stripped)
 
+            # Step 0 — semantic answer cache (before rewrite: a hit skips every LLM call)
+            cache_vector = None
+            if ANSWER_CACHE_ENABLED and _history_insensitive(stripped, history):
+                cache_text = _embed_query(_query_embedding_text(retrieval_query))
+                cache_vector = await self._embed_query_text(embed_batcher, cache_text, timings)
+                hit = self._answer_cache.lookup(cache_vector, index_key)
+                if hit is not None:
+                    payload, similarity = hit
+                    payload.update({
+                        "mode": "cache",
+                        "cache_similarity": round(similarity, 4),
+                        "latency_ms": int((time.time() - t0) * 1000),
+                    })
+                    return payload
+                cache_probe.update({"query": retrieval_query, "vector": cache_vector, "version": index_key})
+
             # Step 1 — optional LLM rewrite (resolves "vậy", "thì sao", "nó"…)
-            rewritten, rewrite_provider, rewrite_model = await _maybe_rewrite_query(
-                retrieval_query,
-                history,
+            rewritten, rewrite_provider, rewrite_model = await _timed(
+                timings,
+                "rewrite",
+                _maybe_rewrite_query(retrieval_query, history),
             )
             if rewritten and rewritten.strip() and rewritten.strip().lower() != retrieval_query.strip().lower():
                 rewrite_used = rewritten
@@ -1717,27 +2577,41 @@ class RagService:
             else:
                 enriched_query = _enrich_query(retrieval_query, history)
 
-            # Step 2 — embed + hybrid retrieval. Always search a wider pool:
+            # Step 2 — query embedding, micro-batched with concurrent chats
+            if cache_vector is not None and enriched_query == retrieval_query:
+                query_vector = cache_vector
+            else:
+                embed_text = _embed_query(_query_embedding_text(enriched_query))
+                query_vector = await self._embed_query_text(embed_batcher, embed_text, timings)
+
+            # Step 3 — hybrid retrieval on the RAG pool. Always search a wider pool:
             # the cross-encoder uses it when active, and the lightweight
             # precision pass benefits from it when reranker is disabled.
-            embed_text = _embed_query(_query_embedding_text(enriched_query))
-            query_emb = model.encode([embed_text], normalize_embeddings=True)
             pool_k = max(top_k, RERANK_POOL)
-            raw_hits = index.search_hybrid(query_emb[0], enriched_query, top_k=pool_k)
+            raw_hits, timings["queue"] = await _timed(
+                timings,
+                "search",
+                rag_executor.run("chat", _search, index, query_vector, enriched_query, pool_k, time.perf_counter()),
+            )
 
-            # Step 3 — cross-encoder rerank → keep top_k
-            if reranker is not None and len(raw_hits) > 1:
-                raw_hits = index.rerank(stripped, raw_hits, reranker, top_k=top_k)
+            # Step 4 — cross-encoder rerank (batched across requests) → keep top_k
+            if rerank_batcher is not None and len(raw_hits) > 1:
+                raw_hits = await _timed(timings, "rerank", _rerank(rerank_batcher, stripped, raw_hits, top_k))
             else:
                 raw_hits = raw_hits[:top_k]
 
+        if stream is not None:
+            stream.set_meta(_stream_meta(raw_hits, rewrite_used, reranker is not None))
+
         if not raw_hits:
-            answer, mode, llm_provider, llm_model = await _generate_answer(
+            answer, mode, llm_provider, llm_model = await _timed(timings, "llm", _generate_answer(
                 stripped,
                 [],
                 history=history,
                 allow_template_fallback=False,
-            )
+                trace=llm_race,
+                stream=stream,
+            ))
             if answer:
                 if rewrite_used:
                     mode = f"{mode}_no_context+rewrite"
@@ -1794,12 +2668,14 @@ class RagService:
 
         score_max = max(h[1] for h in raw_hits)
         if score_max < RAG_COSINE_ABSENT:
-            answer, mode, llm_provider, llm_model = await _generate_answer(
+            answer, mode, llm_provider, llm_model = await _timed(timings, "llm", _generate_answer(
                 stripped,
                 [],
                 history=history,
                 allow_template_fallback=False,
-            )
+                trace=llm_race,
+                stream=stream,
+            ))
             if answer:
                 if rewrite_used:
                     mode = f"{mode}_no_context+rewrite"
@@ -1870,12 +2746,14 @@ class RagService:
         )
 
         if score_max < RAG_COSINE_LLM:
-            answer, mode, llm_provider, llm_model = await _generate_answer(
+            answer, mode, llm_provider, llm_model = await _timed(timings, "llm", _generate_answer(
                 stripped,
                 retrieved,
                 history=history,
                 allow_template_fallback=False,
-            )
+                trace=llm_race,
+                stream=stream,
+            ))
             if answer:
                 mode = f"{mode}_low_confidence"
                 if rewrite_used:
@@ -1922,12 +2800,14 @@ class RagService:
                 "rewrite_model": rewrite_model if rewrite_used else None,
             })
 
-        answer, mode, llm_provider, llm_model = await _generate_answer(
+        answer, mode, llm_provider, llm_model = await _timed(timings, "llm", _generate_answer(
             stripped,
             retrieved,
             history=history,
             allow_template_fallback=False,
-        )
+            trace=llm_race,
+            stream=stream,
+        ))
         if answer and rewrite_used:
             mode = f"{mode}+rewrite"
 
@@ -0,0 +1,201 @@
+"""
+Parallel in-process training for the three tree models.
+
+Replaces running training/train_*.py one after another as subprocesses. Each
+job imports its training module with importlib inside a worker of a spawn
+process pool and calls ``generate_synthetic_data()`` + ``train_model(df,
+output_path)`` directly, writing to a staging directory. Workers import
+pandas / sklearn once in the pool initializer, run at lower priority
+(``os.nice``) and have BLAS / joblib threads capped to a CPU budget so a
+retrain competes less with serving traffic. Progress events (job started /
+data ready / trained / failed, with wall time and peak RSS) stream back over a
+multiprocessing queue.
+
+This module is imported by spawned workers: keep heavy imports (numpy,
+sklearn, joblib, app services) out of module scope.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SERVICE_ROOT = Path(__file__).resolve().parents[2]
+
+# (registry name, training script relative to SERVICE_ROOT)
+TRAINING_JOBS: Tuple[Tuple[str, str], ...] = (
+    ("eta_price", "training/train_model.py"),
+    ("accept", "training/train_accept_model.py"),
+    ("wait", "training/train_wait_model.py"),
+)
+
+_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "LOKY_MAX_CPU_COUNT")
+
+ProgressFn = Callable[[dict], None]
+
+# Set per worker by _init_worker
+_progress_queue = None
+
+
+def _peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - non-POSIX
+        return None
+    return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _init_worker(progress_queue, nice: int, threads: int) -> None:
+    """Pool initializer: priority + thread caps first, then the shared heavy imports."""
+    global _progress_queue
+    _progress_queue = progress_queue
+    if nice > 0 and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+    for var in _THREAD_ENV:
+        os.environ[var] = str(threads)
+    import pandas  # noqa: F401
+    import sklearn.ensemble  # noqa: F401
+
+
+def _emit(job: str, stage: str, started: float, **extra) -> None:
+    event = {
+        "job": job,
+        "stage": stage,
+        "pid": os.getpid(),
+        "elapsed_ms": int((time.perf_counter() - started) * 1000),
+        "peak_rss_kb": _peak_rss_kb(),
+        **extra,
+    }
+    if _progress_queue is not None:
+        _progress_queue.put(event)
+
+
+def _load_training_module(name: str, script: str):
+    spec = importlib.util.spec_from_file_location(f"training_{name}", SERVICE_ROOT / script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_training_job(name: str, script: str, output_path: str) -> dict:
+    """Worker entry point: train one model into `output_path`."""
+    started = time.perf_counter()
+    _emit(name, "started", started)
+    try:
+        module = _load_training_module(name, script)
+        df = module.generate_synthetic_data()
+        _emit(name, "data_ready", started, rows=int(len(df)))
+        module.train_model(df, output_path)
+    except Exception as exc:
+        _emit(name, "failed", started, error=f"{type(exc).__name__}: {exc}")
+        raise
+    result = {
+        "job": name,
+        "output": output_path,
+        "wall_ms": int((time.perf_counter() - started) * 1000),
+        "peak_rss_kb": _peak_rss_kb(),
+        "pid": os.getpid(),
+    }
+    _emit(name, "trained", started, output=output_path)
+    return result
+
+
+def cpu_budget(configured: int) -> int:
+    return configured if configured > 0 else max(1, (os.cpu_count() or 1) // 2)
+
+
+def train_all(
+    staging_dir: Path,
+    *,
+    timeout_sec: int,
+    budget: int,
+    nice: int,
+    on_progress: Optional[ProgressFn] = None,
+    jobs: Tuple[Tuple[str, str], ...] = TRAINING_JOBS,
+) -> dict:
+    """
+    Run `jobs` concurrently (at most `budget` workers, `budget // workers`
+    threads each). Returns {"ok", "wall_ms", "jobs": {name: {...}}, "outputs",
+    "progress"}; outputs are only listed when every job succeeded.
+    """
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(len(jobs), budget))
+    threads = max(1, budget // workers)
+    ctx = multiprocessing.get_context("spawn")
+    progress_queue = ctx.Queue()
+    progress: List[dict] = []
+    stop = threading.Event()
+
+    def drain() -> None:
+        while not stop.is_set() or not progress_queue.empty():
+            try:
+                event = progress_queue.get(timeout=0.1)
+            except queue_module.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            progress.append(event)
+            logger.debug(f"ML retrain progress: {event}")
+            if on_progress is not None:
+                try:
+                    on_progress(event)
+                except Exception:
+                    logger.exception("ML retrain progress callback failed")
+
+    reader = threading.Thread(target=drain, name="ml-retrain-progress", daemon=True)
+    reader.start()
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(progress_queue, nice, threads),
+    )
+    results: Dict[str, dict] = {}
+    try:
+        futures = {
+            pool.submit(run_training_job, name, script, str(staging_dir / f"{name}.joblib")): name
+            for name, script in jobs
+        }
+        done, pending = wait(futures, timeout=timeout_sec)
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = {"ok": True, **future.result()}
+            except Exception as exc:
+                results[name] = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+        for future in pending:
+            results[futures[future]] = {"ok": False, "error": f"timed out after {timeout_sec}s"}
+        if pending:
+            # ProcessPoolExecutor cannot cancel running work: stop the workers
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        stop.set()
+        reader.join(timeout=2)
+        progress_queue.close()
+
+    ok = len(results) == len(jobs) and all(r["ok"] for r in results.values())
+    return {
+        "ok": ok,
+        "wall_ms": int((time.perf_counter() - started) * 1000),
+        "workers": workers,
+        "threads_per_worker": threads,
+        "jobs": results,
+        "outputs": {name: Path(r["output"]) for name, r in results.items()} if ok else {},
+        "progress": progress,
+    }
@@ -2,10 +2,8 @@
 
 import logging
 import time
-from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
-import joblib
 import numpy as np
 
 from app.schemas.wait_prediction import (
@@ -13,6 +11,9 @@ from app.schemas.wait_prediction import (
     WaitTimePredictionResponse,
 )
 from app.core.config import settings
+from app.services.compiled_trees import engine_name
+from app.services.model_artifacts import ModelArtifact, load_model_artifact, model_memory
+from app.services.model_registry import follow_registry, resolve_model_path, service_path
 
 logger = logging.getLogger(__name__)
 
@@ -81,34 +82,62 @@ class WaitTimeService:
     """Load + serve the wait-time GBR model."""
 
     def __init__(self) -> None:
-        self.model = None
-        self.model_version = "heuristic-v1"
+        # Model + payload swapped as one reference on reload
+        self._artifact: Optional[ModelArtifact] = None
         self._load_model()
+        follow_registry("wait", self)  # rollback / pin / retrain done by another worker
 
-    def _load_model(self) -> None:
+    def _load_model(self, version: Optional[str] = None) -> bool:
         try:
-            model_path = Path(settings.WAIT_MODEL_PATH)
-            if not model_path.is_absolute():
-                service_root = Path(__file__).resolve().parents[2]
-                model_path = service_root / model_path
-
-            payload = joblib.load(model_path)
-            self.model = payload["model"]
-            self.model_version = payload.get("model_version", "wait-gbr-v1")
+            model_path, registry_version = resolve_model_path(
+                "wait", service_path(settings.WAIT_MODEL_PATH), version
+            )
+            artifact = load_model_artifact(model_path, settings.WAIT_MODEL_ENGINE, "wait_model")
+            artifact.version = registry_version
+            self._artifact = artifact
             logger.info(f"Wait-time model loaded from {model_path} (version={self.model_version})")
+            return True
         except Exception as exc:
-            logger.warning(f"Wait-time model not loaded ({exc}) — heuristic fallback active")
-            self.model = None
-
-    def reload_model(self) -> bool:
-        """Reload wait-time model from disk (after periodic/manual retrain)."""
-        self._load_model()
-        return self.model is not None
+            active = "previous model kept" if self._artifact is not None else "heuristic fallback active"
+            logger.warning(f"Wait-time model not loaded ({exc}) — {active}")
+            return False
+
+    @property
+    def model(self):
+        artifact = self._artifact
+        return artifact.model if artifact is not None else None
+
+    @property
+    def model_version(self) -> str:
+        artifact = self._artifact
+        if artifact is None:
+            return "heuristic-v1"
+        return artifact.payload.get("model_version", "wait-gbr-v1")
+
+    @property
+    def version(self) -> Optional[str]:
+        artifact = self._artifact
+        return artifact.version if artifact is not None else None
+
+    @property
+    def engine(self):
+        return engine_name(self.model)
+
+    def memory_report(self) -> dict:
+        artifact = self._artifact
+        if artifact is None:
+            return model_memory(None)
+        return model_memory(artifact.model, artifact.sidecar)
+
+    def reload_model(self, version: Optional[str] = None) -> bool:
+        """Reload wait-time model (current or given registry version); keeps the old one on failure."""
+        return self._load_model(version)
 
     def predict(self, req: WaitTimePredictionRequest) -> WaitTimePredictionResponse:
         start = time.perf_counter()
+        artifact = self._artifact
 
-        if self.model is None:
+        if artifact is None:
             wait = _heuristic_wait(req)
             return WaitTimePredictionResponse(
                 wait_time_minutes=round(wait, 1),
@@ -122,7 +151,7 @@ class WaitTimeService:
             x = _encode_features(req)
 
             # GBR final prediction (aggregates all stages correctly)
-            raw_pred = float(self.model.predict(x)[0])
+            raw_pred = float(artifact.model.predict(x)[0])
             clamped = float(np.clip(raw_pred, 1.0, 15.0))
 
             # Confidence: higher when prediction is in comfortable middle range [2, 10],
@@ -138,7 +167,7 @@ class WaitTimeService:
             return WaitTimePredictionResponse(
                 wait_time_minutes=round(clamped, 1),
                 confidence=round(confidence, 3),
-                model_version=self.model_version,
+                model_version=artifact.payload.get("model_version", "wait-gbr-v1"),
                 reason_code="AI_OK",
                 inference_ms=int((time.perf_counter() - start) * 1000),
             )
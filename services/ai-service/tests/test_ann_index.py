@@ -0,0 +1,69 @@
+"""FAISS index kinds: auto selection, recall against flat search, exact re-scored PQ scores, benchmark rows."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.services.ann_index import AnnIndex, _synthetic_corpus, benchmark, resolve_index_kind  # noqa: E402
+
+
+def test_auto_kind_follows_corpus_size():
+    assert resolve_index_kind("auto", 500, flat_max=1000, hnsw_max=5000) == "flat"
+    assert resolve_index_kind("auto", 3000, flat_max=1000, hnsw_max=5000) == "hnsw"
+    assert resolve_index_kind("auto", 20000, flat_max=1000, hnsw_max=5000) == "ivf_pq"
+    assert resolve_index_kind("ivf_pq", 2000, pq_nbits=8) == "ivf_flat", "too few points to train 256 PQ centroids"
+    assert resolve_index_kind("ivf_flat", 50) == "flat"
+    assert resolve_index_kind("bogus", 10, flat_max=1000) == "flat"
+
+
+@pytest.mark.parametrize("kind,params", [
+    ("hnsw", {"ef_search": 64}),
+    ("ivf_flat", {"nprobe": 16}),
+    ("ivf_pq", {"nprobe": 16, "pq_nbits": 6, "refine": 10}),
+])
+def test_ann_kinds_recall_against_flat(kind, params):
+    corpus, queries = _synthetic_corpus(3000, 32, 40)
+    _, flat_ids = AnnIndex(corpus, "flat").search(queries, 10)
+    index = AnnIndex(corpus, kind, **params)
+    assert index.kind == kind
+    scores, ids = index.search(queries, 10)
+
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(ids.tolist(), flat_ids.tolist())])
+    assert recall >= 0.9
+    assert np.all(np.diff(scores, axis=1) <= 1e-6), "best first"
+    # scores are true cosines (PQ candidates are re-scored against the stored vectors)
+    np.testing.assert_allclose(scores, np.einsum("qkd,qd->qk", corpus[ids], queries), atol=1e-5)
+    assert index.snapshot()["kind"] == kind
+
+
+def test_search_clamps_k_to_corpus_size():
+    corpus, queries = _synthetic_corpus(5, 8, 2)
+    scores, ids = AnnIndex(corpus, "auto").search(queries[0], 50)
+    assert ids.shape == (1, 5) and sorted(ids[0].tolist()) == [0, 1, 2, 3, 4]
+
+
+def test_benchmark_reports_recall_per_setting():
+    corpus, queries = _synthetic_corpus(2000, 16, 10)
+    rows = benchmark(corpus, queries, k=5, kinds=("hnsw", "ivf_pq"), ef_search=(8, 64), nprobe=(2,))
+    assert [(r["kind"], r["value"]) for r in rows] == [("flat", None), ("hnsw", 8), ("hnsw", 64)]
+    assert rows[0]["recall"] == 1.0 and rows[2]["recall"] >= rows[1]["recall"]
+    assert all(r["p50_ms"] >= 0 for r in rows)
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivf_flat"])
+def test_int8_storage_rescores_top_candidates(kind):
+    corpus, queries = _synthetic_corpus(3000, 32, 20)
+    _, flat_ids = AnnIndex(corpus, "flat").search(queries, 10)
+    index = AnnIndex(corpus, kind, storage="int8", nprobe=32)
+    assert index.compressed and index.bytes_per_vector() < AnnIndex(corpus, kind, storage="float32").bytes_per_vector()
+
+    index.drop_vectors(corpus)  # stands in for the mapped cache rows
+    scores, ids = index.search(queries, 10)
+    np.testing.assert_allclose(scores, np.einsum("qkd,qd->qk", corpus[ids], queries), atol=1e-6)
+    assert np.mean([len(set(a) & set(b)) / 10 for a, b in zip(ids.tolist(), flat_ids.tolist())]) >= 0.95
+
+    index.drop_vectors()  # no float32 rows at all: scores come from the decoded codes
+    scores, ids = index.search(queries, 10)
+    assert index.snapshot()["float32_rows"] == "dropped"
+    np.testing.assert_allclose(scores, np.einsum("qkd,qd->qk", corpus[ids], queries), atol=0.02)
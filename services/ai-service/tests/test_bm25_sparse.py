@@ -0,0 +1,78 @@
+"""Sparse BM25: parity with recorded rank_bm25 scores, top-k ordering, incremental add / remove and npz persistence."""
+
+import numpy as np
+
+from app.services.bm25_sparse import SparseBM25
+
+CORPUS = [
+    ["huy", "chuyen", "mat", "phi", "huy"],
+    ["vi", "foxpay", "nap", "tien", "momo"],
+    ["tai", "xe", "rut", "tien", "vi", "vi"],
+    ["thanh", "toan", "momo", "loi"],
+    ["huy", "chuyen", "hoan", "tien"],
+    ["gia", "cuoc", "gio", "cao", "diem"],
+    [],
+]
+QUERIES = [["huy", "phi"], ["vi", "rut", "tien"], ["momo", "momo", "loi"], ["khong", "co"], []]
+
+
+# rank_bm25 0.2.2 BM25Okapi(CORPUS).get_scores(query) for each of QUERIES (repr round-trips exactly)
+REFERENCE_SCORES = [
+    [2.397576267147736, 0.0, 0.0, 0.0, 0.8008848844330589, 0.0, 0.0],
+    [0.0, 0.9512107845649878, 2.413833428294586, 0.0, 0.25527560140617434, 0.0, 0.0],
+    [0.0, 1.4426033722753209, 0.0, 3.091218980600247, 0.0, 0.0, 0.0],
+    [0.0] * 7,
+    [0.0] * 7,
+]
+
+
+def test_scores_match_rank_bm25():
+    index = SparseBM25(CORPUS)
+    assert index.avgdl == 29 / 7
+    for query, expected in zip(QUERIES, REFERENCE_SCORES):
+        np.testing.assert_array_equal(index.get_scores(query), expected)
+
+    # "xe" is in 3 of 4 documents: negative idf, floored to epsilon * mean idf
+    floored = SparseBM25([["xe", "om"], ["xe", "hoi"], ["xe", "om", "gia"], ["taxi"]])
+    np.testing.assert_array_equal(
+        floored.get_scores(["xe", "om"]), [0.08472978603872036, 0.08472978603872036, 0.06916717227650641, 0.0]
+    )
+
+
+def test_top_k_best_first_positive_only():
+    index = SparseBM25(CORPUS)
+    docs, scores = index.top_k(["vi", "rut", "tien"], 3)
+    dense = index.get_scores(["vi", "rut", "tien"])
+    assert docs.tolist()[0] == 2
+    assert np.all(np.diff(scores) <= 0) and np.all(scores > 0)
+    np.testing.assert_array_equal(scores, dense[docs])
+    assert len(index.top_k(["vi", "rut", "tien"], 50)[0]) == int((dense > 0).sum())
+    assert len(index.top_k(["khong"], 5)[0]) == 0
+    assert len(index.top_k(["vi"], 0)[0]) == 0
+
+
+def test_add_remove_take_equal_a_fresh_fit():
+    index = SparseBM25(CORPUS[:4])
+    assert index.add(CORPUS[4:]) == [4, 5, 6]
+    index.remove([1, 3])
+    fresh = SparseBM25([CORPUS[i] for i in (0, 2, 4, 5, 6)])
+    assert set(index.vocab) == set(fresh.vocab), "terms of removed docs leave the vocabulary"
+    for query in QUERIES:
+        np.testing.assert_allclose(index.get_scores(query), fresh.get_scores(query), rtol=1e-12)
+
+    reordered = index.take([3, 0, 2])
+    subset = SparseBM25([CORPUS[5], CORPUS[0], CORPUS[4]])
+    for query in QUERIES:
+        np.testing.assert_allclose(reordered.get_scores(query), subset.get_scores(query), rtol=1e-12)
+    assert index.corpus_size == 5, "take leaves the source index untouched"
+
+
+def test_save_load_round_trip(tmp_path):
+    index = SparseBM25(CORPUS, k1=1.2, b=0.7)
+    index.save(tmp_path / "bm25.npz")
+    loaded = SparseBM25.load(tmp_path / "bm25.npz")
+    assert (loaded.k1, loaded.b, loaded.vocab) == (1.2, 0.7, index.vocab)
+    for query in QUERIES:
+        np.testing.assert_array_equal(loaded.get_scores(query), index.get_scores(query))
+    loaded.add([["moi", "tai", "lieu"]])
+    assert loaded.top_k(["moi"], 1)[0].tolist() == [7]
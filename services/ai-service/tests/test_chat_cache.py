@@ -0,0 +1,84 @@
+"""Chat caches: semantic answers (similarity, LRU + TTL, versions) and exact-match embeddings."""
+
+import numpy as np
+
+from app.services.chat_cache import EmbeddingLRU, SemanticAnswerCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _vec(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_hit_above_threshold_and_miss_below():
+    cache = SemanticAnswerCache(max_entries=4, threshold=0.95)
+    cache.set_version("v1")
+    cache.store("Hủy chuyến có mất phí?", _vec(1, 0, 0), "v1", {"answer": "Không", "mode": "llm_openai"})
+
+    payload, similarity = cache.lookup(_vec(0.99, 0.05, 0), "v1")
+    assert payload == {"answer": "Không", "mode": "llm_openai"} and similarity > 0.95
+    payload["answer"] = "mutated"
+    assert cache.lookup(_vec(1, 0, 0), "v1")[0]["answer"] == "Không", "hits return copies"
+    assert cache.lookup(_vec(0.7, 0.7, 0), "v1") is None
+
+    snap = cache.snapshot()
+    assert (snap["hits"], snap["misses"], snap["entries"]) == (2, 1, 1)
+
+
+def test_lru_eviction_and_ttl():
+    clock = _Clock()
+    cache = SemanticAnswerCache(max_entries=2, ttl_s=60, threshold=0.99, clock=clock)
+    cache.set_version("v1")
+    cache.store("a", _vec(1, 0, 0), "v1", {"answer": "a"})
+    cache.store("b", _vec(0, 1, 0), "v1", {"answer": "b"})
+    assert cache.lookup(_vec(1, 0, 0), "v1")  # "a" becomes most recent
+    cache.store("c", _vec(0, 0, 1), "v1", {"answer": "c"})
+
+    assert cache.lookup(_vec(0, 1, 0), "v1") is None, "least recently used entry evicted"
+    assert cache.lookup(_vec(0, 0, 1), "v1")[0]["answer"] == "c"
+    clock.now = 61
+    assert cache.lookup(_vec(1, 0, 0), "v1") is None
+    snap = cache.snapshot()
+    assert snap["evictions"] == 1 and snap["expired"] == 1 and snap["entries"] == 1
+
+
+def test_new_index_version_drops_entries_and_late_stores():
+    cache = SemanticAnswerCache()
+    cache.set_version("v1")
+    cache.store("a", _vec(1, 0), "v1", {"answer": "old"})
+    cache.set_version("v2")
+
+    assert cache.lookup(_vec(1, 0), "v2") is None
+    cache.store("a", _vec(1, 0), "v1", {"answer": "built on v1"})
+    assert cache.snapshot()["entries"] == 0 and cache.snapshot()["invalidations"] == 1
+
+
+def test_embedding_lru_normalizes_text_and_respects_byte_budget():
+    vec = np.ones(96, dtype=np.float64)
+    entry_cost = 96 * 4 + len("query: a") + EmbeddingLRU._ENTRY_OVERHEAD
+    cache = EmbeddingLRU("e5-small", budget_bytes=2 * entry_cost)
+
+    stored = cache.put("query: a", vec)
+    assert stored.dtype == np.float32 and not stored.flags.writeable
+    assert cache.get("query:   a ") is stored
+    cache.put("query: b", vec)
+    cache.get("query: a")
+    cache.put("query: c", vec)
+
+    assert cache.get("query: b") is None, "least recently used text evicted"
+    snap = cache.snapshot()
+    assert snap["entries"] == 2 and snap["bytes"] <= snap["budget_bytes"] and snap["evictions"] == 1
+    assert EmbeddingLRU("other-model", 2 * entry_cost)._key("query: a") != cache._key("query: a")
+
+
+def test_embedding_lru_disabled_with_zero_budget():
+    cache = EmbeddingLRU("e5-small", budget_bytes=0)
+    cache.put("query: a", np.ones(4))
+    assert cache.get("query: a") is None and cache.snapshot()["entries"] == 0
@@ -0,0 +1,130 @@
+"""Compiled tree-ensemble parity against sklearn (small models trained in-test)."""
+
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import (
+    GradientBoostingClassifier,
+    GradientBoostingRegressor,
+    RandomForestRegressor,
+)
+from sklearn.linear_model import LinearRegression
+from sklearn.multioutput import MultiOutputRegressor
+
+from app.services.compiled_trees import (
+    CompiledTreeEnsemble,
+    compile_model,
+    engine_name,
+    maybe_compile,
+)
+from app.services.model_artifacts import load_model_artifact, sidecar_dir
+
+
+def _data(n=600, n_features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features))
+    y = X[:, 0] * 2.0 - X[:, 1] ** 2 + np.sin(X[:, 2]) + rng.normal(scale=0.1, size=n)
+    return X, y
+
+
+def _probe(n_features=6, seed=1):
+    # includes rows far outside the training range
+    return np.random.default_rng(seed).normal(scale=2.0, size=(300, n_features))
+
+
+def test_multioutput_random_forest_parity():
+    X, y = _data()
+    model = MultiOutputRegressor(
+        RandomForestRegressor(n_estimators=15, max_depth=8, random_state=0)
+    ).fit(X, np.column_stack([y, 3.0 * y + 1.0]))
+    compiled = compile_model(model)
+    probe = _probe()
+    assert compiled.predict(probe).shape == (300, 2)
+    np.testing.assert_allclose(compiled.predict(probe), model.predict(probe), rtol=1e-9, atol=1e-9)
+
+
+def test_gradient_boosting_regressor_huber_parity():
+    X, y = _data()
+    model = GradientBoostingRegressor(
+        loss="huber", n_estimators=40, max_depth=4, learning_rate=0.08, subsample=0.85, random_state=0
+    ).fit(X, y)
+    compiled = compile_model(model)
+    probe = _probe()
+    np.testing.assert_allclose(compiled.predict(probe), model.predict(probe), rtol=1e-9, atol=1e-9)
+
+
+def test_gradient_boosting_classifier_parity():
+    X, y = _data()
+    labels = (y > np.median(y)).astype(int)
+    model = GradientBoostingClassifier(n_estimators=40, max_depth=4, learning_rate=0.05, random_state=0).fit(X, labels)
+    compiled = compile_model(model)
+    probe = _probe()
+    np.testing.assert_allclose(compiled.predict_proba(probe), model.predict_proba(probe), rtol=1e-9, atol=1e-12)
+    assert (compiled.predict(probe) == model.predict(probe)).all()
+
+
+def test_multiclass_classifier_parity():
+    X, y = _data()
+    labels = np.digitize(y, np.quantile(y, [0.33, 0.66]))
+    model = GradientBoostingClassifier(n_estimators=20, max_depth=3, random_state=0).fit(X, labels)
+    compiled = compile_model(model)
+    probe = _probe()
+    np.testing.assert_allclose(compiled.predict_proba(probe), model.predict_proba(probe), rtol=1e-9, atol=1e-12)
+
+
+def test_compiled_arrays_are_read_only():
+    X, y = _data()
+    compiled = compile_model(RandomForestRegressor(n_estimators=3, random_state=0).fit(X, y))
+    with pytest.raises(ValueError):
+        compiled.threshold[0] = 0.0
+
+
+def test_unsupported_model_falls_back_to_sklearn():
+    X, y = _data()
+    model = LinearRegression().fit(X, y)
+    with pytest.raises(ValueError):
+        compile_model(model)
+    assert maybe_compile(model, "compiled", "linear") is model
+    assert engine_name(model) == "sklearn"
+
+
+def test_engine_selection():
+    X, y = _data()
+    model = GradientBoostingRegressor(n_estimators=5, random_state=0).fit(X, y)
+    assert maybe_compile(model, "sklearn", "wait") is model
+    assert isinstance(maybe_compile(model, "compiled", "wait"), CompiledTreeEnsemble)
+
+
+def test_sidecar_export_is_memory_mapped_and_invalidated(tmp_path):
+    X, y = _data()
+    model = GradientBoostingRegressor(n_estimators=10, random_state=0).fit(X, y)
+    artifact_path = tmp_path / "wait_model.joblib"
+    joblib.dump({"model": model, "model_version": "wait-test"}, artifact_path)
+    calls = []
+
+    def derive(payload):
+        calls.append(1)
+        return {"grid": np.arange(4.0)}, {"rows": 4}
+
+    first = load_model_artifact(artifact_path, "compiled", "wait", derived_key="k1", derive=derive)
+    assert first.storage == "mmap"
+    assert first.payload["model_version"] == "wait-test"
+    assert not first.model.threshold.flags.owndata and not first.model.threshold.flags.writeable
+    np.testing.assert_allclose(first.model.predict(_probe()), model.predict(_probe()), rtol=1e-9, atol=1e-9)
+
+    second = load_model_artifact(artifact_path, "compiled", "wait", derived_key="k1", derive=derive)
+    assert len(calls) == 1, "fresh sidecar must be reused without unpickling"
+    assert second.extras_meta == {"rows": 4}
+    np.testing.assert_array_equal(second.extras["grid"], np.arange(4.0))
+
+    load_model_artifact(artifact_path, "compiled", "wait", derived_key="k2", derive=derive)
+    stat = artifact_path.stat()
+    os.utime(artifact_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    load_model_artifact(artifact_path, "compiled", "wait", derived_key="k2", derive=derive)
+    assert len(calls) == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["wait_model.joblib", sidecar_dir(artifact_path).name]
+
+    heap = load_model_artifact(artifact_path, "sklearn", "wait")
+    assert heap.storage == "heap" and heap.model is not None
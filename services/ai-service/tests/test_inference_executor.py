@@ -0,0 +1,53 @@
+"""Inference executor admission tests (no model needed)."""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.services.inference_executor import InferenceExecutor, InferenceOverloadedError
+
+
+def _blocking(event: threading.Event) -> str:
+    event.wait(timeout=5)
+    return "done"
+
+
+def test_run_returns_worker_result():
+    executor = InferenceExecutor(name="test", max_workers=2, max_queue=2)
+    try:
+        assert asyncio.run(executor.run("predict", sum, [1, 2, 3])) == 6
+        assert executor.snapshot()["completed"]["predict"] == 1
+    finally:
+        executor.shutdown()
+
+
+def test_queue_full_rejects_without_blocking():
+    executor = InferenceExecutor(name="test", max_workers=1, max_queue=0)
+    release = threading.Event()
+    try:
+        running = executor.submit("predict", _blocking, release)
+        with pytest.raises(InferenceOverloadedError):
+            executor.submit("predict", _blocking, release)
+        release.set()
+        assert running.result(timeout=5) == "done"
+        assert executor.snapshot()["rejected"]["predict"] == 1
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_endpoint_cap_isolated_from_other_endpoints():
+    executor = InferenceExecutor(
+        name="test", max_workers=4, max_queue=4, endpoint_limits={"predict_batch": 1}
+    )
+    release = threading.Event()
+    try:
+        executor.submit("predict_batch", _blocking, release)
+        with pytest.raises(InferenceOverloadedError):
+            executor.submit("predict_batch", _blocking, release)
+        # Light endpoints keep their own headroom
+        assert executor.submit("predict", sum, [1, 1]).result(timeout=5) == 2
+    finally:
+        release.set()
+        executor.shutdown()
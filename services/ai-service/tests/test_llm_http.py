@@ -0,0 +1,53 @@
+"""Pooled LLM HTTP clients: reuse per provider/loop, split connect/read timeouts."""
+
+import asyncio
+
+import httpx
+
+from app.services.llm_http import LLMHttpPool
+
+
+class _RecordingPool(LLMHttpPool):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen = []
+
+    def _new_client(self):
+        def handler(request):
+            self.seen.append(request)
+            return httpx.Response(200, json={"ok": True})
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler), limits=self.limits)
+
+
+def test_client_is_reused_per_provider_and_timeouts_are_split():
+    pool = _RecordingPool(connect_timeout_s=0.5)
+
+    async def main():
+        first = pool.client("openai")
+        for _ in range(3):
+            resp = await pool.post("openai", "https://api.openai.com/v1/chat/completions", json={}, timeout_s=5)
+            assert resp.json() == {"ok": True}
+        await pool.post("gemini", "https://generativelanguage.googleapis.com/x", json={}, timeout_s=0.2)
+        assert pool.client("openai") is first
+        assert pool.client("gemini") is not first
+        await pool.aclose()
+        return first
+
+    first = asyncio.run(main())
+    assert first.is_closed
+    timeouts = [r.extensions["timeout"] for r in pool.seen]
+    assert timeouts[0] == {"connect": 0.5, "read": 5, "write": 5, "pool": 5}
+    assert timeouts[-1]["connect"] == 0.2, "connect budget never exceeds the call budget"
+    assert pool.snapshot()["requests"] == {"openai": 3, "gemini": 1}
+
+
+def test_new_event_loop_gets_a_fresh_client():
+    pool = _RecordingPool()
+    first = asyncio.run(_client(pool))
+    second = asyncio.run(_client(pool))
+    assert first is not second
+
+
+async def _client(pool):
+    return pool.client("claude")
@@ -0,0 +1,209 @@
+"""Hedged LLM provider calls, circuit breakers and adaptive timeouts."""
+
+import asyncio
+
+from app.services.llm_resilience import CircuitBreaker, LLMBreakers, LLMHedger
+
+
+def _providers(delays, answers=None, cancelled=None):
+    answers = answers or {}
+
+    async def call(provider):
+        try:
+            await asyncio.sleep(delays[provider])
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(provider)
+            raise
+        return answers.get(provider, f"answer from {provider}")
+
+    return call
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    hedger = LLMHedger(default_delay_ms=20, min_delay_ms=0, max_delay_ms=1000)
+    cancelled = []
+    call = _providers({"openai": 5.0, "gemini": 0.01}, cancelled=cancelled)
+
+    answer, winner, info = asyncio.run(hedger.call(["openai", "gemini"], call))
+
+    assert (answer, winner) == ("answer from gemini", "gemini")
+    assert info == {"providers": ["openai", "gemini"], "winner": "gemini", "hedged": True, "wasted": 1}
+    assert cancelled == ["openai"]
+    stats = hedger.snapshot()["providers"]
+    assert stats["openai"]["hedges_fired"] == 1 and stats["openai"]["wasted"] == 1
+    assert stats["gemini"]["wins"] == 1 and stats["gemini"]["samples"] == 1
+
+
+def test_fast_primary_never_starts_the_backup():
+    hedger = LLMHedger(default_delay_ms=500, min_delay_ms=0)
+    answer, winner, info = asyncio.run(hedger.call(["openai", "gemini"], _providers({"openai": 0.0, "gemini": 0.0})))
+
+    assert winner == "openai"
+    assert info["providers"] == ["openai"] and not info["hedged"] and info["wasted"] == 0
+
+
+def test_failed_provider_falls_through_immediately_and_disabled_is_sequential():
+    call = _providers({"openai": 0.0, "gemini": 0.0}, answers={"openai": None})
+    for enabled in (True, False):
+        hedger = LLMHedger(enabled=enabled, default_delay_ms=10_000)
+        answer, winner, info = asyncio.run(hedger.call(["openai", "gemini"], call))
+        assert winner == "gemini" and not info["hedged"]
+        assert hedger.snapshot()["providers"]["openai"]["failures"] == 1
+
+    none = asyncio.run(LLMHedger().call([], call))
+    assert none == (None, None, {"providers": [], "winner": None, "hedged": False, "wasted": 0})
+
+
+def test_hedge_delay_follows_rolling_quantile_once_warm():
+    hedger = LLMHedger(quantile=0.9, default_delay_ms=1500, min_delay_ms=100, max_delay_ms=2000, min_samples=10)
+    tracker = hedger.latency("openai")
+    for ms in range(1, 10):
+        tracker.record(ms * 100)
+    assert hedger.hedge_delay_ms("openai") == 1500, "default until min_samples"
+    tracker.record(1000)
+    assert hedger.hedge_delay_ms("openai") == 1000
+    for _ in range(20):
+        tracker.record(9000)
+    assert hedger.hedge_delay_ms("openai") == 2000, "clamped to max"
+
+
+def test_censored_latencies_keep_the_tail_in_the_quantiles():
+    hedger = LLMHedger(quantile=0.9, default_delay_ms=20, min_delay_ms=0, max_delay_ms=10_000, min_samples=1)
+    call = _providers({"openai": 5.0, "gemini": 0.05})
+    asyncio.run(hedger.call(["openai", "gemini"], call))
+    assert len(hedger.latency("openai")) == 1, "the cancelled loser is recorded too"
+    assert hedger.latency("openai").quantile(0.9) >= 40, "at least the time it ran before the cancel"
+
+    tracker = hedger.latency("groq")
+    for ms in range(1, 11):
+        tracker.record(ms * 100)
+    assert tracker.quantile(0.5) == 600 and tracker.quantile(0.9) == 1000, "uncensored: order statistic"
+    for _ in range(10):
+        tracker.record_censored(5000)  # timed out at the 5 s budget
+    assert tracker.quantile(0.4) == 900
+    assert tracker.quantile(0.9) == 5000, "tail beyond the timeouts: their elapsed time is the bound"
+    breakers = LLMBreakers(hedger.latency, min_samples=10)
+    assert breakers.timeout_s("groq", 5.0) == 5.0, "timeouts don't shrink the adaptive timeout"
+
+    early = hedger.latency("claude")
+    for ms in (100, 200, 300, 400):
+        early.record(ms)
+    early.record_censored(150)  # cancelled after a hedge: only known to exceed 150 ms
+    assert early.quantile(0.5) == 300
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_skips_instantly_and_recovers_through_one_probe():
+    clock = _Clock()
+    breakers = LLMBreakers(LLMHedger().latency, consecutive_failures=3, cooldown_s=30, clock=clock)
+    calls = []
+
+    async def failing():
+        calls.append("net")
+        return None
+
+    async def ok():
+        calls.append("net")
+        return "ok"
+
+    for _ in range(3):
+        assert asyncio.run(breakers.call("openai", failing)) is None
+    assert breakers.get("openai").state == "open"
+    assert breakers.available(["openai", "gemini"]) == ["gemini"]
+    assert asyncio.run(breakers.call("openai", ok)) is None
+    assert len(calls) == 3, "open breaker makes no network call"
+
+    clock.now = 31
+    assert breakers.get("openai").state == "half_open"
+    assert breakers.get("openai").allow() and not breakers.get("openai").allow(), "single probe"
+    breakers.get("openai").release()
+    assert asyncio.run(breakers.call("openai", failing)) is None
+    snap = breakers.snapshot(5.0)["openai"]
+    assert snap["state"] == "open" and snap["trips"] == 2 and snap["retry_in_s"] == 60, "cooldown doubles"
+
+    clock.now = 100
+    assert asyncio.run(breakers.call("openai", ok)) == "ok"
+    assert breakers.get("openai").state == "closed"
+
+
+def test_breaker_trips_on_failure_rate_and_ignores_cancelled_calls():
+    breaker = CircuitBreaker("gemini", window=10, min_calls=4, failure_rate=0.5, consecutive_failures=99)
+    for ok in (True, False, True, False):
+        breaker.allow()
+        breaker.record_success() if ok else breaker.record_failure()
+    assert breaker.state == "open"
+
+    breakers = LLMBreakers(LLMHedger().latency, consecutive_failures=1)
+
+    async def hang():
+        await asyncio.sleep(5)
+
+    async def main():
+        task = asyncio.ensure_future(breakers.call("claude", hang))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert breakers.get("claude").state == "closed"
+
+
+def test_adaptive_timeout_tracks_p99_within_bounds():
+    hedger = LLMHedger()
+    breakers = LLMBreakers(hedger.latency, min_samples=10)
+    assert breakers.timeout_s("groq", 5.0) == 5.0, "ceiling until warm"
+    for _ in range(20):
+        hedger.latency("groq").record(900)
+    assert breakers.timeout_s("groq", 5.0) == 1.8
+    for _ in range(200):
+        hedger.latency("groq").record(100)
+    assert breakers.timeout_s("groq", 5.0) == 1.5, "never below the floor"
+    assert breakers.timeout_s("groq", 1.0) == 1.0, "never above the configured timeout"
+
+
+def test_rewrite_timeouts_leave_the_answer_breaker_closed(monkeypatch):
+    import app.services.rag_service as rag_module
+
+    clock = _Clock()
+    breakers = LLMBreakers(LLMHedger().latency, consecutive_failures=3, cooldown_s=30, clock=clock)
+    monkeypatch.setattr(rag_module, "llm_breakers", breakers)
+    calls = []
+
+    async def request(provider, messages, *, rewrite, **_kwargs):
+        calls.append(rewrite)
+        if rewrite:
+            raise asyncio.TimeoutError  # slower than the 2 s rewrite budget
+        return "answer"
+
+    monkeypatch.setattr(rag_module, "_request_llm_provider", request)
+
+    async def rewrite():
+        try:
+            await rag_module._call_llm_provider("openai", [], rewrite=True, timeout_s=2.0)
+        except asyncio.TimeoutError:
+            pass
+
+    for _ in range(3):
+        asyncio.run(rewrite())
+    assert breakers.get("openai").state == "closed"
+    assert asyncio.run(rag_module._call_llm_provider("openai", [])) == "answer"
+
+    # Open / half-open: rewrites neither call the provider nor claim the probe
+    breaker = breakers.get("openai")
+    for _ in range(3):
+        breaker.allow()
+        breaker.record_failure()
+    clock.now = 31
+    calls.clear()
+    asyncio.run(rewrite())
+    assert calls == [] and breaker.state == "half_open"
+    assert asyncio.run(rag_module._call_llm_provider("openai", [])) == "answer"
+    assert breaker.state == "closed"
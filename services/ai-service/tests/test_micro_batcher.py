@@ -0,0 +1,110 @@
+"""Cross-request micro-batching: coalescing, ordering, errors, admission."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.inference_executor import InferenceOverloadedError
+from app.services.micro_batcher import MicroBatcher
+
+
+def test_concurrent_requests_share_batches_and_keep_order():
+    batches = []
+
+    def double(items):
+        batches.append(len(items))
+        time.sleep(0.01)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher("test", double, max_batch=8, max_wait_ms=30)
+
+    async def main():
+        return await asyncio.gather(*(batcher.run([i, i + 100]) for i in range(10)))
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        batcher.shutdown()
+    assert results == [[2 * i, 2 * (i + 100)] for i in range(10)]
+    assert len(batches) < 10
+    assert max(batches) <= 8, "requests are never split and batches never exceed max_batch"
+    assert batcher.snapshot()["items"] == 20
+
+
+def test_oversized_request_runs_alone():
+    batcher = MicroBatcher("test", lambda items: [len(items)] * len(items), max_batch=2, max_wait_ms=1)
+    try:
+        assert batcher.submit([1, 2, 3]).result(timeout=5) == [3, 3, 3]
+        assert batcher.submit([]).result(timeout=5) == []
+    finally:
+        batcher.shutdown()
+
+
+def test_failure_propagates_to_every_request_in_the_batch():
+    def boom(items):
+        raise ValueError("model exploded")
+
+    batcher = MicroBatcher("test", boom, max_batch=4, max_wait_ms=20)
+    try:
+        futures = [batcher.submit([i]) for i in range(3)]
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(timeout=5)
+    finally:
+        batcher.shutdown()
+
+
+def test_queue_limit_rejects():
+    release = threading.Event()
+
+    def blocked(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher("test", blocked, max_batch=1, max_wait_ms=0, max_queue=2)
+    try:
+        first = batcher.submit([1])
+        time.sleep(0.05)  # first is running; the next two fill the queue
+        batcher.submit([2])
+        batcher.submit([3])
+        with pytest.raises(InferenceOverloadedError):
+            batcher.submit([4])
+        release.set()
+        assert first.result(timeout=5) == [1]
+        assert batcher.snapshot()["rejected"] == 1
+    finally:
+        release.set()
+        batcher.shutdown()
+
+
+def test_cancelled_waiter_does_not_stop_the_batcher():
+    release = threading.Event()
+    calls = []
+
+    def slow(items):
+        calls.append(list(items))
+        release.wait(5)
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher("test", slow, max_batch=1, max_wait_ms=0)
+
+    async def main():
+        running = asyncio.ensure_future(batcher.run([1]))  # in fn when cancelled
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(batcher.run([2]))  # still queued when cancelled
+        await asyncio.sleep(0.01)
+        running.cancel()
+        queued.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        release.set()
+        return await asyncio.wait_for(batcher.run([3]), timeout=5)
+
+    try:
+        assert asyncio.run(main()) == [30]
+        assert batcher._thread.is_alive()
+    finally:
+        release.set()
+        batcher.shutdown()
+    assert calls == [[1], [3]], "the cancelled queued request never reaches the model"
@@ -0,0 +1,177 @@
+"""Model registry: content-hashed versions, atomic pointer, rollback / pin."""
+
+import threading
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+
+from app.services.model_registry import ModelRegistry, ModelRegistryError
+
+
+def _artifact(tmp_path, name, mae):
+    path = tmp_path / "train" / f"{name}.joblib"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({"model": None, "model_version": "wait-gbr-v1", "mae": mae}, path)
+    return path
+
+
+@pytest.fixture()
+def registry(tmp_path):
+    return ModelRegistry(tmp_path / "registry", keep=3)
+
+
+def test_register_is_content_hashed_and_idempotent(tmp_path, registry):
+    source = _artifact(tmp_path, "wait", 0.9)
+    first = registry.register("wait", source)
+    again = registry.register("wait", source)
+    assert first["version"] == again["version"] == first["sha256"][:12]
+    assert first["metadata"]["mae"] == 0.9
+    assert first["model_version"] == "wait-gbr-v1"
+    assert registry.artifact_path("wait", first["version"]).read_bytes() == source.read_bytes()
+
+    # overwriting the training output must not touch the registered copy
+    _artifact(tmp_path, "wait", 0.5)
+    assert joblib.load(registry.artifact_path("wait", first["version"]))["mae"] == 0.9
+
+
+def test_publish_rollback_and_pin(tmp_path, registry):
+    v1 = registry.publish("wait", _artifact(tmp_path, "wait", 0.9))["version"]
+    v2 = registry.publish("wait", _artifact(tmp_path, "wait", 0.8))["version"]
+    assert registry.current_version("wait") == v2
+
+    assert registry.rollback("wait")["version"] == v1
+    assert registry.current_version("wait") == v1
+    assert [h["action"] for h in registry.history("wait")] == ["publish", "publish", "rollback"]
+
+    registry.pin("wait", v2[:6])
+    v3 = registry.publish("wait", _artifact(tmp_path, "wait", 0.7))["registered"]
+    assert registry.current_version("wait") == v2, "pinned model must ignore publishes"
+
+    registry.pin("wait", None)
+    assert registry.publish("wait", _artifact(tmp_path, "wait", 0.7))["version"] == v3
+
+
+def test_rollback_without_history_and_unknown_names(tmp_path, registry):
+    registry.publish("accept", _artifact(tmp_path, "accept", 0.1))
+    with pytest.raises(ModelRegistryError):
+        registry.rollback("accept")
+    with pytest.raises(ModelRegistryError):
+        registry.pin("accept", "deadbeef")
+    with pytest.raises(ModelRegistryError):
+        registry.current_version("surge")
+
+
+def test_prune_keeps_current(tmp_path, registry):
+    first = registry.publish("wait", _artifact(tmp_path, "wait", 0.0))["version"]
+    registry.pin("wait", first)
+    for mae in (0.1, 0.2, 0.3, 0.4):
+        registry.publish("wait", _artifact(tmp_path, "wait", mae))
+    versions = [m["version"] for m in registry.versions("wait")]
+    assert first in versions
+    assert len(versions) <= registry.keep + 1
+
+
+def test_resolve_bootstraps_from_legacy_path(tmp_path, registry):
+    legacy = _artifact(tmp_path, "eta_price", 1.0)
+    path, version = registry.resolve("eta_price", legacy)
+    assert version == registry.current_version("eta_price")
+    assert path == registry.artifact_path("eta_price", version)
+    assert registry.resolve("eta_price", legacy) == (path, version)
+
+
+def test_prediction_reload_swaps_without_torn_reads():
+    from app.schemas.prediction import DayTypeEnum, PredictionRequest, TimeOfDayEnum
+    from app.services.prediction_service import prediction_service
+
+    requests = [
+        PredictionRequest(distance_km=d, time_of_day=TimeOfDayEnum.RUSH_HOUR, day_type=DayTypeEnum.WEEKDAY)
+        for d in (1.0, 10.0, 80.0)
+    ]
+    expected = prediction_service.predict_batch(requests)["results"]
+    errors = []
+    stop = threading.Event()
+
+    def hammer():
+        while not stop.is_set():
+            try:
+                got = prediction_service.predict_batch(requests)["results"]
+                assert [r["eta_minutes"] for r in got] == [r["eta_minutes"] for r in expected]
+            except Exception as exc:  # pragma: no cover - surfaced below
+                errors.append(exc)
+
+    workers = [threading.Thread(target=hammer) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    try:
+        for _ in range(3):
+            assert prediction_service.reload_model()
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+    assert not errors
+
+
+def test_other_worker_follows_a_switch_made_by_another(tmp_path, monkeypatch):
+    import app.services.model_registry as registry_module
+    from app.core.config import settings
+    from app.schemas.wait_prediction import WaitTimePredictionRequest
+    from app.services.model_registry import RegistryFollower
+    from app.services.wait_service import WaitTimeService
+
+    class Clock:
+        now = 0.0
+
+        def __call__(self):
+            return self.now
+
+    clock = Clock()
+    shared = ModelRegistry(tmp_path / "registry")
+    follower = RegistryFollower(autostart=False, clock=clock)  # passes driven by the test
+    monkeypatch.setattr(registry_module, "model_registry", shared)
+    monkeypatch.setattr(registry_module, "registry_follower", follower)
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_ENABLED", True)
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_POLL_S", 2.0)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 12))
+    model = GradientBoostingRegressor(n_estimators=5, max_depth=2, random_state=0).fit(X, 5 + X[:, 0])
+    versions = []
+    for tag in ("wait-gbr-a", "wait-gbr-b"):
+        path = tmp_path / "train" / f"{tag}.joblib"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump({"model": model, "model_version": tag}, path)
+        versions.append(shared.publish("wait", path)["version"])
+    v_a, v_b = versions
+
+    handler, other = WaitTimeService(), WaitTimeService()  # two uvicorn workers
+    assert handler.version == other.version == v_b
+    request = WaitTimePredictionRequest(
+        demand_level="HIGH", active_booking_count=12, available_driver_count=3, hour_of_day=18, day_of_week=4
+    )
+
+    # /api/internal/refresh rollback lands on one worker only
+    shared.rollback("wait")
+    assert handler.reload_model() and handler.version == v_a
+    assert other.predict(request).model_version == "wait-gbr-b", "no reload on the request path"
+    assert follower.check() == {"wait": v_a}
+    assert other.version == v_a and handler.version == v_a
+    assert other.predict(request).model_version == "wait-gbr-a"
+    assert follower.check() == {}, "unchanged pointer: no reload"
+
+    # A failed reload keeps the loaded model and is retried after a backoff
+    real_reload = other.reload_model
+    attempts = []
+
+    def flaky_reload(version=None):
+        attempts.append(version)
+        return len(attempts) > 1 and real_reload(version)
+
+    monkeypatch.setattr(other, "reload_model", flaky_reload)
+    shared.pin("wait", v_b)
+    assert handler.reload_model()
+    assert follower.check() == {} and other.version == v_a
+    assert follower.check() == {} and len(attempts) == 1, "backing off"
+    clock.now = 5.0
+    assert follower.check() == {"wait": v_b} and other.version == v_b
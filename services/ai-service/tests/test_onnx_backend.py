@@ -0,0 +1,134 @@
+"""ONNX backend: PyTorch fallback when no export, batching order, normalisation, sigmoid, cache key per backend."""
+
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.onnx_backend import (
+    META_FILE,
+    OnnxCrossEncoder,
+    OnnxEncoder,
+    load_onnx_cross_encoder,
+    load_onnx_encoder,
+    model_dir,
+)
+from app.services.rag_service import _index_cache_key
+
+
+class _Tokenizer:
+    """Token ids = character codes; pairs are joined with a 0 separator."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, pairs=None, padding=True, truncation=True, max_length=512, return_tensors="np"):
+        if pairs is not None:
+            texts = [f"{a}\0{b}" for a, b in zip(texts, pairs)]
+        self.batches.append(list(texts))
+        width = max(len(t) for t in texts)
+        ids = np.zeros((len(texts), width), dtype=np.int64)
+        mask = np.zeros_like(ids)
+        for row, text in enumerate(texts):
+            ids[row, :len(text)] = [ord(c) for c in text]
+            mask[row, :len(text)] = 1
+        return {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+
+
+class _Session:
+    """Output row = (token count, id sum) — enough to check which text produced which row."""
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, _outputs, feed):
+        assert set(feed) == {"input_ids", "attention_mask"} and feed["input_ids"].dtype == np.int64
+        count = feed["attention_mask"].sum(axis=1)
+        total = (feed["input_ids"] * feed["attention_mask"]).sum(axis=1)
+        return [np.stack([count, total], axis=1).astype(np.float32)]
+
+
+def test_missing_export_falls_back_to_torch(tmp_path):
+    assert load_onnx_encoder("org/model", threads=1, root=tmp_path) is None
+    assert load_onnx_cross_encoder("org/model", threads=1, root=tmp_path) is None
+
+
+def test_mismatched_export_is_not_loaded(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("transformers")
+    directory = model_dir(tmp_path, "org/model")
+    directory.mkdir()
+    (directory / META_FILE).write_text(json.dumps({"kind": "cross_encoder", "model": "org/model"}))
+    assert load_onnx_encoder("org/model", threads=1, root=tmp_path) is None
+
+
+def test_encode_keeps_input_order_across_length_sorted_batches():
+    tokenizer = _Tokenizer()
+    encoder = OnnxEncoder(_Session(), tokenizer, {"dim": 2, "max_length": 16})
+    texts = ["ab", "abcde", "a", "abc"]
+    out = encoder.encode(texts, batch_size=2)
+    np.testing.assert_array_equal(out[:, 0], [len(t) for t in texts])
+    assert tokenizer.batches == [["abcde", "abc"], ["ab", "a"]], "longest first, so batches pad less"
+
+    unit = encoder.encode(texts, batch_size=3, normalize_embeddings=True)
+    np.testing.assert_allclose(np.linalg.norm(unit, axis=1), 1.0, rtol=1e-6)
+    assert encoder.encode("abc").shape == (1, 2)
+    assert encoder.backend == "onnx"
+
+
+def test_predict_applies_the_exported_activation():
+    pairs = [["q", "short"], ["q", "a longer passage"], ["q", ""]]
+    raw = OnnxCrossEncoder(_Session(), _Tokenizer(), {"num_labels": 2, "quantized": True}).predict(pairs, batch_size=2)
+    assert raw.shape == (3, 2)
+    np.testing.assert_array_equal(raw[:, 0], [len(a) + 1 + len(b) for a, b in pairs])
+
+    class _OneLogit(_Session):
+        def run(self, outputs, feed):
+            return [super().run(outputs, feed)[0][:, :1] - 8.0]
+
+    model = OnnxCrossEncoder(_OneLogit(), _Tokenizer(), {"num_labels": 1, "activation": "sigmoid", "quantized": True})
+    scores = model.predict(pairs, batch_size=2)
+    np.testing.assert_allclose(scores, 1.0 / (1.0 + np.exp(-(raw[:, 0] - 8.0))), rtol=1e-6)
+    assert model.backend == "onnx-int8"
+    assert model.predict([]).shape == (0,)
+
+
+def test_runs_an_onnx_graph_through_the_session_options(tmp_path):
+    pytest.importorskip("onnxruntime")
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper
+
+    from app.services.onnx_backend import ONNX_OPSET, _session
+
+    # logits = sum(input_ids * attention_mask) / 100 over the sequence axis
+    graph = helper.make_graph(
+        [
+            helper.make_node("Mul", ["input_ids", "attention_mask"], ["masked"]),
+            helper.make_node("Cast", ["masked"], ["masked_f"], to=TensorProto.FLOAT),
+            helper.make_node("ReduceSum", ["masked_f", "axes"], ["total"], keepdims=1),
+            helper.make_node("Div", ["total", "scale"], ["logits"]),
+        ],
+        "tiny",
+        [helper.make_tensor_value_info(n, TensorProto.INT64, ["batch", "sequence"]) for n in ("input_ids", "attention_mask")],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 1])],
+        initializer=[
+            helper.make_tensor("axes", TensorProto.INT64, [1], [1]),
+            helper.make_tensor("scale", TensorProto.FLOAT, [], [100.0]),
+        ],
+    )
+    path = tmp_path / "model.onnx"
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", ONNX_OPSET)], ir_version=8), str(path))
+
+    model = OnnxCrossEncoder(_session(path, threads=1), _Tokenizer(), {"num_labels": 1}, path)
+    pairs = [["q", "ab"], ["q", "abcd"]]
+    expected = [(ord("q") + sum(ord(c) for c in b)) / 100 for _, b in pairs]
+    np.testing.assert_allclose(model.predict(pairs, batch_size=1), expected, rtol=1e-6)
+    assert model.weight_bytes == path.stat().st_size
+
+
+def test_index_cache_key_separates_onnx_vectors():
+    docs = [("faq.md", "FAQ", "Hủy chuyến mất phí bao nhiêu?")]
+    assert _index_cache_key(docs) == _index_cache_key(docs, "torch")
+    assert _index_cache_key(docs, "onnx-int8") != _index_cache_key(docs)
+    assert _index_cache_key(docs, "onnx-int8") != _index_cache_key(docs, "onnx")
@@ -1,8 +1,11 @@
 """Test cases for AI prediction API"""
 
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.core.config import settings
 from app.schemas.prediction import TimeOfDayEnum, DayTypeEnum
 
 client = TestClient(app)
@@ -143,6 +146,175 @@ class TestPredictEndpoint:
             assert 1.0 <= data["price_multiplier"] <= 2.0
 
 
+class TestPredictBatchEndpoint:
+    """Test batch prediction endpoint"""
+
+    def test_predict_batch_matches_single_predictions(self):
+        """Each batch row matches the single-trip endpoint for the same input"""
+        rows = [
+            {"distance_km": 5.0, "time_of_day": "OFF_PEAK", "day_type": "WEEKDAY"},
+            {"distance_km": 12.5, "time_of_day": "RUSH_HOUR", "day_type": "WEEKDAY"},
+            {"distance_km": 30.0, "time_of_day": "RUSH_HOUR", "day_type": "WEEKEND"},
+        ]
+        response = client.post("/api/predict/batch", json={"requests": rows})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["results"]) == len(rows)
+        assert data["inference_ms"] >= 0
+
+        for row, result in zip(rows, data["results"]):
+            single = client.post("/api/predict", json=row).json()
+            assert result["distance_km"] == row["distance_km"]
+            for key in ("eta_minutes", "price_multiplier", "recommended_driver_radius_km",
+                        "surge_hint", "confidence_score", "insights"):
+                assert result[key] == single[key]
+
+    def test_predict_batch_empty_returns_422(self):
+        """Empty batch is rejected"""
+        response = client.post("/api/predict/batch", json={"requests": []})
+        assert response.status_code == 422
+
+
+class TestAcceptBatchEndpoint:
+    """Test accept probability batch endpoint"""
+
+    def test_accept_batch_large_candidate_pool(self):
+        """Large dispatch pools return one result per driver, in order"""
+        drivers = [
+            {
+                "driver_id": f"drv-{i:03d}",
+                "eta_minutes": (i % 30) + 0.5,
+                "driver_accept_rate": (i % 10) / 10,
+                "driver_cancel_rate": (i % 5) / 20,
+            }
+            for i in range(200)
+        ]
+        payload = {
+            "context": {
+                "distance_km": 7.5,
+                "fare_estimate": 85000,
+                "surge_multiplier": 1.3,
+                "hour_of_day": 8,
+                "pickup_zone": "A",
+                "demand_level": "HIGH",
+                "available_driver_count": 4,
+            },
+            "drivers": drivers,
+        }
+        response = client.post("/api/predict/accept/batch", json=payload)
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["driver_id"] for r in results] == [d["driver_id"] for d in drivers]
+        for r in results:
+            assert 0.3 <= r["p_accept_clamped"] <= 1.2
+
+    @staticmethod
+    def _reference_row(ctx, drv):
+        """The original per-row scalar encoder — an independent reference for `_encode_batch`."""
+        import numpy as np
+
+        fare_k = ctx.fare_estimate / 1_000
+        zone = ctx.pickup_zone.upper()
+        demand_score = {"LOW": 0.0, "MEDIUM": 1.0, "HIGH": 2.0}.get(ctx.demand_level.upper(), 1.0)
+        avail_log = np.log1p(max(0, ctx.available_driver_count))
+        eta_clamped = max(0.0, drv.eta_minutes)
+        return np.array([
+            np.log1p(eta_clamped),
+            np.log1p(max(0.0, ctx.distance_km)),
+            np.log1p(max(0.0, fare_k)),
+            ctx.surge_multiplier,
+            drv.driver_accept_rate,
+            drv.driver_cancel_rate,
+            np.sin(2 * np.pi * ctx.hour_of_day / 24),
+            np.cos(2 * np.pi * ctx.hour_of_day / 24),
+            1.0 if zone == "A" else 0.0,
+            1.0 if zone == "B" else 0.0,
+            1.0 if zone == "C" else 0.0,
+            demand_score,
+            avail_log,
+            np.log1p(fare_k) / max(1.0, eta_clamped),
+            demand_score / max(1.0, avail_log),
+        ], dtype=float)
+
+    def test_batch_encoder_matches_single_rows(self):
+        """Columnar encoder broadcasts context features to every driver row"""
+        import numpy as np
+
+        from app.schemas.accept_prediction import AcceptPredictionContext, AcceptPredictionDriverInput
+        from app.services.accept_service import _encode_batch
+
+        ctx = AcceptPredictionContext(
+            distance_km=4.2, fare_estimate=52000, hour_of_day=18,
+            pickup_zone="b", demand_level="low", available_driver_count=9,
+        )
+        drivers = [
+            AcceptPredictionDriverInput(
+                driver_id=str(i), eta_minutes=eta, driver_accept_rate=0.8, driver_cancel_rate=0.1
+            )
+            for i, eta in enumerate([0.0, 0.4, 7.0, 45.0])
+        ]
+        matrix = _encode_batch(ctx, drivers)
+
+        assert matrix.shape == (4, 15)
+        for row, drv in zip(matrix, drivers):
+            np.testing.assert_array_equal(row, self._reference_row(ctx, drv).astype(np.float32))
+        # a few hand-computed cells: zone "b" → zone_B, demand "low" → 0, eta 45 → log1p(45)
+        assert (matrix[:, 9] == 1.0).all() and (matrix[:, [8, 10, 11, 14]] == 0.0).all()
+        assert matrix[3, 0] == np.float32(np.log1p(45.0))
+        assert matrix[0, 13] == np.float32(np.log1p(52.0)), "eta below 1 min divides by 1"
+
+
+class TestRecommendDriverEndpoint:
+    """Test unified AI decision endpoint"""
+
+    payload = {
+        "distance_km": 7.5,
+        "fare_estimate": 85000,
+        "time_of_day": "RUSH_HOUR",
+        "day_type": "WEEKDAY",
+        "hour_of_day": 8,
+        "pickup_zone": "A",
+        "demand_level": "HIGH",
+        "available_driver_count": 4,
+        "candidates": [
+            {"driver_id": "drv-001", "eta_minutes": 3, "distance_km": 1.2, "accept_rate": 0.92},
+            {"driver_id": "drv-002", "eta_minutes": 9, "distance_km": 3.4, "accept_rate": 0.61},
+        ],
+    }
+
+    def test_recommend_driver_reports_stage_timings(self):
+        """All three model stages report status and timing"""
+        response = client.post("/api/recommend-driver", json=self.payload)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [d["rank"] for d in data["ranked_drivers"]] == [1, 2]
+        stages = data["ai_pipeline_summary"]["stages"]
+        assert set(stages) == {"surge", "accept", "wait"}
+        for stage in stages.values():
+            assert stage["ms"] >= 0
+            assert stage["status"] in {"AI_OK", "AI_TIMEOUT", "AI_OVERLOADED", "AI_MODEL_ERROR"}
+
+    def test_slow_stage_only_degrades_its_section(self, monkeypatch):
+        """A stage exceeding its timeout falls back without failing the response"""
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "AI_RECOMMEND_SURGE_TIMEOUT_MS", 0)
+        response = client.post("/api/recommend-driver", json=self.payload)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ai_pipeline_summary"]["stages"]["surge"]["status"] == "AI_TIMEOUT"
+        assert data["surge_prediction"]["reason_code"] == "AI_FALLBACK"
+        assert len(data["ranked_drivers"]) == 2
+
+    def test_empty_candidates_returns_400(self):
+        response = client.post("/api/recommend-driver", json={**self.payload, "candidates": []})
+        assert response.status_code == 400
+
+
 class TestValidation:
     """Test input validation"""
     
@@ -242,6 +414,20 @@ class TestStatsEndpoint:
         assert "status" in data
         assert "model_loaded" in data
         assert "model_path" in data
+        assert "eta_lookup" in data
+        assert data["model_engines"]["eta_price"] == settings.ETA_MODEL_ENGINE
+        eta_memory = data["memory"]["models"]["eta_price"]
+        assert eta_memory["nbytes"] > 0
+        assert {"rss_bytes", "shared_bytes", "private_bytes"} <= set(eta_memory)
+        assert "rag_embedder" in data["memory"]["models"]
+
+    def test_eta_lookup_tracks_forest(self):
+        """Grid lookup stays within a fraction of a minute of the forest"""
+        report = client.get("/api/stats").json()["eta_lookup"]
+        if report is None:
+            pytest.skip("ETA lookup table disabled")
+        assert report["eta_mae"] < 0.5
+        assert report["price_mae"] < 0.01
 
 
 class TestChatStatusEndpoint:
@@ -262,6 +448,23 @@ class TestChatStatusEndpoint:
         assert "key_configured" in data
 
 
+class TestChatStreamEndpoint:
+    """Test SSE chat endpoint"""
+
+    def test_smalltalk_streams_a_single_done_event(self):
+        response = client.post("/api/chat/stream", json={"message": "xin chào"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = [block for block in response.text.split("\n\n") if block]
+        assert len(events) == 1
+        name, data = events[0].split("\n", 1)
+        assert name == "event: done"
+        payload = json.loads(data[len("data: "):])
+        assert payload["mode"] == "smalltalk_greeting"
+        assert "total" in payload["timings_ms"]
+
+
 class TestRootEndpoint:
     """Test root endpoint"""
     
@@ -301,4 +504,5 @@ class TestOpenAPI:
         schema = response.json()
         assert "paths" in schema
         assert "/api/predict" in schema["paths"]
+        assert "/api/predict/batch" in schema["paths"]
         assert "/api/health" in schema["paths"]
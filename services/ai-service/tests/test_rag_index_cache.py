@@ -0,0 +1,162 @@
+"""Persistent RAG index cache + incremental re-indexing (fake encoder — no SentenceTransformer download)."""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import app.services.rag_service as rag_module
+from app.services.rag_index_cache import RagIndexCache
+from app.services.rag_service import KNOWLEDGE_DIR, RagService, _load_documents
+
+
+class _FakeEncoder:
+    """Deterministic per-text vectors so reused and re-encoded rows are comparable."""
+
+    def __init__(self):
+        self.calls = 0
+        self.encoded = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        self.encoded += len(texts)
+        rows = []
+        for text in texts:
+            rng = np.random.default_rng(abs(hash(text)) % (2**32))
+            rows.append(rng.normal(size=16))
+        vectors = np.asarray(rows, dtype="float32")
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture()
+def cache(tmp_path, monkeypatch):
+    cache = RagIndexCache(tmp_path / "rag_cache", keep=2)
+    monkeypatch.setattr(rag_module, "_index_cache", cache)
+    return cache
+
+
+@pytest.fixture()
+def knowledge(tmp_path, monkeypatch):
+    directory = tmp_path / "knowledge"
+    directory.mkdir()
+    for name in ("02_pricing.txt", "03_payment.txt", "05_cancellation.txt"):
+        shutil.copy(KNOWLEDGE_DIR / name, directory / name)
+    monkeypatch.setattr(rag_module, "KNOWLEDGE_DIR", directory)
+    return directory
+
+
+def _ready_service(encoder):
+    service = RagService()
+    service._model = encoder
+    docs, state, _ = service._scan_knowledge()
+    service._swap_knowledge(service._build_knowledge(list(docs.values()), encoder), docs, state)
+    return service
+
+
+def test_second_build_maps_cache_without_encoding(cache):
+    docs = _load_documents(KNOWLEDGE_DIR)
+    encoder = _FakeEncoder()
+    service = RagService()
+
+    first = service._build_knowledge(docs, encoder)
+    assert first["source"] == "built" and encoder.calls == 1
+    assert (cache.entry_dir(first["key"]) / "embeddings.npy").exists()
+
+    second = service._build_knowledge(docs, encoder)
+    assert (second["source"], second["key"], encoder.calls) == ("cache", first["key"], 1)
+    assert [c.text for c in second["chunks"]] == [c.text for c in first["chunks"]]
+    assert [(a.question, a.tokens) for a in second["qa_answers"]] == [
+        (a.question, a.tokens) for a in first["qa_answers"]
+    ]
+    mapped = second["index"].embeddings
+    assert not mapped.flags.owndata and not mapped.flags.writeable
+    np.testing.assert_array_equal(mapped, first["index"].embeddings)
+
+    index = first["index"]
+    query = index.embeddings[3]
+    text = first["chunks"][3].text[:80]
+    assert [c.text for _, _, c in second["index"].search_hybrid(query, text)] == [
+        c.text for _, _, c in index.search_hybrid(query, text)
+    ]
+
+
+def test_knowledge_change_invalidates_cache(cache):
+    docs = _load_documents(KNOWLEDGE_DIR)
+    encoder = _FakeEncoder()
+    service = RagService()
+    key = service._build_knowledge(docs, encoder)["key"]
+
+    edited = docs[:-1] + [(docs[-1][0], docs[-1][1], docs[-1][2] + "\nHỏi: mới?\nĐáp: có.")]
+    built = service._build_knowledge(edited, encoder)
+    assert built["source"] == "built" and built["key"] != key and encoder.calls == 2
+    assert any(a.question == "mới?" for a in built["qa_answers"])
+
+
+def test_reload_without_changes_is_a_no_op(cache, knowledge):
+    encoder = _FakeEncoder()
+    service = _ready_service(encoder)
+    index = service._index
+
+    result = service.reload_knowledge_from_disk()
+    assert result["action"] == "unchanged"
+    assert (result["files_changed"], result["chunks_reembedded"]) == (0, 0)
+    assert service._index is index and encoder.calls == 1
+
+    # touched but identical content: hashed, still nothing to re-embed
+    path = knowledge / "03_payment.txt"
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10**9))
+    assert service.reload_knowledge_from_disk()["files_changed"] == 0
+
+
+def test_reload_reembeds_only_changed_files(cache, knowledge):
+    encoder = _FakeEncoder()
+    service = _ready_service(encoder)
+    payment_chunks = sum(c.source == "03_payment.txt" for c in service._chunks)
+
+    path = knowledge / "03_payment.txt"
+    path.write_text(path.read_text(encoding="utf-8") + "\nHỏi: Ví có rút được không?\nĐáp: Có.\n", encoding="utf-8")
+    (knowledge / "05_cancellation.txt").unlink()
+    shutil.copy(KNOWLEDGE_DIR / "04_vouchers.txt", knowledge / "04_vouchers.txt")
+    encoded_before = encoder.encoded
+
+    result = service.reload_knowledge_from_disk()
+    assert result["files"] == {"added": ["04_vouchers.txt"], "modified": ["03_payment.txt"], "deleted": ["05_cancellation.txt"]}
+    assert result["files_changed"] == 3 and result["index_source"] == "patched"
+    assert result["chunks_reembedded"] == encoder.encoded - encoded_before
+    assert result["chunks_reembedded"] < len(service._chunks)
+    assert sum(c.source == "03_payment.txt" for c in service._chunks) == payment_chunks + 1
+    assert not any(c.source == "05_cancellation.txt" for c in service._chunks)
+    assert any(a.question == "Ví có rút được không?" for a in service._qa_answers)
+
+    # patched index equals a full rebuild of the same files
+    rag_module._index_cache = None
+    full = RagService()._build_knowledge(_load_documents(knowledge), _FakeEncoder())
+    assert [c.text for c in service._chunks] == [c.text for c in full["chunks"]]
+    np.testing.assert_allclose(service._index.embeddings, full["index"].embeddings, rtol=1e-6)
+    np.testing.assert_allclose(
+        service._index.bm25.get_scores(["vi", "rut"]), full["index"].bm25.get_scores(["vi", "rut"])
+    )
+
+
+def test_int8_storage_rescores_from_the_mapped_cache(cache, monkeypatch):
+    from functools import partial
+
+    from app.services.ann_index import AnnIndex
+
+    docs = _load_documents(KNOWLEDGE_DIR)
+    exact = RagService()._build_knowledge(docs, _FakeEncoder())["index"]
+    shutil.rmtree(cache.root)
+    monkeypatch.setattr(rag_module, "_AnnIndex", partial(AnnIndex, storage="int8"))
+
+    built = RagService()._build_knowledge(docs, _FakeEncoder())["index"]
+    snap = built.ann.snapshot()
+    assert (snap["storage"], snap["float32_rows"]) == ("int8", "mapped")
+    assert snap["bytes_per_vector"] * 4 == exact.ann.snapshot()["bytes_per_vector"]
+    assert not built.embeddings.flags.owndata, "resident float32 matrix released"
+
+    query = exact.embeddings[5]
+    text = exact.chunks[5].text[:80]
+    assert [(c.text, round(cos, 5)) for _, cos, c in built.search_hybrid(query, text)] == [
+        (c.text, round(cos, 5)) for _, cos, c in exact.search_hybrid(query, text)
+    ]
@@ -99,3 +99,225 @@ def test_generate_answer_can_defer_to_rulebase_fallback(monkeypatch):
     assert mode == "llm_unavailable"
     assert provider == "none"
     assert model is None
+
+
+def test_chat_retrieval_runs_off_the_event_loop(monkeypatch):
+    import threading
+
+    import numpy as np
+
+    monkeypatch.setattr(rag_module, "LLM_PROVIDER", "auto")
+    monkeypatch.setattr(rag_module, "OPENAI_API_KEY", "")
+    monkeypatch.setattr(rag_module, "GEMINI_API_KEY", "")
+    monkeypatch.setattr(rag_module, "_index_cache", None)
+    threads = []
+
+    class _Encoder:
+        def encode(self, texts, **kwargs):
+            threads.append(threading.current_thread().name)
+            vectors = np.random.default_rng(len(texts)).normal(size=(len(texts), 8)).astype("float32")
+            return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    service = rag_module.RagService()
+    service._model = _Encoder()
+    docs, state, _ = service._scan_knowledge()
+    service._swap_knowledge(service._build_knowledge(list(docs.values()), service._model), docs, state)
+    threads.clear()
+
+    result = asyncio.run(service.chat("Hủy chuyến sau khi tài xế đến có mất phí không?"))
+
+    assert threads and all(name.startswith("rag-embed-batch") for name in threads)
+    assert {"queue", "embed", "search", "total"} <= set(result["timings_ms"])
+    assert result["retrieval_count"] > 0
+
+
+def _indexed_service():
+    import numpy as np
+
+    class _Encoder:
+        def encode(self, texts, **kwargs):
+            vectors = np.random.default_rng(len(texts)).normal(size=(len(texts), 8)).astype("float32")
+            return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    service = rag_module.RagService()
+    service._model = _Encoder()
+    docs, state, _ = service._scan_knowledge()
+    service._swap_knowledge(service._build_knowledge(list(docs.values()), service._model), docs, state)
+    return service
+
+
+def _collect(service, message):
+    async def main():
+        return [event async for event in service.chat_stream(message)]
+
+    return asyncio.run(main())
+
+
+def test_chat_stream_sends_meta_then_deltas_then_done(monkeypatch):
+    import json
+
+    import httpx
+
+    from app.services.llm_http import LLMHttpPool
+    from app.services.llm_resilience import LLMBreakers, LLMHedger
+
+    def handler(request):
+        body = json.loads(request.content)
+        if not body.get("stream"):
+            return httpx.Response(500)
+        chunks = [{"choices": [{"delta": {"content": text}}]} for text in ("Hủy ", "**miễn phí**", " nhé")]
+        sse = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+        return httpx.Response(200, text=sse, headers={"content-type": "text/event-stream"})
+
+    class _Pool(LLMHttpPool):
+        def _new_client(self):
+            return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(rag_module, "LLM_PROVIDER", "openai")
+    monkeypatch.setattr(rag_module, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(rag_module, "QUERY_REWRITE_ENABLED", False)
+    monkeypatch.setattr(rag_module, "_index_cache", None)
+    monkeypatch.setattr(rag_module, "llm_http_pool", _Pool())
+    monkeypatch.setattr(rag_module, "llm_breakers", LLMBreakers(LLMHedger().latency))
+
+    events = _collect(_indexed_service(), "Hủy chuyến sau khi tài xế đến có mất phí không?")
+
+    names = [e["event"] for e in events]
+    assert names[0] == "meta" and names[-1] == "done"
+    assert "".join(e["data"]["text"] for e in events if e["event"] == "delta") == "Hủy **miễn phí** nhé"
+    assert events[0]["data"]["retrieval_count"] > 0
+    done = events[-1]["data"]
+    assert done["answer"] == "Hủy miễn phí nhé", "final event carries the polished answer"
+    assert done["llm_provider"] == "openai" and done["mode"].startswith("llm_openai")
+    assert "first_token" in done["timings_ms"]
+
+
+def test_chat_stream_template_answer_is_a_single_event(monkeypatch):
+    monkeypatch.setattr(rag_module, "LLM_PROVIDER", "none")
+    monkeypatch.setattr(rag_module, "QUERY_REWRITE_ENABLED", False)
+    monkeypatch.setattr(rag_module, "_index_cache", None)
+
+    events = _collect(_indexed_service(), "Hủy chuyến sau khi tài xế đến có mất phí không?")
+
+    assert [e["event"] for e in events] == ["done"]
+    assert events[0]["data"]["llm_provider"] in ("template", "knowledge_base")
+
+
+def test_repeated_question_is_served_from_answer_cache(monkeypatch):
+    import httpx
+
+    from app.services.llm_http import LLMHttpPool
+    from app.services.llm_resilience import LLMBreakers, LLMHedger
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Không mất phí bạn nhé."}}]})
+
+    class _Pool(LLMHttpPool):
+        def _new_client(self):
+            return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(rag_module, "LLM_PROVIDER", "openai")
+    monkeypatch.setattr(rag_module, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(rag_module, "QUERY_REWRITE_ENABLED", False)
+    monkeypatch.setattr(rag_module, "RAG_COSINE_ABSENT", -1.0)
+    monkeypatch.setattr(rag_module, "_index_cache", None)
+    monkeypatch.setattr(rag_module, "llm_http_pool", _Pool())
+    monkeypatch.setattr(rag_module, "llm_breakers", LLMBreakers(LLMHedger().latency))
+    service = _indexed_service()
+    question = "Hủy chuyến sau khi tài xế đến có mất phí không?"
+
+    first = asyncio.run(service.chat(question))
+    second = asyncio.run(service.chat(question))
+    follow_up = asyncio.run(service.chat(question, history=[{"role": "user", "content": "vậy thì sao"}]))
+
+    assert first["mode"].startswith("llm_openai") and second["mode"] == "cache"
+    assert second["answer"] == first["answer"] and second["cache_similarity"] >= 0.95
+    assert follow_up["mode"] == "cache", "self-contained question ignores history"
+    assert len(calls) == 1
+    service._answer_cache.set_version("reindexed")
+    assert asyncio.run(service.chat(question))["mode"] != "cache"
+    assert service.answer_cache_snapshot()["hits"] == 2
+
+
+def _linear_match_qa_answer(query, qa_answers):
+    """The pre-index linear scan, kept as the reference for parity."""
+    q_tokens = set(rag_module._tokenize_vi(_expand_quick_menu_label(query)))
+    if len(q_tokens) < 2:
+        return None
+    plain_query = rag_module._strip_diacritics(query.strip().lower())
+    best = None
+    for item in qa_answers:
+        if not item.tokens:
+            continue
+        all_overlap = len(q_tokens & item.tokens) / max(1, len(q_tokens))
+        question_overlap = len(q_tokens & item.question_tokens) / max(1, len(q_tokens)) if item.question_tokens else 0.0
+        score = max(all_overlap, question_overlap * 1.08)
+        if len(plain_query) >= 8:
+            if plain_query in item.plain_question:
+                score = max(score, 0.96)
+            elif plain_query in item.plain_search:
+                score = max(score, 0.78)
+        if len(q_tokens) <= 4 and all_overlap < 0.75 and question_overlap < 0.75:
+            continue
+        if best is None or score > best[0]:
+            best = (score, item)
+    if best and best[0] >= rag_module.QA_FAST_PATH_THRESHOLD:
+        return best
+    return None
+
+
+def test_indexed_qa_match_agrees_with_linear_scan():
+    import random
+
+    qa_answers = rag_module._build_qa_answers(_load_documents(KNOWLEDGE_DIR))
+    qa_index = rag_module.QaIndex(qa_answers)
+    rng = random.Random(7)
+    queries = [item.question for item in qa_answers[::3]]
+    queries += [item.plain_search[5:40] for item in qa_answers[::7]]  # mid-word substrings
+    queries += list(rag_module._QUICK_MENU_EXPAND)
+    words = [w for item in qa_answers for w in item.question.split()]
+    queries += [" ".join(rng.sample(words, rng.randint(2, 9))) for _ in range(200)]
+
+    matched = 0
+    for query in queries:
+        expected = _linear_match_qa_answer(query, qa_answers)
+        got = rag_module._match_qa_answer(query, qa_index)
+        assert (got and (round(got[0], 9), got[1].question)) == (
+            expected and (round(expected[0], 9), expected[1].question)
+        ), query
+        matched += got is not None
+    assert matched > len(qa_answers) // 3
+
+
+def _reference_lexical_score(query_text, chunk):
+    """Per-candidate re-tokenising version the precomputed features replace."""
+    q_tokens = set(rag_module._tokenize_vi(query_text))
+    if not q_tokens:
+        return 0.0
+    haystack = f"{chunk.title}\n{chunk.text}"
+    doc_tokens = set(rag_module._tokenize_vi(haystack))
+    if not doc_tokens:
+        return 0.0
+    overlap = len(q_tokens & doc_tokens) / max(1, len(q_tokens))
+    plain_query = rag_module._strip_diacritics(query_text.lower())
+    plain_doc = rag_module._strip_diacritics(haystack.lower())
+    phrase_bonus = 0.0
+    for token in [t for t in q_tokens if len(t) >= 4][:8]:
+        if token in plain_doc:
+            phrase_bonus += 0.015
+    if len(plain_query) >= 8 and plain_query in plain_doc:
+        phrase_bonus += 0.12
+    return min(1.0, overlap + min(0.12, phrase_bonus))
+
+
+def test_precomputed_lexical_features_keep_scores():
+    chunks = _build_chunks(_load_documents(KNOWLEDGE_DIR))
+    features = rag_module._lexical_features(chunks)
+    queries = ["Hủy chuyến có mất phí không", "thanh toan momo bi loi", "tài xế rút tiền", "?!", chunks[3].text[:30]]
+    for query in queries:
+        prepared = rag_module._LexicalQuery(query)
+        for chunk, (doc_tokens, plain_doc) in zip(chunks, features):
+            assert rag_module._lexical_overlap_score(prepared, doc_tokens, plain_doc) == _reference_lexical_score(query, chunk)
@@ -0,0 +1,57 @@
+"""Parallel retrain orchestration with tiny stand-in training scripts."""
+
+from app.services.training_orchestrator import cpu_budget, train_all
+
+_GOOD = """
+import joblib
+
+def generate_synthetic_data():
+    return [1, 2, 3]
+
+def train_model(df, output_path):
+    joblib.dump({"model": None, "rows": len(df)}, output_path)
+"""
+
+_BROKEN = """
+def generate_synthetic_data():
+    return []
+
+def train_model(df, output_path):
+    raise ValueError("no rows")
+"""
+
+
+def _script(tmp_path, name, source):
+    path = tmp_path / f"{name}.py"
+    path.write_text(source, encoding="utf-8")
+    return str(path)
+
+
+def test_train_all_runs_jobs_and_streams_progress(tmp_path):
+    jobs = (("accept", _script(tmp_path, "a", _GOOD)), ("wait", _script(tmp_path, "w", _GOOD)))
+    seen = []
+    result = train_all(tmp_path / "staging", timeout_sec=120, budget=2, nice=0, on_progress=seen.append, jobs=jobs)
+
+    assert result["ok"]
+    assert result["workers"] == 2 and result["threads_per_worker"] == 1
+    assert set(result["outputs"]) == {"accept", "wait"}
+    assert all(path.exists() for path in result["outputs"].values())
+    assert all(job["wall_ms"] >= 0 for job in result["jobs"].values())
+    stages = {(e["job"], e["stage"]) for e in seen}
+    assert {("accept", "started"), ("accept", "trained"), ("wait", "data_ready")} <= stages
+
+
+def test_train_all_is_all_or_nothing(tmp_path):
+    jobs = (("accept", _script(tmp_path, "a", _GOOD)), ("wait", _script(tmp_path, "w", _BROKEN)))
+    result = train_all(tmp_path / "staging", timeout_sec=120, budget=1, nice=0, jobs=jobs)
+
+    assert not result["ok"]
+    assert result["outputs"] == {}
+    assert result["jobs"]["accept"]["ok"]
+    assert "no rows" in result["jobs"]["wait"]["error"]
+    assert any(e["stage"] == "failed" for e in result["progress"])
+
+
+def test_cpu_budget_defaults_to_half_the_cores():
+    assert cpu_budget(3) == 3
+    assert cpu_budget(0) >= 1
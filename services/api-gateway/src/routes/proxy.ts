@@ -1,3 +1,5 @@
+import { Readable } from 'stream';
+import { pipeline } from 'stream/promises';
 import { Router, Request, Response } from 'express';
 import { config } from '../config';
 import { logger } from '../utils/logger';
@@ -194,8 +196,15 @@ router.use('/api/reviews', (req, res) => void forward('review', req, res));
 router.use('/api/notifications', (req, res) => void forward('notification', req, res));
 
 // AI service — direct HTTP forward (no gRPC).
-// Routes: POST /api/ai/chat, GET /api/ai/chat/status, GET /api/ai/stats
+// Routes: POST /api/ai/chat, POST /api/ai/chat/stream (SSE), GET /api/ai/chat/status, GET /api/ai/stats
 router.use('/api/ai', async (req, res) => {
+  // Rider gone before the answer finished → stop the upstream call (and the LLM behind it).
+  // res 'close' rather than req 'close': the latter fires as soon as the JSON body is read.
+  const upstream = new AbortController();
+  res.on('close', () => {
+    if (!res.writableFinished) upstream.abort();
+  });
+
   try {
     const aiBase = config.services.ai;
     // Map /api/ai/chat → /api/chat  (strip the /ai prefix)
@@ -218,8 +227,22 @@ router.use('/api/ai', async (req, res) => {
       body: ['GET', 'HEAD'].includes(req.method.toUpperCase())
         ? undefined
         : JSON.stringify(req.body || {}),
+      signal: upstream.signal,
     });
 
+    // SSE (chat/stream): relay events as they arrive instead of buffering the answer
+    if (response.body && (response.headers.get('content-type') || '').startsWith('text/event-stream')) {
+      res.status(response.status);
+      res.setHeader('Content-Type', 'text/event-stream');
+      res.setHeader('Cache-Control', 'no-cache');
+      res.setHeader('X-Accel-Buffering', 'no');
+      res.flushHeaders();
+      // pipeline (not .pipe) so an upstream reset mid-answer ends this response instead of
+      // surfacing as an unhandled 'error' event that would take the gateway down
+      await pipeline(Readable.fromWeb(response.body as import('stream/web').ReadableStream), res);
+      return;
+    }
+
     const text = await response.text();
     try {
       res.status(response.status).json(text ? JSON.parse(text) : {});
@@ -227,7 +250,15 @@ router.use('/api/ai', async (req, res) => {
       res.status(response.status).send(text);
     }
   } catch (err) {
+    if (upstream.signal.aborted) {
+      logger.info(`AI service proxy: client disconnected from ${req.originalUrl}`);
+      return;
+    }
     logger.error('AI service proxy error:', err);
+    if (res.headersSent) {
+      res.destroy();
+      return;
+    }
     res.status(503).json({ success: false, message: 'AI service temporarily unavailable' });
   }
 });